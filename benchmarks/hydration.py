@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""Measures the cost of hydrating model objects from a row.
+
+Models of 5, 50 and 500 columns are declared, half of them aliased, and the
+time to build one object from a full row is reported per row, both through
+the model constructor and the batched `hydrate` path. Objects are not kept
+alive, so both paths pay the same cost to free them.
+No Cassandra cluster is needed, the models are never bound to a pool.
+
+Usage: python benchmarks/hydration.py [rows]
+
+"""
+
+import sys
+import timeit
+from collections import deque
+
+from cassobjects.models import MetaModel, CFRegistry, Column, \
+                               _model_constructor
+from cassobjects.types import UTF8Type
+
+def make_model(ncolumns):
+    """Declares a model of `ncolumns` columns, every other one aliased."""
+    base = MetaModel('BenchModel%d' % ncolumns, (object,),
+                     {'pool': None, 'registry': CFRegistry(),
+                      '__init__': _model_constructor})
+    dct = {}
+    row = {}
+    for i in range(ncolumns):
+        if i % 2:
+            dct['col%d' % i] = Column('alias%d' % i, UTF8Type)
+            row['alias%d' % i] = 'value'
+        else:
+            dct['col%d' % i] = Column(UTF8Type)
+            row['col%d' % i] = 'value'
+    return MetaModel('Bench%d' % ncolumns, (base,), dct), row
+
+def main(rows):
+    for ncolumns in (5, 50, 500):
+        model, row = make_model(ncolumns)
+        elapsed = timeit.timeit(lambda: model('rowkey', **row), number=rows)
+        print("%4d columns: %8.2f us/row (constructor)" %
+              (ncolumns, elapsed / rows * 1000000))
+        batch = [('rowkey', row)] * rows
+        # objects are dropped as they come, as with the constructor
+        elapsed = timeit.timeit(lambda: deque(model.hydrate(batch), maxlen=0),
+                                number=1)
+        print("%4d columns: %8.2f us/row (hydrate)" %
+              (ncolumns, elapsed / rows * 1000000))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
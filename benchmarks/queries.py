@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""Measures model queries against the in-memory cluster of
+:mod:`cassobjects.testing`.
+
+Each benchmark reports the time per operation, and the number of requests
+made to the cluster per operation. With a latency, requests wait that long,
+which shows the effect of round trips and of concurrent queries.
+
+Benchmarks:
+    - get_many: multiget and hydration of 100 rows of 20 columns
+    - insert: insert of a row with two unique columns
+    - bulk_insert: batched insert of 20 rows with two unique columns
+    - get_by: index lookup matching 20 rows
+    - relationship (foreign key / timestamped): loading the relationship of
+      a fresh object
+    - prefetch_related: loading a relationship for 100 objects
+    - latest / get_one_by_rowkey / iter_versions: reads of an object with 50
+      versions stored as deltas
+
+Usage: python benchmarks/queries.py [operations] [latency in ms]
+
+"""
+
+import sys
+import time
+
+from cassobjects.models import declare_model, MetaModel, \
+                               MetaTimestampedModel, Column, relationship
+from cassobjects.types import UTF8Type, IntegerType, TimeUUIDType
+from cassobjects.builder import Builder
+from cassobjects.testing import FakeCluster
+
+KEYSPACE = 'cassobjects_bench'
+
+Model = declare_model(keyspace=KEYSPACE)
+TimestampedModel = declare_model(metaclass=MetaTimestampedModel,
+                                 name='TimestampedModel', keyspace=KEYSPACE)
+
+class Account(Model):
+    __column_family__ = 'bench_account'
+    email = Column(UTF8Type, unique=True)
+    login = Column(UTF8Type, unique=True)
+    group = Column(IntegerType, index=True)
+    posts = relationship('bench_post')
+    events = relationship('bench_event')
+
+class Post(Model):
+    __column_family__ = 'bench_post'
+    account = Column(TimeUUIDType, foreign_key='bench_account')
+    title = Column(UTF8Type)
+
+class Event(TimestampedModel):
+    __column_family__ = 'bench_event'
+    __delta_versions__ = 10
+
+Wide = MetaModel('Wide', (Model,), dict(
+    [('__column_family__', 'bench_wide')] +
+    [('col%d' % i, Column(UTF8Type)) for i in range(20)]))
+
+def measure(cluster, name, func, operations):
+    """Runs `func(i)` for i in range(`operations`), and prints results."""
+    cluster.reset_calls()
+    start = time.time()
+    for i in range(operations):
+        func(i)
+    elapsed = time.time() - start
+    requests = sum(cluster.calls.values())
+    print("%-32s %10.1f us/op %8.1f requests/op" %
+          (name, elapsed / operations * 1000000, float(requests) / operations))
+
+def main(operations, latency):
+    cluster = FakeCluster(latency=latency)
+    with cluster:
+        Builder.create(Account, Post, Event, Wide)
+
+        keys = [Wide.insert(dict(('col%d' % c, 'value %d' % c)
+                                 for c in range(20))).rowkey
+                for i in range(100)]
+        measure(cluster, 'get_many (100 rows)',
+                lambda i: Wide.get_many(keys), operations)
+
+        measure(cluster, 'insert (2 unique columns)',
+                lambda i: Account.insert({'email': 'e%d' % i,
+                                          'login': 'l%d' % i,
+                                          'group': i % 50}),
+                operations)
+        measure(cluster, 'bulk_insert (20 rows)',
+                lambda i: Account.bulk_insert(
+                    [{'email': 'b%d.%d' % (i, j), 'login': 'b%d.%d' % (i, j),
+                      'group': 1000 + i} for j in range(20)]),
+                operations)
+        cluster.truncate(KEYSPACE)
+
+        accounts = Account.bulk_insert([{'email': 'a%d' % i,
+                                         'login': 'a%d' % i,
+                                         'group': i % 5} for i in range(100)])
+        measure(cluster, 'get_by (20 rows)',
+                lambda i: Account.get_by('group', i % 5), operations)
+
+        for account in accounts:
+            for i in range(3):
+                Post.insert({'account': account.rowkey, 'title': 't%d' % i})
+                Event.insert({'i': i}, account)
+        keys = [account.rowkey for account in accounts]
+        measure(cluster, 'relationship (foreign key)',
+                lambda i: Account.get_one_by_rowkey(keys[i % 100]).posts,
+                operations)
+        measure(cluster, 'relationship (timestamped)',
+                lambda i: Account.get_one_by_rowkey(keys[i % 100]).events,
+                operations)
+        measure(cluster, 'prefetch_related (100 objects)',
+                lambda i: Account.prefetch_related(Account.get_many(keys),
+                                                   'posts', 'events'),
+                operations)
+
+        event = Event.insert({'value': 0, 'payload': 'x' * 200})
+        for i in range(1, 50):
+            Event.append_version(event.rowkey, {'value': i,
+                                                'payload': 'x' * 200})
+        measure(cluster, 'latest (50 versions)',
+                lambda i: Event.latest(event.rowkey).versions[0],
+                operations)
+        measure(cluster, 'get_one_by_rowkey (50 versions)',
+                lambda i: list(Event.get_one_by_rowkey(event.rowkey).versions),
+                operations)
+        measure(cluster, 'iter_versions (50 versions)',
+                lambda i: list(Event.iter_versions(event.rowkey,
+                                                   page_size=20)),
+                operations)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+         float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0)
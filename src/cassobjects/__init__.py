@@ -1,3 +1,4 @@
 # -*- encoding: utf-8 -*-
 
-__all__ = ['models', 'types', 'builder', 'utils']
+__all__ = ['models', 'types', 'builder', 'utils', 'serializers',
+           'session', 'aio', 'pools', 'instrumentation', 'testing']
@@ -0,0 +1,155 @@
+# -*- encoding: utf-8 -*-
+
+"""Asynchronous front-end for model queries.
+
+pycassa queries are blocking, so they are run in a thread executor. There is
+one executor per ConnectionPool, with as many threads as the pool has
+connections, so concurrent queries never wait for a connection. Executors
+are dropped with their pool, and forgotten in a child process after a fork,
+where their threads do not exist.
+
+Functions return `concurrent.futures` futures. On python 2, this module needs
+the `futures` package.
+
+Models expose this API through their `a`-prefixed methods (`aget_by`,
+`ainsert`, `aiter_range`, ...).
+
+"""
+
+import weakref
+import threading
+from itertools import islice
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, Future
+except ImportError:
+    ThreadPoolExecutor = Future = None
+
+from cassobjects.pools import register_after_fork
+
+__all__ = ['AioException', 'get_executor', 'submit', 'gather',
+           'AsyncIterator']
+
+# Used when the pool size is unknown
+DEFAULT_WORKERS = 5
+# Number of objects fetched at once by asynchronous iterators
+ITER_BUFFER_SIZE = 100
+
+class AioException(Exception):
+    """Asynchronous queries are not available"""
+    pass
+
+_executors = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+@register_after_fork
+def _forget_executors():
+    global _executors, _lock
+    _lock = threading.Lock()
+    _executors = weakref.WeakKeyDictionary()
+
+def get_executor(pool):
+    """Returns the executor running queries for the ConnectionPool `pool`."""
+    try:
+        return _executors[pool]
+    except KeyError:
+        pass
+    if ThreadPoolExecutor is None:
+        raise AioException("asynchronous queries need concurrent.futures "
+                           "(the futures package on python 2)")
+    with _lock:
+        if pool not in _executors:
+            try:
+                workers = pool.size()
+            except AttributeError:
+                workers = DEFAULT_WORKERS
+            _executors[pool] = ThreadPoolExecutor(workers)
+        return _executors[pool]
+
+def submit(model, func, *args, **kwargs):
+    """Runs `func(*args, **kwargs)` in the executor of `model` pool."""
+    return get_executor(model.pool).submit(func, *args, **kwargs)
+
+def gather(futures):
+    """Returns a future of the list of results of `futures`.
+    Futures returned by :func:`submit` already honor the pool limits, so many
+    of them can be gathered at once.
+
+    """
+    futures = list(futures)
+    result = Future()
+    results = [None] * len(futures)
+    remaining = [len(futures)]
+    lock = threading.Lock()
+    if not futures:
+        result.set_result(results)
+        return result
+    def done(index, future):
+        if result.done():
+            return
+        if future.exception() is not None:
+            with lock:
+                if not result.done():
+                    result.set_exception(future.exception())
+            return
+        results[index] = future.result()
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                result.set_result(results)
+    for index, future in enumerate(futures):
+        future.add_done_callback(lambda f, index=index: done(index, f))
+    return result
+
+class AsyncIterator(object):
+    """Iterator over the blocking iterable returned by `factory()`. Items are
+    fetched `buffer_size` at a time in the executor of `model` pool: while
+    the items of a page are served, the next page is already being read.
+
+    """
+    def __init__(self, model, factory, buffer_size=ITER_BUFFER_SIZE):
+        self.model = model
+        self.factory = factory
+        self.iterator = None
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.pending = None
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def _fill(self):
+        """Runs in the executor"""
+        if self.iterator is None:
+            self.iterator = iter(self.factory())
+        return list(islice(self.iterator, self.buffer_size))
+
+    def fetch(self):
+        """Returns a future of the next page of at most `buffer_size` items,
+        which is empty once the iterable is exhausted. Pages are read one at
+        a time, so a page must be done before fetching the next one.
+
+        """
+        if self.pending is not None:
+            future, self.pending = self.pending, None
+            return future
+        if self.exhausted:
+            future = Future()
+            future.set_result([])
+            return future
+        return submit(self.model, self._fill)
+
+    def next(self):
+        if not self.buffer:
+            page = self.fetch().result()
+            if not page:
+                self.exhausted = True
+                raise StopIteration
+            self.buffer = page
+            if len(page) < self.buffer_size:
+                self.exhausted = True
+            else:
+                self.pending = submit(self.model, self._fill)
+        return self.buffer.pop(0)
+    __next__ = next
@@ -4,22 +4,159 @@
 
 """
 
+import math
+import time
+
 from pycassa.system_manager import *
+from pycassa.types import CassandraType
+from pycassa.cassandra.ttypes import ColumnDef
+from pycassa import marshal
 
-from cassobjects.models import MetaModel, MetaTimestampedModel, Column, \
-                               ModelRelationship, ModelAttribute
+from cassobjects.models import MetaModel, MetaTimestampedModel, \
+                               MetaCounterModel, Column, ModelRelationship, \
+                               ModelAttribute
 
 # Exception
 class BuilderException(Exception):
     """Something went wrong in the Builder"""
     pass
 
+# Prefix of Cassandra types in column family definitions
+MARSHAL_PREFIX = 'org.apache.cassandra.db.marshal.'
+
+def _type_name(value_type):
+    """Returns a comparable name of a pycassa type, or of a type name read
+    from a column family definition.
+
+    """
+    # pycassa types are named with their ordering, as in
+    # "UTF8Type(reversed=false)", Cassandra only mentions reversed ones
+    name = str(value_type).replace(MARSHAL_PREFIX, '').replace(' ', '')
+    return name.replace('(reversed=false)', '')
+
+def _qualify(value_type):
+    """Returns the class name of a type, as given to Cassandra"""
+    name = str(value_type)
+    if '.' not in name:
+        name = MARSHAL_PREFIX + name
+    return name
+
+def _index_name(cf, column):
+    return '%s_%s_index' % (cf, column)
+
+def _column_metadata(cf, comparator, metadata, indexes):
+    """Returns the column metadata of the column family `cf`: `metadata`,
+    a list of existing ColumnDef, with secondary indexes on `indexes`
+    ({column name: value type}).
+
+    """
+    pack = marshal.packer_for(_type_name(comparator))
+    metadata = list(metadata or [])
+    for name, value_type in sorted(indexes.items()):
+        packed = pack(name)
+        validation_class = _qualify(value_type)
+        for column in metadata:
+            if column.name == packed:
+                # existing definitions are not changed in place
+                metadata.remove(column)
+                validation_class = column.validation_class
+                break
+        metadata.append(ColumnDef(name=packed,
+                                  validation_class=validation_class,
+                                  index_type=KEYS_INDEX,
+                                  index_name=_index_name(cf, name)))
+    return metadata
+
+def _format(value):
+    """Returns a readable representation of a SystemManager argument"""
+    if isinstance(value, CassandraType):
+        return _type_name(value)
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%r: %s' % (k, _format(v))
+                                  for k, v in sorted(value.items()))
+    if isinstance(value, list):
+        return '[%s]' % ', '.join(_format(v) for v in value)
+    if hasattr(value, 'validation_class'):
+        # column metadata
+        fields = ['name=%r' % value.name,
+                  'validation_class=%s' % _format(value.validation_class)]
+        if value.index_type is not None:
+            fields += ['index_type=%r' % value.index_type,
+                       'index_name=%r' % value.index_name]
+        return 'ColumnDef(%s)' % ', '.join(fields)
+    return repr(value)
+
+class SchemaChange(object):
+    """A single operation of a Builder plan: `method` of SystemManager called
+    with `args` and `kwargs`, on the keyspace of `klass` pool.
+
+    The `indexes` keyword argument of `create_column_family` and
+    `alter_column_family` ({column name: value type}) is given to
+    SystemManager as column metadata, along with the `existing` metadata of
+    the column family, so that each column family is created or updated by a
+    single schema change. Printing a change shows the SystemManager call
+    made by :meth:`apply`.
+
+    """
+    def __init__(self, klass, method, *args, **kwargs):
+        self.klass = klass
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.existing = None
+
+    @property
+    def server(self):
+        return self.klass.pool.server_list[0]
+
+    @property
+    def keyspace(self):
+        return self.klass.pool.keyspace
+
+    def arguments(self):
+        """Returns the keyword arguments given to SystemManager"""
+        kwargs = dict(self.kwargs)
+        indexes = kwargs.pop('indexes', None)
+        if indexes:
+            if self.existing is None:
+                comparator, metadata = kwargs['comparator_type'], None
+            else:
+                comparator = self.existing.comparator_type
+                metadata = self.existing.column_metadata
+            kwargs['column_metadata'] = _column_metadata(self.args[0], comparator,
+                                                         metadata, indexes)
+        return kwargs
+
+    def apply(self, sys):
+        getattr(sys, self.method)(self.keyspace, *self.args, **self.arguments())
+        # ColumnFamily objects pack values with the validators read when
+        # they were created. Column families of relationships are cached by
+        # other models
+        for model in list(self.klass.registry.classes.values()):
+            model.cf_cache.invalidate(self.args[0])
+
+    def __str__(self):
+        args = [_format(self.keyspace)] + [_format(a) for a in self.args]
+        args += ['%s=%s' % (k, _format(v))
+                 for k, v in sorted(self.arguments().items())]
+        return "%s(%s)" % (self.method, ', '.join(args))
+
+    __repr__ = __str__
+
 class Builder(object):
     """Create column families based on Models.
 
     This class is not responsible for the creation of the keyspace.
     It will only creates column families, secondary indexes, and
-    "manually" created secondary indexes.
+    "manually" created secondary indexes (see :meth:`rebuild_indexes` to fill
+    them for existing rows).
+
+    Keyspaces are described once, and compared with models to make a plan:
+    missing column families, missing secondary indexes and changed column
+    validators. The plan holds a single schema change per column family,
+    created with its indexes, or updated with all its changes at once. It is
+    applied with a single SystemManager per server. Running the Builder twice
+    does nothing the second time.
 
     If a column family is already created, it will not try to override them,
     unless if the `force` keyword is given.
@@ -27,25 +164,131 @@ class Builder(object):
     """
     @classmethod
     def create(cls, *classes, **kwargs):
-        """Collect informations about classes
+        """Collect informations about classes, and apply the resulting plan.
+
+        :param force: Drop and create again existing column families. This
+          will destroy all remaining data, make sure you know what you do.
+
+        :param dry_run: Only print the plan.
+
+        Returns the plan, a list of :class:`SchemaChange`.
+
         """
         force = kwargs.get('force', False)
+        dry_run = kwargs.get('dry_run', False)
+        managers = {}
+        try:
+            plan = cls._plan(managers, classes, force)
+            if dry_run:
+                for change in plan:
+                    print(change)
+            else:
+                for change in plan:
+                    change.apply(cls._manager(managers, change.server))
+        finally:
+            for sys in managers.values():
+                sys.close()
+        return plan
 
+    @classmethod
+    def plan(cls, *classes, **kwargs):
+        """Returns the plan :meth:`create` would apply."""
+        managers = {}
+        try:
+            return cls._plan(managers, classes, kwargs.get('force', False))
+        finally:
+            for sys in managers.values():
+                sys.close()
+
+    @classmethod
+    def _manager(cls, managers, server):
+        """Returns the SystemManager connected to `server`, shared by all
+        operations of a Builder call.
+
+        """
+        if server not in managers:
+            managers[server] = SystemManager(server)
+        return managers[server]
+
+    @classmethod
+    def _plan(cls, managers, classes, force):
+        """Describes keyspaces of `classes`, once each, and returns the list
+        of changes to make.
+
+        """
+        definitions = []
         for klass in classes:
             if isinstance(klass, MetaModel):
-                cls._create_metamodel(klass, force)
+                definitions.extend(cls._metamodel_definitions(klass))
             elif isinstance(klass, MetaTimestampedModel):
-                cls._create_metatimestampedmodel(klass, force)
+                definitions.extend(cls._metatimestampedmodel_definitions(klass))
+            elif isinstance(klass, MetaCounterModel):
+                definitions.extend(cls._metacountermodel_definitions(klass))
             else:
                 raise BuilderException("%s is not recognized as a cassobjects "
                                        "class" % klass)
+        keyspaces = {}
+        done = set()
+        plan = []
+        for klass, cf, options, indexes in definitions:
+            pool = klass.pool
+            server = pool.server_list[0]
+            if (server, pool.keyspace, cf) in done:
+                continue
+            done.add((server, pool.keyspace, cf))
+            if (server, pool.keyspace) not in keyspaces:
+                sys = cls._manager(managers, server)
+                keyspaces[(server, pool.keyspace)] = \
+                    sys.get_keyspace_column_families(pool.keyspace)
+            existing = keyspaces[(server, pool.keyspace)].get(cf)
+            if existing is not None and force:
+                plan.append(SchemaChange(klass, 'drop_column_family', cf))
+                existing = None
+            if existing is None:
+                if indexes:
+                    options = dict(options, indexes=indexes)
+                plan.append(SchemaChange(klass, 'create_column_family', cf,
+                                         **options))
+            else:
+                plan.extend(cls._diff(klass, cf, existing, options, indexes))
+        return plan
+
+    @classmethod
+    def _diff(cls, klass, cf, existing, options, indexes):
+        """Returns changes to make to the `existing` column family
+        definition: a single `alter_column_family` with the changed column
+        validators and the missing indexes, if any.
+
+        """
+        metadata = {}
+        for column in getattr(existing, 'column_metadata', None) or []:
+            metadata[column.name] = column
+        validators = {}
+        for name, value_type in options.get('column_validation_classes', {}).items():
+            column = metadata.get(name)
+            if column is None or \
+                _type_name(column.validation_class) != _type_name(value_type):
+                validators[name] = value_type
+        missing = {}
+        for name, value_type in indexes.items():
+            column = metadata.get(name)
+            if column is None or column.index_type is None:
+                missing[name] = value_type
+        if not validators and not missing:
+            return []
+        kwargs = {}
+        if validators:
+            kwargs['column_validation_classes'] = validators
+        if missing:
+            kwargs['indexes'] = missing
+        change = SchemaChange(klass, 'alter_column_family', cf, **kwargs)
+        change.existing = existing
+        return [change]
 
     @classmethod
-    def _create_metamodel(cls, klass, force):
-        """Creates family column for a MetaModel inherited class.
+    def _metamodel_definitions(cls, klass):
+        """Column families of a MetaModel inherited class.
 
-        If the `force` argument is True, it will drop the column family. This
-        can be very dangerous, make sure you know what you're doing.
         If a field is listed as an index, creates a Cassandra secondary index.
         A foreign key is also handled as an index.
         Arbitrary connects to the first server found in the class
@@ -53,48 +296,52 @@ class Builder(object):
         Rely on the CFRegistry object to get the proper list of properties in
         the model.
 
+        Returns a list of (class, column family, create_column_family keyword
+        arguments, secondary indexes) tuples.
+
         """
         cf = klass.__column_family__
-        dct = klass.__dict__
-        pool = klass.pool
-        sys = SystemManager(pool.server_list[0])
-        try:
-            cfs_keyspace = sys.get_keyspace_column_families(pool.keyspace)
-            if cf in cfs_keyspace:
-                if not force:
-                    return
-                # This will destroy all remaining data, make sure you know
-                # what you do.
-                sys.drop_column_family(pool.keyspace, cf)
-            cvclasses = {}
-            indexes = {}
-            for attr, value in dct.items():
-                if not isinstance(value, ModelAttribute):
-                    continue
-                value = value.prop
-                if isinstance(value, Column):
-                    name = value.alias or attr
-                    if value.index or value.foreign_key or value.unique:
-                        indexes[name] = value.col_type
-                    cvclasses[name] = value.col_type
-                elif isinstance(value, ModelRelationship):
-                    cls._create_relationships(klass, value, force)
-            # Create column family
-            sys.create_column_family(pool.keyspace, cf, super=False,
-                                     comparator_type=UTF8_TYPE,
-                                     key_validation_class=TIME_UUID_TYPE,
-                                     column_validation_classes=cvclasses,
-                                     comment="Generated by cassobjects")
-            # Create secondary indexes
-            for name, value_type in indexes.items():
-                sys.create_index(pool.keyspace, cf, name, value_type,
-                                 index_name='%s_%s_index' % (cf, name))
-        finally:
-            sys.close()
+        definitions = []
+        cvclasses = {}
+        indexes = {}
+        for attr, value in klass.__dict__.items():
+            if not isinstance(value, ModelAttribute):
+                continue
+            value = value.prop
+            if isinstance(value, Column):
+                name = value.alias or attr
+                if name in klass._manual_indexes:
+                    definitions.append(cls._manual_index_definition(
+                        klass, name, value.col_type))
+                elif value.index or value.foreign_key or value.unique:
+                    indexes[name] = value.col_type
+                cvclasses[name] = value.col_type
+            elif isinstance(value, ModelRelationship):
+                definitions.extend(cls._relationship_definitions(klass, value))
+        definitions.insert(0, (klass, cf,
+                               dict(super=False, comparator_type=UTF8_TYPE,
+                                    key_validation_class=TIME_UUID_TYPE,
+                                    column_validation_classes=cvclasses,
+                                    comment="Generated by cassobjects"),
+                               indexes))
+        return definitions
 
     @classmethod
-    def _create_metatimestampedmodel(cls, klass, force):
-        """Create a "TimestampedModel".
+    def _manual_index_definition(cls, klass, name, value_type):
+        """Column family of a "manually" created secondary index.
+        Rowkeys are the indexed values, column names the rowkeys of the
+        model.
+
+        """
+        return (klass, klass._manual_indexes[name],
+                dict(super=False, comparator_type=TIME_UUID_TYPE,
+                     key_validation_class=value_type,
+                     comment="Generated by cassobjects"),
+                {})
+
+    @classmethod
+    def _metatimestampedmodel_definitions(cls, klass):
+        """Column family of a "TimestampedModel".
 
         This model represents a single objects, which changes in time.
         One object per row, each column (sorted TimeUUID) is a version of the
@@ -103,45 +350,68 @@ class Builder(object):
         The column value is the object serialized.
 
         """
-        cf = klass.__column_family__
-        pool = klass.pool
-        sys = SystemManager(pool.server_list[0])
-        try:
-            cfs_keyspace = sys.get_keyspace_column_families(pool.keyspace)
-            if cf in cfs_keyspace:
-                if not force:
-                    return
-                sys.drop_column_family(pool.keyspace, cf)
-            # Create column family
-            sys.create_column_family(pool.keyspace, cf, super=False,
-                                     comparator_type=TIME_UUID_TYPE,
-                                     key_validation_class=TIME_UUID_TYPE,
-                                     comment="Generated by cassobjects")
-        finally:
-            sys.close()
+        return [(klass, klass.__column_family__,
+                 dict(super=False, comparator_type=TIME_UUID_TYPE,
+                      key_validation_class=TIME_UUID_TYPE,
+                      comment="Generated by cassobjects"),
+                 {})]
 
     @classmethod
-    def _create_relationships(cls, klass, rel, force):
+    def _metacountermodel_definitions(cls, klass):
+        """Column family of a "CounterModel": values are counters, rowkeys
+        and column names types are given by the `__key_type__` and
+        `__comparator_type__` class attributes.
+
+        """
+        return [(klass, klass.__column_family__,
+                 dict(super=False,
+                      comparator_type=getattr(klass, '__comparator_type__',
+                                              UTF8_TYPE),
+                      key_validation_class=getattr(klass, '__key_type__',
+                                                   UTF8_TYPE),
+                      default_validation_class=COUNTER_COLUMN_TYPE,
+                      comment="Generated by cassobjects"),
+                 {})]
+
+    @classmethod
+    def _relationship_definitions(cls, klass, rel):
         """Checks if the given relationship needs to create a relationship
         table. This is only true for MetaTimestampedModel.
 
         """
         target_klass = klass.registry.get_class(rel.target)
-        if isinstance(target_klass, MetaTimestampedModel):
-            cf = "%s_%s" % (klass.__column_family__,
-                            target_klass.__column_family__)
-            pool = klass.pool
-            sys = SystemManager(pool.server_list[0])
-            try:
-                cfs_keyspace = sys.get_keyspace_column_families(pool.keyspace)
-                if cf in cfs_keyspace:
-                    if not force:
-                        return
-                    sys.drop_column_family(pool.keyspace, cf)
-                sys.create_column_family(pool.keyspace, cf, super=False,
-                                         comparator_type=TIME_UUID_TYPE,
-                                         key_validation_class=TIME_UUID_TYPE,
-                                         default_validation_class=TIME_UUID_TYPE,
-                                         comment="Generated by cassobjects")
-            finally:
-                sys.close()
+        if not isinstance(target_klass, MetaTimestampedModel):
+            return []
+        cf = "%s_%s" % (klass.__column_family__,
+                        target_klass.__column_family__)
+        return [(klass, cf,
+                 dict(super=False, comparator_type=TIME_UUID_TYPE,
+                      key_validation_class=TIME_UUID_TYPE,
+                      default_validation_class=TIME_UUID_TYPE,
+                      comment="Generated by cassobjects"),
+                 {})]
+
+    @classmethod
+    def rebuild_indexes(cls, klass, **kwargs):
+        """Writes the manual index entries of all the rows of `klass`, for
+        instance after enabling manual indexes on an existing model.
+        Entries of columns written with a ttl expire with them.
+        Stale entries are not removed.
+        Keyword arguments are given to pycassa `get_range`.
+
+        """
+        if not klass._manual_indexes:
+            raise BuilderException("%s does not use manual indexes" % klass)
+        col_fam = klass.cf_cache.get()
+        kwargs.setdefault('columns', list(klass._manual_indexes))
+        kwargs.update(include_timestamp=True, include_ttl=True)
+        with klass.batch() as batch:
+            for rowkey, columns in col_fam.get_range(**kwargs):
+                now = time.time()
+                for name, (value, timestamp, ttl) in columns.items():
+                    if ttl:
+                        # the ttl counts from the write of the column
+                        ttl = int(math.ceil(ttl - (now - timestamp / 1e6)))
+                        if ttl <= 0:
+                            continue
+                    klass._index_row(batch, rowkey, {name: value}, ttl)
@@ -0,0 +1,246 @@
+# -*- encoding: utf-8 -*-
+
+"""Instrumentation of model operations.
+
+Every query made through a model (index lookups, multigets, range scans,
+inserts, relationship loads and the ColumnFamily passthroughs) produces a
+:class:`QueryEvent` given to the registered listeners: any callable taking
+the event.
+Operations made by other operations (the index lookups of an insert, the
+queries of a relationship) produce their own events, linked to the enclosing
+one.
+When no listener is registered, operations only pay for an empty list check.
+
+Two listeners are provided:
+    - MetricsAggregator: in memory counters and latency histograms per model
+      and operation, to be scraped with :meth:`MetricsAggregator.snapshot`
+    - SlowQueryLog: logs operations slower than a threshold
+
+"""
+
+import time
+import logging
+import threading
+from functools import wraps
+
+__all__ = ['QueryEvent', 'add_listener', 'remove_listener', 'current_event',
+           'record_bytes', 'record_hydration', 'measure', 'instrumented',
+           'instrumented_iter', 'MetricsAggregator', 'SlowQueryLog']
+
+# Registered listeners, only checked for emptiness on the hot path
+listeners = []
+
+_local = threading.local()
+
+class QueryEvent(object):
+    """A finished operation.
+
+    - `model`: column family of the model
+    - `operation`: name of the operation (`get_by`, `insert`, ...)
+    - `duration`: seconds spent in the operation
+    - `rows`: number of rows or objects returned
+    - `bytes`: number of bytes serialized, nested operations included
+    - `hydration`: seconds spent building objects, nested operations included
+    - `error`: the exception raised, or None
+    - `parent`: the event of the enclosing operation, or None
+
+    """
+    def __init__(self, model, operation, parent=None):
+        self.model = model
+        self.operation = operation
+        self.parent = parent
+        self.duration = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.hydration = 0.0
+        self.error = None
+
+    def __repr__(self):
+        return "<QueryEvent %s.%s %.3fms rows=%d>" % \
+            (self.model, self.operation, self.duration * 1000, self.rows)
+
+def add_listener(listener):
+    """Registers `listener`, a callable called with each QueryEvent."""
+    listeners.append(listener)
+    return listener
+
+def remove_listener(listener):
+    listeners.remove(listener)
+
+def _emit(event):
+    for listener in list(listeners):
+        listener(event)
+
+def _stack():
+    if not hasattr(_local, 'events'):
+        _local.events = []
+    return _local.events
+
+def current_event():
+    """Returns the event of the operation running in this thread, or None."""
+    events = getattr(_local, 'events', None)
+    return events[-1] if events else None
+
+def record_bytes(count):
+    """Adds `count` serialized bytes to the running operations."""
+    for event in getattr(_local, 'events', ()):
+        event.bytes += count
+
+def record_hydration(seconds):
+    """Adds `seconds` of hydration time to the running operations."""
+    for event in getattr(_local, 'events', ()):
+        event.hydration += seconds
+
+def _count_rows(result):
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+class measure(object):
+    """Context manager measuring an operation of `model` (a column family
+    name). Does nothing if no listener is registered.
+
+    """
+    def __init__(self, model, operation):
+        self.model = model
+        self.operation = operation
+        self.event = None
+
+    def __enter__(self):
+        if listeners:
+            stack = _stack()
+            self.event = QueryEvent(self.model, self.operation,
+                                    stack[-1] if stack else None)
+            stack.append(self.event)
+            self.start = time.time()
+        return self.event
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event = self.event
+        if event is None:
+            return
+        event.duration = time.time() - self.start
+        event.error = exc_value
+        _stack().remove(event)
+        _emit(event)
+
+def instrumented(operation, rows=_count_rows):
+    """Decorator of model (metaclass) methods, measuring each call.
+    `rows` returns the number of rows from the result.
+
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(model, *args, **kwargs):
+            if not listeners:
+                return func(model, *args, **kwargs)
+            with measure(model.__column_family__, operation) as event:
+                result = func(model, *args, **kwargs)
+                if event is not None:
+                    event.rows = rows(result)
+                return result
+        return wrapper
+    return decorator
+
+def instrumented_iter(operation):
+    """Same as :func:`instrumented`, for methods returning iterators. Only
+    the time spent producing items is measured, and the event is emitted
+    when the iterator is exhausted or closed.
+
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(model, *args, **kwargs):
+            if not listeners:
+                return func(model, *args, **kwargs)
+            return _measure_iter(model.__column_family__, operation,
+                                 func(model, *args, **kwargs))
+        return wrapper
+    return decorator
+
+def _measure_iter(model, operation, iterator):
+    event = QueryEvent(model, operation, current_event())
+    stack = _stack()
+    iterator = iter(iterator)
+    try:
+        while True:
+            stack.append(event)
+            start = time.time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception as e:
+                event.error = e
+                raise
+            finally:
+                event.duration += time.time() - start
+                stack.remove(event)
+            event.rows += 1
+            yield item
+    finally:
+        _emit(event)
+
+class MetricsAggregator(object):
+    """Listener aggregating events per (model, operation): number of calls
+    and errors, rows, bytes, time spent, hydration time, and a latency
+    histogram (upper bounds in milliseconds).
+
+    """
+    BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+               float('inf'))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def __call__(self, event):
+        key = (event.model, event.operation)
+        ms = event.duration * 1000
+        with self.lock:
+            metrics = self.metrics.get(key)
+            if metrics is None:
+                metrics = self.metrics[key] = {
+                    'count': 0, 'errors': 0, 'rows': 0, 'bytes': 0,
+                    'time': 0.0, 'hydration': 0.0,
+                    'histogram': [0] * len(self.BUCKETS)}
+            metrics['count'] += 1
+            if event.error is not None:
+                metrics['errors'] += 1
+            metrics['rows'] += event.rows
+            metrics['bytes'] += event.bytes
+            metrics['time'] += event.duration
+            metrics['hydration'] += event.hydration
+            for index, bound in enumerate(self.BUCKETS):
+                if ms <= bound:
+                    metrics['histogram'][index] += 1
+                    break
+
+    def snapshot(self):
+        """Returns a copy of the metrics, histograms as {bound: count}."""
+        with self.lock:
+            snapshot = {}
+            for key, metrics in self.metrics.items():
+                metrics = dict(metrics)
+                metrics['histogram'] = dict(zip(self.BUCKETS,
+                                                metrics['histogram']))
+                snapshot[key] = metrics
+            return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.metrics = {}
+
+class SlowQueryLog(object):
+    """Listener logging operations taking more than `threshold` seconds."""
+    def __init__(self, threshold=0.5, logger=None):
+        self.threshold = threshold
+        self.logger = logger or logging.getLogger('cassobjects.slow_queries')
+
+    def __call__(self, event):
+        if event.duration >= self.threshold:
+            self.logger.warning("slow query: %s.%s took %.1fms (%d rows)",
+                                event.model, event.operation,
+                                event.duration * 1000, event.rows)
@@ -14,36 +14,110 @@ It defines classes (models) where properties maps columns.
 Each model can be instanciated to represent a single row (object) from
 Cassandra.
 
-By now, it only supports read, create columns families, and create new entries
-in columns families. Objects cannot be updated and saved.
+It supports reads, creation of columns families, and creation of new
+entries in columns families. Model objects can be updated: changed columns
+are written by their `save()` method, or when flushing a session.
+Timestamped objects get new versions instead.
+
+Models can set the consistency levels of their reads and writes, with the
+`__read_consistency__` and `__write_consistency__` class attributes
+(:class:`ConsistencyLevel` values), defaulting to the pycassa ones. Queries
+accept the pycassa `read_consistency_level` and `write_consistency_level`
+keyword arguments to override them. Timeouts and retries are options of the
+ConnectionPool, see :func:`declare_model`.
 
 """
 
+import uuid
+import time
 import inspect
+import weakref
+import threading
 from functools import partial
+from itertools import chain
 from datetime import datetime
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    # python 2
+    from Queue import Queue, Empty, Full
 
-from pycassa import ConnectionPool, ConsistencyLevel, NotFoundException
+from pycassa import ConsistencyLevel, NotFoundException
 from pycassa.types import CassandraType
 from pycassa.columnfamily import ColumnFamily
+from pycassa.batch import Mutator
 from pycassa.index import create_index_expression, create_index_clause
 from pycassa.util import convert_time_to_uuid
 
-import simplejson as json
+from cassobjects.utils import chunks, parallel_map, LRUCache, \
+                             LatencyTracker, hedged
+from cassobjects import serializers, aio, instrumentation
+from cassobjects.instrumentation import instrumented, instrumented_iter
+from cassobjects.session import current_session, use_session, \
+                                get_read_cache, invalidate
+from cassobjects.pools import LazyPool, POOLS, register_after_fork
 
-from cassobjects.utils import immutabledict
-
-__all__ = ['declare_model', 'MetaModel', 'MetaTimestampedModel', 'Column',
-           'ConsistencyLevel']
+__all__ = ['declare_model', 'MetaModel', 'MetaTimestampedModel',
+           'MetaCounterModel', 'Column', 'ConsistencyLevel']
 
 class ModelException(Exception):
     """An exception occured during Model parsing/construction"""
     pass
 
-# Will hold ConnectionPool objects, where keys are the keyspace
+# Default keyspace and hosts of models ConnectionPool, see cassobjects.pools
 DEFAULT_KEYSPACE = 'Keyspace'
 DEFAULT_HOSTS = ['localhost:9160']
-POOLS = {}
+
+# Used as row count when a query is not limited
+MAX_COUNT = 2 ** 31 - 1
+# Number of rowkeys fetched by a single multiget, and number of multigets
+# running concurrently (pycassa default pool size)
+MULTIGET_CHUNK_SIZE = 100
+MULTIGET_WORKERS = 5
+# Number of mutations queued by a batch before being sent
+BATCH_QUEUE_SIZE = 500
+# Number of objects of a result set whose deferred columns are loaded together
+DEFERRED_BATCH_SIZE = 1000
+# (start, finish) tokens of the whole ring, by partitioner. Start tokens are
+# excluded from ranges: RandomPartitioner tokens range from 0 to 2**127,
+# Murmur3Partitioner ones (the default since Cassandra 1.2) from -2**63 + 1
+# to 2**63 - 1
+TOKEN_BOUNDS = {
+    'RandomPartitioner': (-1, 2 ** 127),
+    'Murmur3Partitioner': (-2 ** 63, 2 ** 63 - 1),
+}
+# Checkpoint value of a split entirely scanned by MetaModel.parallel_scan
+SCAN_DONE = 'done'
+# Number of distinct counters, and seconds, after which a CounterBuffer is
+# flushed
+COUNTER_BUFFER_SIZE = 10000
+COUNTER_FLUSH_INTERVAL = 1.0
+# Values of unique columns queued in batches given by callers, by batch and
+# column family
+_queued_unique = weakref.WeakKeyDictionary()
+# Original value recorded for a changed column that was not read, for
+# instance because of a column projection
+NOT_LOADED = object()
+
+def token_ranges(splits, bounds=TOKEN_BOUNDS['RandomPartitioner']):
+    """Divides the token ring going from the `bounds` (start, finish) tokens
+    in `splits` ranges of the same size, as (start token, finish token)
+    strings. Start tokens are excluded from ranges, finish tokens are
+    included.
+
+    """
+    start, finish = bounds
+    size = finish - start
+    tokens = [start] + \
+             [start + size * i // splits for i in range(1, splits)] + [finish]
+    return [(str(tokens[i]), str(tokens[i + 1])) for i in range(splits)]
+
+def new_timeuuid():
+    """Returns a new TimeUUID for the current time. The non time part is
+    random, so that keys created during the same microsecond are different.
+
+    """
+    return convert_time_to_uuid(datetime.utcnow(), randomize=True)
 
 #################
 # Column object #
@@ -83,14 +157,178 @@ class Column(object):
         if inspect.isclass(self.col_type):
             self.col_type = self.col_type()
 
-    def do_init(self, local_class):
-        """No initialization is needed"""
-        pass
-
     def get(self, instance):
         """No need"""
         pass
 
+def _async(name):
+    """Returns a metaclass method running the method `name` in the executor
+    of the model pool (see :mod:`cassobjects.aio`).
+
+    """
+    def method(cls, *args, **kwargs):
+        return aio.submit(cls, getattr(cls, name), *args, **kwargs)
+    method.__name__ = 'a%s' % name
+    method.__doc__ = "Asynchronous version of :meth:`%s`." % name
+    return method
+
+def _async_iter(name):
+    """Same as :func:`_async`, for methods returning iterators. The returned
+    method builds an :class:`aio.AsyncIterator`.
+
+    """
+    def method(cls, *args, **kwargs):
+        return aio.AsyncIterator(cls, partial(getattr(cls, name), *args, **kwargs))
+    method.__name__ = 'a%s' % name
+    method.__doc__ = "Asynchronous version of :meth:`%s`, reading pages " \
+                     "of objects ahead in the executor." % name
+    return method
+
+def _read(model, operation, hedge, func, *args, **kwargs):
+    """Calls the read `func(*args, **kwargs)` of `model`. If `hedge` is
+    True, or None and the model sets `__hedged_reads__`, the read is hedged:
+    it is sent a second time if it did not answer after the 95th percentile
+    latency of the recent `operation` reads of the model (see
+    :func:`cassobjects.utils.hedged`).
+
+    """
+    if hedge is None:
+        hedge = model._hedged_reads
+    if not hedge:
+        return func(*args, **kwargs)
+    tracker = model._latencies.get(operation)
+    if tracker is None:
+        tracker = model._latencies.setdefault(operation, LatencyTracker())
+    return hedged(tracker, func, *args, **kwargs)
+
+##########################
+# ColumnFamily instances #
+##########################
+
+class ColumnFamilyCache(object):
+    """Lazily creates and keeps pycassa ColumnFamily objects for a model.
+
+    Creating a ColumnFamily reads the column family schema from the cluster,
+    so it is done only once per column family name, or once per thread
+    reading it concurrently the first time: only one object is kept. Besides the model own
+    column family, the cache also holds the intermediate column families used
+    by many to many relationships.
+    This object is attached to each model by its metaclass, and is thread
+    safe. ColumnFamily objects are built outside of the lock, so threads
+    reading other column families do not wait for the schema round trip.
+    The cache is emptied, and its lock replaced, when a forked child process
+    creates its own pools.
+
+    ColumnFamily objects and batches use the consistency levels of the model
+    `__read_consistency__` and `__write_consistency__` class attributes.
+
+    """
+    instances = weakref.WeakSet()
+
+    def __init__(self, model):
+        self.model = model
+        self.cfs = {}
+        self.pool = None
+        self.lock = threading.Lock()
+        # incremented when ColumnFamily objects are invalidated
+        self.generation = 0
+        self.bounds = None
+        self.bounds_pool = None
+        self.options = {}
+        read_level = getattr(model, '__read_consistency__', None)
+        if read_level is not None:
+            self.options['read_consistency_level'] = read_level
+        self.write_level = getattr(model, '__write_consistency__', None)
+        if self.write_level is not None:
+            self.options['write_consistency_level'] = self.write_level
+        ColumnFamilyCache.instances.add(self)
+
+    def get(self, name=None):
+        """Returns the ColumnFamily named `name`, defaults to the model
+        column family.
+
+        """
+        if name is None:
+            name = self.model.__column_family__
+        pool = self.model.pool
+        if pool is self.pool:
+            try:
+                return self.cfs[name]
+            except KeyError:
+                pass
+        generation = self.generation
+        col_fam = ColumnFamily(pool, name, **self.options)
+        with self.lock:
+            if pool is not self.pool:
+                # the pool has been rebuilt, after a fork or a dispose
+                self.cfs = {}
+                self.pool = pool
+            elif generation != self.generation:
+                # invalidated while reading the schema, which may be stale
+                return col_fam
+            return self.cfs.setdefault(name, col_fam)
+
+    def token_bounds(self):
+        """Returns the (start, finish) tokens of the whole ring, for the
+        partitioner of the cluster. The partitioner is asked once per pool.
+
+        """
+        pool = self.model.pool
+        if pool is not self.bounds_pool:
+            conn = pool.get()
+            try:
+                partitioner = conn.describe_partitioner()
+            finally:
+                conn.return_to_pool()
+            partitioner = partitioner[partitioner.rfind('.') + 1:]
+            if partitioner not in TOKEN_BOUNDS:
+                raise ModelException("%s: cannot split the token ring of the "
+                                     "%s, token bounds must be given" %
+                                     (self.model.__column_family__,
+                                      partitioner))
+            self.bounds = TOKEN_BOUNDS[partitioner]
+            self.bounds_pool = pool
+        return self.bounds
+
+    def batch(self, queue_size=BATCH_QUEUE_SIZE, write_consistency_level=None,
+              **kwargs):
+        """Returns a pycassa Mutator writing with `write_consistency_level`,
+        or the model one.
+
+        """
+        return Mutator(self.model.pool, queue_size=queue_size,
+                       write_consistency_level=write_consistency_level or
+                                               self.write_level,
+                       **kwargs)
+
+    def invalidate(self, name=None):
+        """Forget the ColumnFamily named `name`, or all of them if `name` is
+        None. Must be called when a column family is dropped and recreated,
+        or altered. The Builder does it for the changes it makes.
+
+        """
+        with self.lock:
+            self.generation += 1
+            if name is None:
+                self.cfs.clear()
+            else:
+                self.cfs.pop(name, None)
+
+    def after_fork(self):
+        """Forget ColumnFamily objects of the parent process pools, and
+        replace the lock, which another thread of the parent could hold.
+
+        """
+        self.lock = threading.Lock()
+        self.cfs = {}
+        self.pool = None
+        self.bounds_pool = None
+
+@register_after_fork
+def _reset_cf_caches():
+    for cache in list(ColumnFamilyCache.instances):
+        cache.after_fork()
+
 ##################
 # models classes #
 ##################
@@ -98,38 +336,147 @@ class Column(object):
 class ModelAttribute(object):
     """This class wraps attributes (Column, ModelRelationship) of a Model with
     a descriptor-like object.
-    As there is only one object instanciated in the Model inherited class, this
-    class must store and retrieve values for all Model object instances.
+    As there is only one object instanciated in the Model inherited class,
+    values are stored in the `__dict__` of each Model object instance, under
+    the attribute name. Being a data descriptor, this object still takes
+    precedence over the instance dict, and values are freed with the instance.
 
     """
     def __init__(self, host_class, attribute, prop):
         self.host_class = host_class
         self.attribute = attribute
         self.prop = prop
-        self.values = {}
+        # returns the value of an instance, once relationships are resolved
+        self.getter = prop.get if isinstance(prop, Column) else None
+
+    def _resolve(self):
+        """Configures the registry of the host class if needed, and returns
+        the getter of the property.
+
+        """
+        self.host_class.registry.configure()
+        self.getter = self.prop.get
+        return self.getter
 
     def __get__(self, instance, owner):
         """Access to the object is made.
         If `instance` is None, it means that we are called on the class object,
         so, simply returns self.
         If the returned value has already been saved, just returns it.
-        Otherwise, we initialize the property, and get the value.
+        Otherwise, the value is loaded by the property getter. Relationships
+        are resolved once, by configuring the registry on first access.
 
         """
         if instance is None:
             return self
-        self.prop.do_init(self.host_class)
-        if not self.values.get(instance):
-            self.values[instance] = self.prop.get(instance)
-        return self.values[instance]
+        values = instance.__dict__
+        try:
+            return values[self.attribute]
+        except KeyError:
+            pass
+        loader = values.get('_deferred')
+        if loader is not None and self.attribute in loader.attributes:
+            loader.load(self.attribute)
+            try:
+                return values[self.attribute]
+            except KeyError:
+                pass
+        getter = self.getter
+        if getter is None:
+            getter = self._resolve()
+        value = values[self.attribute] = getter(instance)
+        return value
 
     def __set__(self, instance, value):
-        """Set a value for a Model instance object attribute"""
-        if instance not in self.values:
-            self.values[instance] = value
-        else:
-            #TODO: updating objects is currently not supported
-            pass
+        """Set a value for a Model instance object attribute.
+        Changes of columns are recorded in the instance `_dirty` dict, with
+        the original values, to be written by :meth:`MetaModel.save_changes`.
+        A deferred column is loaded first, to know its original value. The
+        original value of a column that was not read is `NOT_LOADED`.
+
+        A relationship can only be given objects before it is loaded, for
+        instance by the constructor: relationships are updated by inserting
+        related objects, not by assigning them.
+
+        """
+        values = instance.__dict__
+        if not isinstance(self.prop, Column):
+            if self.attribute in values:
+                raise ModelException("%s: cannot assign the loaded "
+                                     "relationship %s" %
+                                     (self.host_class.__column_family__,
+                                      self.attribute))
+            values[self.attribute] = value
+            return
+        if self.attribute not in values:
+            loader = values.get('_deferred')
+            if loader is not None and self.attribute in loader.attributes:
+                loader.load(self.attribute)
+        dirty = values.setdefault('_dirty', {})
+        if self.attribute not in dirty:
+            dirty[self.attribute] = values.get(self.attribute, NOT_LOADED)
+        values[self.attribute] = value
+
+class DeferredLoader(object):
+    """Loads the deferred columns of objects read by the same query (see
+    the `only` and `defer` query options of :class:`MetaModel`).
+    When a deferred attribute of one of the objects is accessed, its column
+    is read for all of them at once, with multigets.
+
+    Objects can be added after a column was loaded, when the query results
+    are streamed: each attribute has its own list of objects to load, and
+    the next access reads the column of the new ones. Objects are only
+    weakly referenced, so that streamed objects are freed once dropped.
+
+    """
+    def __init__(self, model, attributes):
+        self.model = model
+        self.attributes = attributes
+        self.size = 0
+        self.pending = dict((attribute, []) for attribute in attributes)
+        self.lock = threading.Lock()
+
+    def add(self, obj):
+        """Adds `obj`, whose deferred columns are not loaded yet."""
+        ref = weakref.ref(obj)
+        with self.lock:
+            self.size += 1
+            for refs in self.pending.values():
+                refs.append(ref)
+
+    def load(self, attribute):
+        """Loads the column of `attribute` for all objects not having it."""
+        model = self.model
+        with self.lock:
+            refs = self.pending[attribute]
+            if not refs:
+                return
+            self.pending[attribute] = []
+            objects = [ref() for ref in refs]
+            pending = [obj for obj in objects
+                       if obj is not None and attribute not in obj.__dict__]
+            if not pending:
+                return
+            name = model._name_by_attr[attribute]
+            col_fam = model.cf_cache.get()
+            def fetch(chunk):
+                return list(col_fam.multiget(chunk, columns=[name]).items())
+            try:
+                with instrumentation.measure(model.__column_family__,
+                                             'load_deferred'):
+                    rows = parallel_map(fetch,
+                                        chunks([obj.rowkey for obj in pending],
+                                               MULTIGET_CHUNK_SIZE),
+                                        MULTIGET_WORKERS)
+            except Exception:
+                # loaded on next access
+                self.pending[attribute] = refs + self.pending[attribute]
+                raise
+            rows = dict(chain(*rows))
+            for obj in pending:
+                row = rows.get(obj.rowkey)
+                if row and name in row:
+                    obj.__dict__.setdefault(attribute, row[name])
 
 class MetaModel(type):
     """Represents a "standard" SQL table mapped on top of Cassandra.
@@ -139,6 +486,30 @@ class MetaModel(type):
     families can be in different keyspaces, and still have "cassobjects foreign
     keys" working.
 
+    Indexed, unique and foreign key columns use Cassandra secondary indexes.
+    With `__index_mode__ = 'manual'`, cassobjects maintains instead a lookup
+    column family per indexed column, named `<column family>_<column>_idx`,
+    where each row maps a value to the rowkeys having it. Lookups are then a
+    single row read.
+
+    Queries returning objects accept two projection options, lists of
+    attribute names or aliases:
+
+    - `only`: only these columns are fetched
+    - `defer`: all columns but these are fetched
+
+    The other columns are deferred: they are loaded on first access, for all
+    the objects of the result set at once. Multigets skip rows having none of
+    the fetched columns.
+
+    Index lookups, multigets and relationship loads accept a `hedge` option.
+    Hedged reads are sent a second time if they did not answer after the
+    95th percentile latency of the recent reads of the model, and the first
+    answer is used. The ConnectionPool gives the second request another
+    connection, usually to another server. Reads are hedged by default if
+    the model sets `__hedged_reads__` to True. Hedged index lookups read all
+    matching rows before yielding objects.
+
     """
     def __init__(cls, name, bases, dct):
         """Verify model validity, add methods in `cls` to access indexes,
@@ -150,14 +521,37 @@ class MetaModel(type):
         # Indexes
         indexes = dct.get('__indexes__', [])
         columns = {}
-        for attr, value in cls.__dict__.items():
+        # Lookup tables computed once per class. Column names are the names
+        # stored in Cassandra, ie. the alias if there is one.
+        cls._attr_by_name = {}
+        cls._name_by_attr = {}
+        cls._unique_columns = set()
+        cls._indexed_columns = set()
+        cls._foreign_keys = {}
+        cls._relationships = {}
+        for attr, value in list(cls.__dict__.items()):
             if isinstance(value, Column):
-                if hasattr(value, 'index') and value.index:
+                columns[attr] = value
+                col_name = value.alias or attr
+                cls._attr_by_name[attr] = attr
+                cls._attr_by_name[col_name] = attr
+                cls._name_by_attr[attr] = col_name
+                if value.unique:
+                    cls._unique_columns.add(col_name)
+                if value.index or value.foreign_key or value.unique:
+                    # unique columns and foreign keys are indexed too
+                    cls._indexed_columns.add(col_name)
                     setattr(cls, 'get_by_%s' % attr, partial(cls.get_by, attr))
+                    setattr(cls, 'iter_by_%s' % attr, partial(cls.iter_by, attr))
+                    setattr(cls, 'aget_by_%s' % attr, partial(cls.aget_by, attr))
+                    setattr(cls, 'aget_one_by_%s' % attr, partial(cls.aget_one_by, attr))
+                    setattr(cls, 'aiter_by_%s' % attr, partial(cls.aiter_by, attr))
                     setattr(cls, 'get_one_by_%s' % attr, partial(cls.get_one_by, attr))
-                columns[attr] = value
+                if value.foreign_key:
+                    cls._foreign_keys[col_name] = value.foreign_key
                 setattr(cls, attr, ModelAttribute(cls, attr, value))
             elif isinstance(value, ModelRelationship):
+                cls._relationships[attr] = value
                 setattr(cls, attr, ModelAttribute(cls, attr, value))
         if indexes:
             raise ModelException('Following indexes "%s" are not declared as '
@@ -165,36 +559,171 @@ class MetaModel(type):
         # Column family name
         if '__column_family__' not in dct:
             cls.__column_family__ = cls.__name__.lower()
+        # Indexes maintained by cassobjects: one column family per indexed
+        # column, rowkeys are values, column names are rowkeys of the model
+        index_mode = getattr(cls, '__index_mode__', 'native')
+        if index_mode not in ('native', 'manual'):
+            raise ModelException('%s: unknown index mode "%s"' %
+                                 (cls.__column_family__, index_mode))
+        cls._manual_indexes = {}
+        if index_mode == 'manual':
+            for col_name in cls._indexed_columns:
+                cls._manual_indexes[col_name] = '%s_%s_idx' % \
+                    (cls.__column_family__, col_name)
+        cls.cf_cache = ColumnFamilyCache(cls)
+        cls._hedged_reads = getattr(cls, '__hedged_reads__', False)
+        cls._latencies = {}
+        # Recently seen values of unique columns, known to be taken
+        cache_size = getattr(cls, '__unique_cache_size__', 0)
+        cls._taken_values = LRUCache(cache_size) if cache_size else None
 
         # add the model in the CFRegistry object
         cls.registry.add(cls, columns)
 
         return type.__init__(cls, name, bases, dct)
 
-    def get_by(cls, attribute, value):
+    @instrumented_iter('iter_by')
+    def iter_by(cls, attribute, value, count=100, buffer_size=None,
+                columns=None, start_key='', **kwargs):
         """Only works for columns indexed in Cassandra.
         This means that the property must be in the __indexes__ attribute.
 
+        Matched rows are fetched by pages of `buffer_size` rows, and objects
+        are yielded as they come, so memory use does not depend on the number
+        of matches.
+
         :param attribute: The attribute to lookup.
           This argument is always provided by the partial method.
 
         :param value: The value to match.
 
-        Returns a list of matched objects.
+        :param count: Maximum number of objects to yield. None means no limit.
+
+        :param buffer_size: Number of rows fetched per query, defaults to the
+          pycassa one.
+
+        :param columns: Only fetch these columns (attribute names or
+          aliases).
+
+        :param start_key: Rowkey to start the lookup from.
+
+        :param only, defer: Projection options, see :class:`MetaModel`.
+
+        :param hedge: Hedge the lookup, see :class:`MetaModel`.
+
+        Other keyword arguments (`read_consistency_level`...) are given to
+        pycassa `get_indexed_slices`, or `multiget` for models using manual
+        indexes.
+
+        """
+        names = cls._name_by_attr
+        attribute = names.get(attribute, attribute)
+        if columns is not None:
+            kwargs['columns'] = [names.get(col, col) for col in columns]
+        if count is None:
+            count = MAX_COUNT
+        if attribute in cls._manual_indexes:
+            for rowkeys in cls._iter_index(attribute, value, count,
+                                           buffer_size, start_key,
+                                           kwargs.get('read_consistency_level')):
+                for obj in cls.get_many(rowkeys, **kwargs):
+                    yield obj
+            return
+        deferred = cls._projection(kwargs)
+        hedge = kwargs.pop('hedge', None)
+        kwargs.setdefault('column_count', MAX_COUNT)
+        col_fam = cls.cf_cache.get()
+        clause = create_index_clause([create_index_expression(attribute, value)],
+                                     start_key=start_key, count=count)
+        if hedge or (hedge is None and cls._hedged_reads):
+            idx_slices = _read(cls, 'get_indexed_slices', True,
+                               lambda: list(col_fam.get_indexed_slices(
+                                   clause, buffer_size=buffer_size, **kwargs)))
+        else:
+            idx_slices = col_fam.get_indexed_slices(clause,
+                                                    buffer_size=buffer_size,
+                                                    **kwargs)
+        projected = deferred is None and 'columns' in kwargs
+        for obj in cls.hydrate(idx_slices, deferred, projected):
+            yield obj
+
+    def _projection(cls, kwargs):
+        """Pops the `only` and `defer` options from query keyword arguments,
+        and sets the `columns` to fetch instead.
+        Returns the set of deferred attributes, or None.
+
+        """
+        only = kwargs.pop('only', None)
+        defer = kwargs.pop('defer', None)
+        if only is None and defer is None:
+            return None
+        cf = cls.__column_family__
+        if (only is not None and defer is not None) or 'columns' in kwargs:
+            raise ModelException("%s: only one of only, defer and columns "
+                                 "can be given" % cf)
+        attributes = set()
+        for name in (only if only is not None else defer):
+            if name not in cls._attr_by_name:
+                raise ModelException('%s: no column "%s" found' % (cf, name))
+            attributes.add(cls._attr_by_name[name])
+        if only is None:
+            attributes = set(cls._name_by_attr) - attributes
+        if not attributes:
+            raise ModelException("%s: no column left to fetch" % cf)
+        kwargs['columns'] = [cls._name_by_attr[attr] for attr in attributes]
+        return frozenset(set(cls._name_by_attr) - attributes)
+
+    def _iter_index(cls, name, value, count, buffer_size=None, start_key='',
+                    read_consistency_level=None):
+        """Iterates over rowkeys matching `value` in the manual index of
+        column `name`, by lists of at most `buffer_size` rowkeys.
+
+        """
+        col_fam = cls.cf_cache.get(cls._manual_indexes[name])
+        page_size = buffer_size or MULTIGET_CHUNK_SIZE
+        start = start_key
+        first = True
+        while count > 0:
+            # the first column of next pages is the last one of the previous
+            size = min(page_size, count) + (0 if first else 1)
+            try:
+                rowkeys = list(col_fam.get(value, column_start=start,
+                                           column_count=size,
+                                           read_consistency_level=
+                                               read_consistency_level).keys())
+            except NotFoundException:
+                return
+            fetched = len(rowkeys)
+            if not first and rowkeys and rowkeys[0] == start:
+                rowkeys = rowkeys[1:]
+            if not rowkeys:
+                return
+            yield rowkeys
+            count -= len(rowkeys)
+            if fetched < size:
+                return
+            start = rowkeys[-1]
+            first = False
+
+    @instrumented('get_by')
+    def get_by(cls, attribute, value, **kwargs):
+        """Same as :meth:`iter_by`, but returns a list of matched objects.
+        Accepts the same keyword arguments.
+
+        :param attribute: The attribute to lookup.
+          This argument is always provided by the partial method.
+
+        :param value: The value to match.
 
         """
-        col_fam = ColumnFamily(cls.pool, cls.__column_family__)
-        clause = create_index_clause([create_index_expression(attribute, value)])
-        idx_slices = col_fam.get_indexed_slices(clause)
-        result = []
-        for rowkey, columns in idx_slices:
-            result.append(cls(rowkey, **columns))
-        return result
+        return list(cls.iter_by(attribute, value, **kwargs))
 
-    def get_one_by(cls, attribute, value):
-        """Same as :meth:`get_one`, except that it will raise if more than one
+    @instrumented('get_one_by')
+    def get_one_by(cls, attribute, value, **kwargs):
+        """Same as :meth:`get_by`, except that it will raise if more than one
         value is returned, and will return directly an object instead of a
         list.
+        No more than two rows are fetched.
 
         :param attribute: The attribute to lookup.
           This argument is always provided by the partial method.
@@ -202,34 +731,394 @@ class MetaModel(type):
         :param value: The value to match.
 
         """
-        res = cls.get_by(attribute, value)
+        kwargs['count'] = 2
+        res = list(cls.iter_by(attribute, value, **kwargs))
         if len(res) > 1 or len(res) == 0:
             raise ModelException("get_one_by_%s() returned more than one "
                                  "element or zero" % attribute)
         return res[0]
 
-    # Maps pycassa.ColumnFamily methods
+    @instrumented('get_many')
+    def get_many(cls, keys, chunk_size=MULTIGET_CHUNK_SIZE,
+                 workers=MULTIGET_WORKERS, **kwargs):
+        """Returns objects for all the given rowkeys, in the same order.
+        Rowkeys not found are skipped.
+
+        Keys are split in multigets of `chunk_size` rowkeys, and at most
+        `workers` multigets are run at the same time.
+        Other keyword arguments (`read_consistency_level`...) are given to
+        pycassa `multiget`.
+
+        Objects already in the current session, and rows in the read cache
+        (only used when there are no keyword arguments) are not fetched.
+        Accepts the `only` and `defer` projection options, and the `hedge`
+        option, see :class:`MetaModel`.
+
+        """
+        cf = cls.__column_family__
+        keys = list(keys)
+        deferred = cls._projection(kwargs)
+        hedge = kwargs.pop('hedge', None)
+        session = current_session()
+        cache = get_read_cache() if not kwargs else None
+        objects = {}
+        rows = {}
+        missing = []
+        for key in keys:
+            if session is not None:
+                obj = session.get(cf, key)
+                if obj is not None:
+                    objects[key] = obj
+                    continue
+            if cache is not None:
+                row = cache.get((cf, key))
+                if row is not None:
+                    rows[key] = row
+                    continue
+            missing.append(key)
+        if missing:
+            col_fam = cls.cf_cache.get()
+            kwargs.setdefault('column_count', MAX_COUNT)
+            def fetch(chunk):
+                return list(_read(cls, 'multiget', hedge, col_fam.multiget,
+                                  chunk, **kwargs).items())
+            fetched = parallel_map(fetch, chunks(missing, chunk_size), workers)
+            for key, row in chain(*fetched):
+                rows[key] = row
+                if cache is not None:
+                    cache.set((cf, key), row)
+        projected = deferred is None and 'columns' in kwargs
+        for obj in cls.hydrate(rows.items(), deferred, projected):
+            objects[obj.rowkey] = obj
+        return [objects[key] for key in keys if key in objects]
+
+    @instrumented('get_one_by_rowkey')
+    def get_one_by_rowkey(cls, rowkey, **kwargs):
+        """Get the object by the rowkey. Same keyword arguments as
+        :meth:`get_many`.
+
+        """
+        res = cls.get_many([rowkey], **kwargs)
+        if not res:
+            raise ModelException("get_one_by_rowkey() returned zero element")
+        return res[0]
+
+    @instrumented_iter('iter_range')
+    def iter_range(cls, start='', finish='', **kwargs):
+        """Iterates over objects of the column family, from rowkey `start` to
+        `finish`. Same keyword arguments as pycassa `get_range`, and the
+        `only` and `defer` projection options.
+
+        """
+        deferred = cls._projection(kwargs)
+        projected = deferred is None and 'columns' in kwargs
+        kwargs.setdefault('column_count', MAX_COUNT)
+        col_fam = cls.cf_cache.get()
+        rows = col_fam.get_range(start, finish, **kwargs)
+        # deleted rows are returned without columns
+        return cls.hydrate(((rowkey, row) for rowkey, row in rows if row),
+                           deferred, projected)
+
+    @instrumented_iter('parallel_scan')
+    def parallel_scan(cls, workers=MULTIGET_WORKERS, splits=None,
+                      checkpoint=None, buffer_size=None, token_bounds=None,
+                      **kwargs):
+        """Iterates over all objects of the column family. The token ring is
+        divided in `splits` ranges, scanned concurrently by `workers` threads.
+        Objects are built by the threads, and yielded as they come, so their
+        order is not defined. They are not added to the current session.
+
+        :param splits: Number of token ranges, defaults to four per worker.
+
+        :param checkpoint: Dict-like object (a dict, a `shelve`...) where the
+          progress of each range is recorded: the rowkey of the last object
+          the caller was done with, or `SCAN_DONE`. A scan given the
+          checkpoint of an interrupted scan, with the same number of
+          splits, resumes where it stopped. Delivery is at least once: the
+          rowkey of an object is recorded when the next one is asked for, so
+          the object the caller was handling when the scan was interrupted
+          is yielded again.
+
+        :param buffer_size: Number of rows read per query.
+
+        :param token_bounds: (start, finish) tokens of the whole ring, see
+          `TOKEN_BOUNDS`. Defaults to the bounds of the partitioner of the
+          cluster, which must then be the Random or Murmur3 partitioner.
+
+        Other keyword arguments are given to pycassa `get_range`, and
+        the `only` and `defer` projection options are accepted.
+
+        """
+        deferred = cls._projection(kwargs)
+        kwargs.setdefault('column_count', MAX_COUNT)
+        col_fam = cls.cf_cache.get()
+        if checkpoint is None:
+            checkpoint = {}
+        page_size = buffer_size or MULTIGET_CHUNK_SIZE
+        if buffer_size is not None:
+            kwargs['buffer_size'] = buffer_size
+        tasks = Queue()
+        if token_bounds is None:
+            token_bounds = cls.cf_cache.token_bounds()
+        for start_token, finish_token in token_ranges(splits or workers * 4,
+                                                      token_bounds):
+            split = '%s:%s' % (start_token, finish_token)
+            if checkpoint.get(split) != SCAN_DONE:
+                tasks.put((split, start_token, finish_token,
+                           checkpoint.get(split)))
+        results = Queue(workers * 2)
+        stop = threading.Event()
+
+        def emit(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def scan():
+            try:
+                while not stop.is_set():
+                    try:
+                        split, start_token, finish_token, last = \
+                            tasks.get_nowait()
+                    except Empty:
+                        break
+                    if last is None:
+                        rows = col_fam.get_range(start_token=start_token,
+                                                 finish_token=finish_token,
+                                                 **kwargs)
+                    else:
+                        rows = col_fam.get_range(start=last,
+                                                 finish_token=finish_token,
+                                                 **kwargs)
+                    page = []
+                    for rowkey, row in rows:
+                        if row and rowkey != last:
+                            page.append((rowkey, row))
+                        if len(page) >= page_size:
+                            if not emit((split, list(cls.hydrate(page, deferred)),
+                                         False, None)):
+                                return
+                            page = []
+                    if not emit((split, list(cls.hydrate(page, deferred)),
+                                 True, None)):
+                        return
+            except Exception as e:
+                emit((None, None, True, e))
+            emit(None)
+
+        threads = [threading.Thread(target=scan)
+                   for _ in range(max(min(workers, tasks.qsize()), 1))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = len(threads)
+        try:
+            while running:
+                item = results.get()
+                if item is None:
+                    running -= 1
+                    continue
+                split, objects, done, error = item
+                if error is not None:
+                    raise error
+                for obj in objects:
+                    yield obj
+                    checkpoint[split] = obj.rowkey
+                if done:
+                    checkpoint[split] = SCAN_DONE
+        finally:
+            stop.set()
+
+    def hydrate(cls, rows, deferred=None, projected=False):
+        """Builds objects from an iterable of (rowkey, columns) as returned by
+        pycassa.
+
+        Unlike the constructor, column names are only resolved through the
+        class lookup table.
+
+        Within a session, an object already loaded is returned again, and
+        only gets the attributes it did not have yet.
+
+        :param deferred: Attributes not fetched, loaded on first access by a
+          :class:`DeferredLoader` shared by consecutive objects.
+
+        :param projected: Rows only hold some of the columns, and the other
+          ones are not deferred. New objects are then not added to the
+          session, which must only give back complete objects.
+
+        """
+        cf = cls.__column_family__
+        session = current_session()
+        attr_by_name = cls._attr_by_name
+        new = cls.__new__
+        loader = None
+        timed = bool(instrumentation.listeners)
+        for rowkey, row in rows:
+            if timed:
+                start = time.time()
+            obj = None
+            if session is not None:
+                obj = session.get(cf, rowkey)
+            if obj is None:
+                obj = new(cls)
+                values = obj.__dict__
+                values['rowkey'] = rowkey
+                if deferred:
+                    if loader is None or \
+                        loader.size >= DEFERRED_BATCH_SIZE:
+                        loader = DeferredLoader(cls, deferred)
+                    loader.add(obj)
+                    values['_deferred'] = loader
+                try:
+                    for name, value in row.items():
+                        values[attr_by_name[name]] = value
+                except KeyError:
+                    raise ModelException("%s can't be resolved in %s" % (name, cls))
+                if session is not None and not projected:
+                    session.add(cf, obj)
+            else:
+                values = obj.__dict__
+                try:
+                    for name, value in row.items():
+                        values.setdefault(attr_by_name[name], value)
+                except KeyError:
+                    raise ModelException("%s can't be resolved in %s" % (name, cls))
+            if timed:
+                instrumentation.record_hydration(time.time() - start)
+            yield obj
+
+    @instrumented('prefetch_related')
+    def prefetch_related(cls, instances, *names, **kwargs):
+        """Loads relationships `names` of all `instances` at once, with as few
+        queries as possible. Loaded objects are stored in the instances, so
+        reading the relationship attributes does not query Cassandra.
+
+        :param workers: Maximum number of queries running at the same time.
+
+        :param read_consistency_level, hedge: Read options, overriding the
+          ones given to :func:`relationship`.
+
+        """
+        workers = kwargs.pop('workers', MULTIGET_WORKERS)
+        instances = list(instances)
+        rowkeys = [instance.rowkey for instance in instances]
+        for name in names:
+            related = cls._relationship(name).prefetch(rowkeys, workers,
+                                                       **kwargs)
+            for instance, objects in zip(instances, related):
+                instance.__dict__[name] = objects
+
+    def load_related(cls, instance, name, **kwargs):
+        """Loads the relationship `name` of `instance`, even if already
+        loaded, and stores it in the instance. Returns the related objects.
+        Accepts the same read options as :meth:`prefetch_related`.
+
+        """
+        objects = cls._relationship(name).get(instance, **kwargs)
+        instance.__dict__[name] = objects
+        return objects
+
+    def _relationship(cls, name):
+        """Returns the resolved relationship `name` of the model"""
+        attr = cls.__dict__.get(name)
+        if not isinstance(attr, ModelAttribute) or \
+            not isinstance(attr.prop, ModelRelationship):
+            raise ModelException('%s: "%s" is not a relationship' %
+                                 (cls.__column_family__, name))
+        cls.registry.configure()
+        return attr.prop
+
+    def aload_related(cls, instance, name):
+        """Returns a future of the relationship `name` of `instance`, loaded
+        in the executor of the model pool.
+
+        """
+        return aio.submit(cls, getattr, instance, name)
+
+    # Asynchronous versions of queries, see cassobjects.aio
+    aget_by = _async('get_by')
+    aget_one_by = _async('get_one_by')
+    aiter_by = _async_iter('iter_by')
+    aget_many = _async('get_many')
+    aget_one_by_rowkey = _async('get_one_by_rowkey')
+    aiter_range = _async_iter('iter_range')
+    aparallel_scan = _async_iter('parallel_scan')
+    aprefetch_related = _async('prefetch_related')
+    ainsert = _async('insert')
+    abulk_insert = _async('bulk_insert')
+    asave_changes = _async('save_changes')
+
+    # Maps pycassa.ColumnFamily methods. `get`, `multiget` and `get_range`
+    # accept the `only` and `defer` options to select columns.
+    @instrumented('get')
     def get(self, *args, **kwargs):
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
+        self._projection(kwargs)
+        col_fam = self.cf_cache.get()
         return col_fam.get(*args, **kwargs)
 
+    @instrumented('multiget', rows=len)
     def multiget(self, *args, **kwargs):
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
+        self._projection(kwargs)
+        col_fam = self.cf_cache.get()
         return col_fam.multiget(*args, **kwargs)
 
+    @instrumented('get_count')
     def get_count(self, *args, **kwargs):
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
+        col_fam = self.cf_cache.get()
         return col_fam.get_count(*args, **kwargs)
 
+    @instrumented('multiget_count', rows=len)
     def multiget_count(self, *args, **kwargs):
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
+        col_fam = self.cf_cache.get()
         return col_fam.multiget_count(*args, **kwargs)
 
+    @instrumented_iter('get_range')
     def get_range(self, *args, **kwargs):
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
+        self._projection(kwargs)
+        col_fam = self.cf_cache.get()
         return col_fam.get_range(*args, **kwargs)
 
-    def insert(self, columns, **kwargs):
+    def batch(self, queue_size=BATCH_QUEUE_SIZE, **kwargs):
+        """Returns a pycassa Mutator, to give as `batch` argument to
+        :meth:`insert`. Mutations are sent every `queue_size` mutations, and
+        when leaving the `with` block if used as a context manager.
+        Writes use the model consistency level, unless a
+        `write_consistency_level` is given.
+
+        """
+        return self.cf_cache.batch(queue_size, **kwargs)
+
+    @instrumented('bulk_insert')
+    def bulk_insert(self, rows, queue_size=BATCH_QUEUE_SIZE, **kwargs):
+        """Insert many rows (dicts of columns, like for :meth:`insert`) using a
+        single batch. Returns the list of created objects.
+
+        All rows are resolved, and their uniqueness checked, before anything
+        is queued, and mutations still queued when a row fails are not sent,
+        so that an invalid row fails the whole call without writing anything.
+        This is not a transaction though: the batch is sent every
+        `queue_size` mutations, and a failed write can leave the previous
+        ones applied.
+        Accepts the same keyword arguments as :meth:`insert`.
+
+        """
+        rows = [self._resolve_columns(columns) for columns in rows]
+        self._check_unique(rows, kwargs.pop('read_consistency_level', None))
+        write_level = kwargs.pop('write_consistency_level', None)
+        # not used as a context manager: mutations still queued when a row
+        # fails are discarded instead of being sent
+        batch = self.batch(queue_size, write_consistency_level=write_level)
+        objs = [self._insert(columns, batch, **kwargs) for columns in rows]
+        batch.send()
+        self._remember_taken(rows)
+        return objs
+
+    @instrumented('insert')
+    def insert(self, columns, batch=None, **kwargs):
         """Insert a new row in the column family.
 
         Several things are checked before inserting:
@@ -237,49 +1126,293 @@ class MetaModel(type):
         - Verify that inputs exists in class, and resolve aliases.
         - As we are handling manually uniqueness, we must ensure that all
           unique fields are present in the `columns` parameter.
-        - For all unique fields, we use :meth:`get_by` to ensure given value is
-          actually.. unique.
+        - For all unique fields, an index lookup ensures given value is
+          actually.. unique. These lookups are made concurrently, and do
+          not go through the session.
         - We need to create a TimeUUID compatible object using pycassa helper.
 
         Fields that refers to relationships cannot be assigned directly at
         insert. Maybe this will be implemented later.
 
-        TODO: maybe it will need to have some consistency level adjusted to
-        avoid possible race conditions.
+        If `batch` is given (see :meth:`batch`), the row is queued in it
+        instead of being sent right away, and written with the consistency
+        level of the batch. Values of unique columns already queued in the
+        same batch are refused too.
+
+        If the model defines `__unique_cache_size__`, that many values of
+        unique columns known to be taken are remembered, and inserting one of
+        them again fails without querying Cassandra. Values of rows queued in
+        a batch given by the caller are not remembered, as the batch may
+        never be sent.
+
+        :param read_consistency_level: Consistency level of the uniqueness
+          lookups. Reading and writing at QUORUM narrows the window in which
+          two clients can insert the same unique value.
+
+        Other keyword arguments (`write_consistency_level`, `ttl`...) are
+        given to pycassa `insert`.
+
+        """
+        columns = self._resolve_columns(columns)
+        self._check_unique([columns], kwargs.pop('read_consistency_level', None),
+                           batch=batch)
+        return self._insert(columns, batch, **kwargs)
+
+    def _resolve_columns(self, columns):
+        """Verify inputs and resolve aliases. Returns a new dict of columns
+        keyed by column names.
 
         """
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
-        reg = self.registry[self.__column_family__]
-        # verify inputs and resolve aliases
-        for k, v in dict(columns).items():
-            if k not in reg:
+        names = self._name_by_attr
+        resolved = {}
+        for k, v in columns.items():
+            if k not in names:
                 raise ModelException('%s: no column "%s" found' %
                                      (self.__column_family__, k))
-            if hasattr(reg[k], 'alias') and reg[k].alias:
-                columns[reg[k].alias] = v
-                del columns[k]
+            resolved[names[k]] = v
         # handles unique keys
-        unique = [k for k, v in reg.items()
-                  if hasattr(v, 'unique') and v.unique]
-        missing = set(unique) - set(columns.keys())
+        missing = self._unique_columns - set(resolved)
         if missing:
             raise ModelException("%s: cannot insert without following fields: %s" %
                                  (self.__column_family__, ','.join(missing)))
-        # ensure uniqueness
-        verif_unique = [(k, v) for k, v in columns.items() if k in unique]
-        for k, v in verif_unique:
-            exists = self.get_by(k, v)
-            if exists:
-                # we have a hit, so this value is not unique
-                break
+        return resolved
+
+    def _check_unique(self, rows, read_consistency_level=None,
+                      workers=MULTIGET_WORKERS, batch=None):
+        """Ensure that values of unique columns in `rows` are neither taken
+        in Cassandra, nor used twice in `rows`, nor queued in `batch`. If
+        they are not, they are recorded as queued in `batch`.
+
+        """
+        unique = self._unique_columns
+        if not unique:
+            return
+        taken = self._taken_values
+        queued = self._queued_unique(batch) if batch is not None else set()
+        candidates = set()
+        for columns in rows:
+            for k in unique:
+                if k not in columns:
+                    continue
+                pair = (k, columns[k])
+                if pair in candidates or pair in queued or \
+                    (taken is not None and pair in taken):
+                    # some key in not unique
+                    raise ModelException("%s: cannot create, a value is not "
+                                         "unique" % self.__column_family__)
+                candidates.add(pair)
+        col_fam = self.cf_cache.get()
+        def exists(pair):
+            # rows are not hydrated, so the lookups bypass the session
+            name, value = pair
+            with instrumentation.measure(self.__column_family__,
+                                         'check_unique'):
+                if name in self._manual_indexes:
+                    return bool(list(self._iter_index(
+                        name, value, 1,
+                        read_consistency_level=read_consistency_level)))
+                clause = create_index_clause(
+                    [create_index_expression(name, value)], count=1)
+                return bool(list(col_fam.get_indexed_slices(
+                    clause, columns=[name],
+                    read_consistency_level=read_consistency_level)))
+        candidates = list(candidates)
+        hits = parallel_map(exists, candidates, workers)
+        if any(hits):
+            if taken is not None:
+                for pair, hit in zip(candidates, hits):
+                    if hit:
+                        taken.set(pair)
+            raise ModelException("%s: cannot create, a value is not unique" %
+                                 self.__column_family__)
+        queued.update(candidates)
+
+    def _queued_unique(self, batch):
+        """Returns the set of (column, value) of unique columns of the model
+        queued in `batch`.
+
+        """
+        by_model = _queued_unique.get(batch)
+        if by_model is None:
+            by_model = _queued_unique[batch] = {}
+        return by_model.setdefault(self.__column_family__, set())
+
+    def _remember_taken(self, rows):
+        """Remembers the values of unique columns of written `rows` as
+        taken, if the model has a cache of taken values.
+
+        """
+        if self._taken_values is not None:
+            for columns in rows:
+                for k in self._unique_columns:
+                    self._taken_values.set((k, columns[k]))
+
+    def _insert(self, columns, batch=None, **kwargs):
+        """Write a row of resolved and checked columns. Manual indexes are
+        written in the same batch.
+
+        """
+        col_fam = self.cf_cache.get()
+        # generate a TimeUUID object for the rowkey
+        key = new_timeuuid()
+        write_level = kwargs.pop('write_consistency_level', None)
+        # index entries expire with the row
+        ttl = kwargs.get('ttl')
+        # rows queued in a batch are remembered as taken once it is sent
+        queued = batch is not None
+        if self._manual_indexes and batch is None:
+            with self.batch(write_consistency_level=write_level) as batch:
+                batch.insert(col_fam, key, columns, **kwargs)
+                self._index_row(batch, key, columns, ttl)
+        elif batch is not None:
+            batch.insert(col_fam, key, columns, **kwargs)
+            self._index_row(batch, key, columns, ttl)
         else:
-            # generate a TimeUUID object for the rowkey
-            key = convert_time_to_uuid(datetime.utcnow())
-            ret = col_fam.insert(key, columns, **kwargs)
-            return self(key, **columns)
-        # some key in not unique
-        raise ModelException("%s: cannot create, a value is not unique" %
-                             self.__column_family__)
+            col_fam.insert(key, columns, write_consistency_level=write_level,
+                           **kwargs)
+        if not queued:
+            self._remember_taken([columns])
+        invalidate(self.__column_family__, key)
+        obj = self(key, **columns)
+        session = current_session()
+        if session is not None:
+            session.add(self.__column_family__, obj)
+        return obj
+
+
+    @instrumented('save', rows=len)
+    def save_changes(self, objects, batch=None, **kwargs):
+        """Writes the changed columns of `objects`, as recorded when setting
+        their attributes, in a single batch. Returns the objects that had
+        changes.
+
+        Uniqueness of the new values of changed unique columns is checked for
+        all objects before anything is written. Columns set to None are
+        removed. Manual index entries of changed columns are moved: stored
+        values of changed unique or manually indexed columns that were not
+        read, for instance because of a column projection, are read first.
+
+        If `batch` is given (see :meth:`batch`), mutations are queued in it
+        instead, and unique values are checked against those already queued
+        in it, as for :meth:`insert`. Accepts the `read_consistency_level`
+        and `write_consistency_level` options of :meth:`insert`, other
+        keyword arguments are given to pycassa `Mutator.insert`.
+
+        """
+        read_level = kwargs.pop('read_consistency_level', None)
+        write_level = kwargs.pop('write_consistency_level', None)
+        names = self._name_by_attr
+        changes = []
+        for obj in objects:
+            values = obj.__dict__
+            dirty = values.get('_dirty')
+            if not dirty:
+                continue
+            changed = {}
+            for attr, original in dirty.items():
+                if values.get(attr) != original:
+                    changed[names[attr]] = (original, values.get(attr))
+            if changed:
+                changes.append((obj, changed))
+            else:
+                del values['_dirty']
+        if not changes:
+            return []
+        unique = self._unique_columns
+        self._load_originals(changes, unique, read_level)
+        for obj, changed in changes:
+            if not changed:
+                del obj.__dict__['_dirty']
+        changes = [(obj, changed) for obj, changed in changes if changed]
+        if not changes:
+            return []
+        self._check_unique([dict((name, new) for name, (old, new) in changed.items()
+                                 if name in unique and new is not None)
+                            for obj, changed in changes], read_level,
+                           batch=batch)
+        col_fam = self.cf_cache.get()
+        own_batch = batch is None
+        if own_batch:
+            batch = self.batch(write_consistency_level=write_level)
+        for obj, changed in changes:
+            key = obj.rowkey
+            columns = dict((name, new) for name, (old, new) in changed.items()
+                           if new is not None)
+            removed = [name for name, (old, new) in changed.items()
+                       if new is None]
+            if columns:
+                batch.insert(col_fam, key, columns, **kwargs)
+            if removed:
+                batch.remove(col_fam, key, columns=removed)
+            for name, index_cf in self._manual_indexes.items():
+                if name in changed:
+                    old, new = changed[name]
+                    index_cf = self.cf_cache.get(index_cf)
+                    if old is not None:
+                        batch.remove(index_cf, old, columns=[key])
+                    if new is not None:
+                        batch.insert(index_cf, new, {key: ''},
+                                     ttl=kwargs.get('ttl'))
+        if own_batch:
+            batch.send()
+        taken = self._taken_values
+        cache = get_read_cache()
+        for obj, changed in changes:
+            del obj.__dict__['_dirty']
+            if taken is not None:
+                for name, (old, new) in changed.items():
+                    if name in unique:
+                        taken.discard((name, old))
+                        # a batch of the caller may never be sent
+                        if new is not None and own_batch:
+                            taken.set((name, new))
+            # objects stay in the session, they are up to date
+            if cache is not None:
+                cache.invalidate((self.__column_family__, obj.rowkey))
+        return [obj for obj, changed in changes]
+
+    def _load_originals(self, changes, unique, read_consistency_level=None):
+        """Replaces in `changes` the `NOT_LOADED` original values of unique
+        and manually indexed columns by their stored values, read with a
+        single multiget. Columns set to their stored value are dropped from
+        `changes`. Other unknown original values become None.
+
+        """
+        missing = {}
+        for obj, changed in changes:
+            for name, (old, new) in changed.items():
+                if old is not NOT_LOADED:
+                    continue
+                if name in unique or name in self._manual_indexes:
+                    missing.setdefault(obj.rowkey, set()).add(name)
+                else:
+                    changed[name] = (None, new)
+        if not missing:
+            return
+        columns = set()
+        for names in missing.values():
+            columns.update(names)
+        col_fam = self.cf_cache.get()
+        stored = col_fam.multiget(list(missing), columns=list(columns),
+                                  read_consistency_level=read_consistency_level)
+        for obj, changed in changes:
+            row = stored.get(obj.rowkey, {})
+            for name in missing.get(obj.rowkey, ()):
+                new = changed[name][1]
+                if row.get(name) == new:
+                    del changed[name]
+                else:
+                    changed[name] = (row.get(name), new)
+
+    def _index_row(self, batch, rowkey, columns, ttl=None):
+        """Queue in `batch` the manual index entries of a row, expiring
+        after `ttl` seconds if given.
+
+        """
+        for name, index_cf in self._manual_indexes.items():
+            if name in columns:
+                batch.insert(self.cf_cache.get(index_cf), columns[name],
+                             {rowkey: ''}, ttl=ttl)
 
 
 class MetaTimestampedModel(type):
@@ -291,6 +1424,21 @@ class MetaTimestampedModel(type):
     object.
     This kind of model can't support Columns, and foreign keys.
 
+    Objects are serialized with the serializer named by the `__serializer__`
+    class attribute (see :mod:`cassobjects.serializers`), json by default.
+    If `__compress_threshold__` is set, serialized objects bigger than this
+    number of bytes are compressed.
+    Versions read from Cassandra are only deserialized when accessed.
+
+    New versions are added to an object with :meth:`append_version`, which
+    honors these class attributes:
+
+    - `__delta_versions__`: dict objects are stored as deltas against the
+      last full version, with at most this number of deltas in a row.
+    - `__max_versions__`: oldest versions are removed beyond this number.
+    - `__version_ttl__`: versions expire this number of seconds after being
+      replaced by a new version.
+
     """
     def __init__(cls, name, bases, dct):
         if 'registry' in cls.__dict__:
@@ -298,53 +1446,682 @@ class MetaTimestampedModel(type):
         # Column family name
         if '__column_family__' not in dct:
             cls.__column_family__ = cls.__name__.lower()
+        cls.cf_cache = ColumnFamilyCache(cls)
+        cls._hedged_reads = getattr(cls, '__hedged_reads__', False)
+        cls._latencies = {}
+        try:
+            cls._serializer = serializers.get_serializer(
+                getattr(cls, '__serializer__', 'json'))
+        except serializers.SerializerException as e:
+            raise ModelException("%s: %s" % (cls.__column_family__, e))
+        cls._compress_threshold = getattr(cls, '__compress_threshold__', None)
+        cls._delta_versions = getattr(cls, '__delta_versions__', None)
+        cls._max_versions = getattr(cls, '__max_versions__', None)
+        cls._version_ttl = getattr(cls, '__version_ttl__', None)
 
         # add the model in the CFRegistry object
         cls.registry.add(cls, {})
 
         return type.__init__(cls, name, bases, dct)
 
+    @instrumented('get_one_by_rowkey')
     def get_one_by_rowkey(self, rowkey, **kwargs):
-        """Get the object by the rowkey. Supports pycassa method `get` kwargs."""
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
-        res = col_fam.get(rowkey, **kwargs)
-        if len(res) > 1 or len(res) == 0:
-            raise ModelException("get_one_by_rowkey() returned more than one "
-                                 "element or zero")
-        return self(rowkey, res[rowkey])
+        """Get the object by the rowkey, with all its versions. Supports
+        pycassa method `get` kwargs.
+
+        """
+        session = current_session()
+        if session is not None and not kwargs:
+            obj = session.get(self.__column_family__, rowkey)
+            if obj is not None:
+                return obj
+        col_fam = self.cf_cache.get()
+        add = session is not None and not kwargs
+        kwargs.setdefault('column_count', MAX_COUNT)
+        try:
+            res = col_fam.get(rowkey, **kwargs)
+        except NotFoundException:
+            raise ModelException("get_one_by_rowkey() returned zero element")
+        obj = self(rowkey, self._versions(rowkey, res.items()))
+        if add:
+            session.add(self.__column_family__, obj)
+        return obj
+
+    def _versions(self, rowkey, columns):
+        """Returns :class:`Versions` of the object `rowkey` made of the given
+        (column, value) items.
+
+        """
+        return Versions(columns, partial(self._load_column, rowkey))
+
+    def _load_column(self, rowkey, column):
+        """Returns the serialized value of a single version"""
+        col_fam = self.cf_cache.get()
+        return col_fam.get(rowkey, columns=[column])[column]
+
+    @instrumented('append_version')
+    def append_version(self, rowkey, obj, batch=None, **kwargs):
+        """Add `obj` as the new version of the existing object `rowkey`.
+
+        If `batch` is given (see :meth:`batch`), writes are queued in it
+        instead of being sent right away, with the consistency level of the
+        batch. Other keyword arguments are given to pycassa `insert`.
+
+        """
+        col_fam = self.cf_cache.get()
+        if batch is None:
+            insert = lambda columns, **kw: col_fam.insert(rowkey, columns, **kw)
+        else:
+            kwargs.pop('write_consistency_level', None)
+            insert = lambda columns, **kw: \
+                batch.insert(col_fam, rowkey, columns, **kw)
+        column = new_timeuuid()
+        value = obj
+        ttl = self._version_ttl
+        if self._delta_versions or ttl:
+            try:
+                previous = list(col_fam.get(rowkey, column_count=1,
+                                            column_reversed=True).items())
+            except NotFoundException:
+                previous = []
+            if previous:
+                value = self._supersede(rowkey, previous[0], obj, insert)
+        serialized = serializers.dumps(value, self._serializer,
+                                       self._compress_threshold)
+        instrumentation.record_bytes(len(serialized))
+        insert({column: serialized}, **kwargs)
+        if self._max_versions:
+            self._trim_versions(rowkey, batch)
+        invalidate(self.__column_family__, rowkey)
+        return self(rowkey, ((column, obj),))
+
+    def _supersede(self, rowkey, previous, obj, insert):
+        """`obj` is about to replace the `previous` (column, value) version.
+        Returns what to store for `obj`, either itself or a delta, and sets
+        the TTL of versions that are not needed anymore.
+
+        """
+        prev_column, prev_value = previous
+        prev_obj = serializers.loads(prev_value)
+        if serializers.is_delta(prev_obj):
+            base, depth = serializers.delta_base(prev_obj)
+            base_column = uuid.UUID(base)
+        else:
+            base_column, depth = prev_column, 0
+        base_value = None
+        value = obj
+        if self._delta_versions and isinstance(obj, dict) \
+            and depth < self._delta_versions:
+            if base_column == prev_column:
+                base_value = prev_value
+            else:
+                base_value = self._load_column(rowkey, base_column)
+            base_obj = serializers.loads(base_value)
+            if isinstance(base_obj, dict):
+                value = serializers.make_delta(base_column, base_obj, obj,
+                                               depth + 1)
+        ttl = self._version_ttl
+        if ttl:
+            # the base of a delta must live as long as the delta, so it only
+            # expires when a new full version is written
+            if value is obj:
+                if base_column != prev_column:
+                    if base_value is None:
+                        base_value = self._load_column(rowkey, base_column)
+                    insert({base_column: base_value}, ttl=ttl)
+                insert({prev_column: prev_value}, ttl=ttl)
+            elif base_column != prev_column:
+                insert({prev_column: prev_value}, ttl=ttl)
+        return value
+
+    def _trim_versions(self, rowkey, batch=None):
+        """Removes the oldest versions of `rowkey` beyond `__max_versions__`.
+        The base of the oldest remaining delta is kept.
+
+        With a `batch`, the new version is not written yet, and is counted
+        in addition to the stored ones. Other versions queued in the same
+        batch are not, so a batch of several appends to one object only
+        trims the stored ones down to the limit.
+
+        """
+        col_fam = self.cf_cache.get()
+        count = col_fam.get_count(rowkey)
+        if batch is not None:
+            # the version being appended is still queued in the batch
+            count += 1
+        excess = count - self._max_versions
+        if excess <= 0:
+            return
+        oldest = list(col_fam.get(rowkey, column_count=excess + 1).items())
+        removed = [column for column, _ in oldest[:excess]]
+        if self._delta_versions and len(oldest) > excess:
+            kept = serializers.loads(oldest[excess][1])
+            if serializers.is_delta(kept):
+                base_column = uuid.UUID(serializers.delta_base(kept)[0])
+                if base_column in removed:
+                    removed.remove(base_column)
+        if not removed:
+            return
+        if batch is not None:
+            batch.remove(col_fam, rowkey, columns=removed)
+        else:
+            col_fam.remove(rowkey, columns=removed)
+
+    @instrumented('latest')
+    def latest(self, rowkey, **kwargs):
+        """Get the object by the rowkey, with only its latest version.
+        Supports pycassa method `get` kwargs.
+
+        """
+        col_fam = self.cf_cache.get()
+        try:
+            res = col_fam.get(rowkey, column_count=1, column_reversed=True,
+                              **kwargs)
+        except NotFoundException:
+            raise ModelException("latest() returned zero element")
+        return self(rowkey, self._versions(rowkey, res.items()))
+
+    @instrumented('versions_between', rows=len)
+    def versions_between(self, rowkey, start_time, end_time, **kwargs):
+        """Returns :class:`Versions` of the object created between
+        `start_time` and `end_time` (datetimes or timestamps, both included),
+        oldest first. Supports pycassa method `get` kwargs.
+
+        """
+        col_fam = self.cf_cache.get()
+        kwargs.setdefault('column_count', MAX_COUNT)
+        try:
+            res = col_fam.get(rowkey,
+                              column_start=convert_time_to_uuid(start_time, lowest_val=True),
+                              column_finish=convert_time_to_uuid(end_time, lowest_val=False),
+                              **kwargs)
+        except NotFoundException:
+            return Versions(())
+        return self._versions(rowkey, res.items())
+
+    @instrumented_iter('iter_versions')
+    def iter_versions(self, rowkey, reverse=True, page_size=100, **kwargs):
+        """Iterates over the (column, object) versions of the object, latest
+        first unless `reverse` is False. Versions are read by pages of
+        `page_size` columns. Supports pycassa method `get` kwargs.
+
+        """
+        col_fam = self.cf_cache.get()
+        start = ''
+        while True:
+            # the first column of next pages is the last one of the previous
+            count = page_size if start == '' else page_size + 1
+            try:
+                res = col_fam.get(rowkey, column_start=start, column_count=count,
+                                  column_reversed=reverse, **kwargs)
+            except NotFoundException:
+                return
+            columns = list(res.items())
+            if start != '' and columns and columns[0][0] == start:
+                columns = columns[1:]
+            for version in self._versions(rowkey, columns):
+                yield version
+            if len(res) < count or not columns:
+                return
+            start = columns[-1][0]
+
+    @instrumented('get_many')
+    def get_many(cls, rowkeys, chunk_size=MULTIGET_CHUNK_SIZE,
+                 workers=MULTIGET_WORKERS, versions=1, **kwargs):
+        """Returns objects for all the given rowkeys, in the same order.
+        Rowkeys not found are skipped.
+
+        :param versions: Number of versions loaded per object, the latest
+          ones. Defaults to the latest state only, None loads all versions.
+
+        Works like :meth:`MetaModel.get_many`, other keyword arguments are
+        given to pycassa `multiget`. Objects already in the current session
+        are not fetched, unless keyword arguments are given. Only objects
+        read with all their versions are added to the session.
+        Accepts the `hedge` option, see :class:`MetaModel`.
+
+        """
+        cf = cls.__column_family__
+        rowkeys = list(rowkeys)
+        hedge = kwargs.pop('hedge', None)
+        session = current_session() if not kwargs else None
+        add = session is not None and versions is None
+        objects = {}
+        missing = []
+        for rowkey in rowkeys:
+            obj = session.get(cf, rowkey) if session is not None else None
+            if obj is not None:
+                objects[rowkey] = obj
+            else:
+                missing.append(rowkey)
+        if missing:
+            col_fam = cls.cf_cache.get()
+            # latest versions are read with a reversed slice
+            kwargs.setdefault('column_count', versions or MAX_COUNT)
+            kwargs.setdefault('column_reversed', versions is not None)
+            def fetch(chunk):
+                return list(_read(cls, 'multiget', hedge, col_fam.multiget,
+                                  chunk, **kwargs).items())
+            rows = parallel_map(fetch, chunks(missing, chunk_size), workers)
+            for obj in cls.hydrate(chain(*rows), kwargs['column_reversed']):
+                objects[obj.rowkey] = obj
+                if add:
+                    session.add(cf, obj)
+        return [objects[rowkey] for rowkey in rowkeys if rowkey in objects]
+
+    def hydrate(cls, rows, latest_first=False):
+        """Builds objects from an iterable of (rowkey, columns) as returned by
+        pycassa. Each column is a version of the object.
+
+        :param latest_first: Columns were read with a reversed slice.
+
+        """
+        timed = bool(instrumentation.listeners)
+        for rowkey, row in rows:
+            if timed:
+                start = time.time()
+            columns = list(row.items())
+            if latest_first:
+                columns.reverse()
+            obj = cls(rowkey, cls._versions(rowkey, columns))
+            if timed:
+                instrumentation.record_hydration(time.time() - start)
+            yield obj
+
+    def batch(self, queue_size=BATCH_QUEUE_SIZE, **kwargs):
+        """Returns a pycassa Mutator, to give as `batch` argument to
+        :meth:`insert`. See :meth:`MetaModel.batch`.
+
+        """
+        return self.cf_cache.batch(queue_size, **kwargs)
+
+    @instrumented('bulk_insert')
+    def bulk_insert(self, objs, *args, **kwargs):
+        """Insert many objects using a single batch, each of them being
+        associated with all objects in `args`, like for :meth:`insert`.
+        Returns the list of created objects.
 
+        :param queue_size: Number of mutations sent at once.
+
+        All objects are serialized before anything is queued, so that an
+        object that can not be serialized fails the whole call without
+        writing anything. As with :meth:`MetaModel.bulk_insert`, this is
+        not a transaction.
+
+        """
+        queue_size = kwargs.pop('queue_size', BATCH_QUEUE_SIZE)
+        write_level = kwargs.pop('write_consistency_level', None)
+        self._check_remotes(args)
+        objs = [(obj, self._dumps(obj)) for obj in objs]
+        batch = self.batch(queue_size, write_consistency_level=write_level)
+        objs = [self._insert(obj, serialized, args, batch, kwargs)
+                for obj, serialized in objs]
+        batch.send()
+        return objs
+
+    @instrumented('insert')
     def insert(self, obj, *args, **kwargs):
         """Insert a new object into the Column family.
 
         This method is responsible for serializing the object.
         If `args` exists, all objects in `args` will be associated with the
         newly created object.
+        If a `batch` keyword argument is given (see :meth:`batch`), the object
+        and its associations are queued in it instead of being sent right
+        away, with the consistency level of the batch.
+        Other keyword arguments are given to pycassa `insert`.
+
+        """
+        batch = kwargs.pop('batch', None)
+        self._check_remotes(args)
+        return self._insert(obj, self._dumps(obj), args, batch, kwargs)
+
+    def _check_remotes(self, remotes):
+        """Ensure objects to associate with new objects are model objects"""
+        for remote in remotes:
+            if not hasattr(remote, '__column_family__'):
+                raise ModelException("%s: cannot associate %r" %
+                                     (self.__column_family__, remote))
+
+    def _dumps(self, obj):
+        """Returns `obj` serialized as a version"""
+        serialized = serializers.dumps(obj, self._serializer,
+                                       self._compress_threshold)
+        instrumentation.record_bytes(len(serialized))
+        return serialized
+
+    def _insert(self, obj, serialized, remotes, batch, kwargs):
+        """Write the new object `obj`, already serialized, and associate it
+        with `remotes`.
 
         """
-        col_fam = ColumnFamily(self.pool, self.__column_family__)
-        key = convert_time_to_uuid(datetime.utcnow())
-        serialized = json.dumps(obj)
-        ret = col_fam.insert(key, {key: serialized}, **kwargs)
+        if batch is None:
+            insert = lambda col_fam, key, columns: \
+                col_fam.insert(key, columns, **kwargs)
+        else:
+            kwargs.pop('write_consistency_level', None)
+            insert = lambda col_fam, key, columns: \
+                batch.insert(col_fam, key, columns, **kwargs)
+        col_fam = self.cf_cache.get()
+        key = new_timeuuid()
+        insert(col_fam, key, {key: serialized})
         versions = ((key, obj),)
-        for remote in args:
-            assert(hasattr(remote, '__column_family__'))
+        for remote in remotes:
             # as we are the timestamped object, we are the "target" in the many
             # to many table.
             cf = "%s_%s" % (remote.__column_family__, self.__column_family__)
-            col_fam_mtm = ColumnFamily(self.pool, cf)
-            col_fam_mtm.insert(remote.rowkey,
-                               {convert_time_to_uuid(datetime.utcnow()): key})
-        return self(key, versions)
+            col_fam_mtm = remote.__class__.cf_cache.get(cf)
+            insert(col_fam_mtm, remote.rowkey, {new_timeuuid(): key})
+            # forget relationships already loaded on the remote object
+            for attr, rel in remote.__class__._relationships.items():
+                if rel.target == self.__column_family__:
+                    remote.__dict__.pop(attr, None)
+        obj = self(key, versions)
+        session = current_session()
+        if session is not None:
+            session.add(self.__column_family__, obj)
+        return obj
+
+class Versions(object):
+    """Versions of a MetaTimestampedModel object, as read from Cassandra.
+
+    Behaves like a sequence of (column, object) 2-tuples, oldest first.
+    Objects are deserialized the first time they are accessed.
+    Versions stored as deltas are rebuilt from their base version, which is
+    read with `load_column` (a callable taking the column name and returning
+    the serialized value) if it is not part of these versions.
+
+    """
+    def __init__(self, columns, load_column=None):
+        self.columns = list(columns)
+        self.load_column = load_column
+        self.decoded = {}
+        self.bases = {}
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self.columns)
+        column, value = self.columns[index]
+        if index not in self.decoded:
+            obj = serializers.loads(value)
+            if serializers.is_delta(obj):
+                obj = serializers.apply_delta(self._base(obj), obj)
+            self.decoded[index] = obj
+        return column, self.decoded[index]
+
+    def _base(self, delta):
+        """Returns the base object of `delta`"""
+        base_column = uuid.UUID(serializers.delta_base(delta)[0])
+        for index, (column, _) in enumerate(self.columns):
+            if column == base_column:
+                return self[index][1]
+        if base_column not in self.bases:
+            if self.load_column is None:
+                raise ModelException("base version %s of a delta is not "
+                                     "available" % base_column)
+            self.bases[base_column] = serializers.loads(self.load_column(base_column))
+        return self.bases[base_column]
+
+    def __iter__(self):
+        for index in range(len(self.columns)):
+            yield self[index]
+
+    def __repr__(self):
+        return "Versions(%d)" % len(self.columns)
+
+# Asynchronous versions of queries, see cassobjects.aio
+for _name in ('get_one_by_rowkey', 'get_many', 'latest', 'versions_between',
+              'insert', 'bulk_insert', 'append_version'):
+    setattr(MetaTimestampedModel, 'a%s' % _name, _async(_name))
+MetaTimestampedModel.aiter_versions = _async_iter('iter_versions')
+del _name
+
+class MetaCounterModel(type):
+    """Represents a counter column family: each row holds counters, named by
+    its columns.
+
+    Row keys are given by the application, their type is set by the
+    `__key_type__` class attribute, and the type of counter names by
+    `__comparator_type__` (both UTF8Type by default).
+
+    Counters are incremented right away with :meth:`add`, or through a
+    :class:`CounterBuffer` (see :meth:`buffer`), which merges increments of
+    the same counter and writes them in batches.
+
+    """
+    def __init__(cls, name, bases, dct):
+        if 'registry' in cls.__dict__:
+            return type.__init__(cls, name, bases, dct)
+        # Column family name
+        if '__column_family__' not in dct:
+            cls.__column_family__ = cls.__name__.lower()
+        cls.cf_cache = ColumnFamilyCache(cls)
+
+        # add the model in the CFRegistry object
+        cls.registry.add(cls, {})
+
+        return type.__init__(cls, name, bases, dct)
+
+    @instrumented('add')
+    def add(self, rowkey, column, value=1, batch=None):
+        """Adds `value` to the counter `column` of the row `rowkey`.
+        If `batch` is given (see :meth:`batch`), the increment is queued in
+        it instead of being sent right away.
+
+        """
+        col_fam = self.cf_cache.get()
+        if batch is None:
+            col_fam.add(rowkey, column, value)
+        else:
+            batch.insert(col_fam, rowkey, {column: value})
+        invalidate(self.__column_family__, rowkey)
+
+    @instrumented('get_one_by_rowkey')
+    def get_one_by_rowkey(self, rowkey, **kwargs):
+        """Get the counters of the row `rowkey`. Supports pycassa method `get`
+        kwargs.
+
+        """
+        col_fam = self.cf_cache.get()
+        kwargs.setdefault('column_count', MAX_COUNT)
+        try:
+            res = col_fam.get(rowkey, **kwargs)
+        except NotFoundException:
+            raise ModelException("get_one_by_rowkey() returned zero element")
+        return self(rowkey, res)
+
+    @instrumented('get_many')
+    def get_many(cls, rowkeys, chunk_size=MULTIGET_CHUNK_SIZE,
+                 workers=MULTIGET_WORKERS, **kwargs):
+        """Returns objects for all the given rowkeys, in the same order.
+        Rowkeys without counters are skipped. Works like
+        :meth:`MetaModel.get_many`.
+
+        """
+        rowkeys = list(rowkeys)
+        col_fam = cls.cf_cache.get()
+        kwargs.setdefault('column_count', MAX_COUNT)
+        def fetch(chunk):
+            return list(col_fam.multiget(chunk, **kwargs).items())
+        rows = dict(chain(*parallel_map(fetch, chunks(rowkeys, chunk_size),
+                                        workers)))
+        return [cls(rowkey, rows[rowkey]) for rowkey in rowkeys
+                if rowkey in rows]
+
+    def value(self, rowkey, column):
+        """Returns the value of a single counter, 0 if not set."""
+        try:
+            return self.get_one_by_rowkey(rowkey, columns=[column]).counters[column]
+        except ModelException:
+            return 0
+
+    def batch(self, queue_size=BATCH_QUEUE_SIZE, **kwargs):
+        """Returns a pycassa Mutator, to give as `batch` argument to
+        :meth:`add`. See :meth:`MetaModel.batch`.
+
+        Like pycassa does for counter column families, failed batches are
+        not retried: a batch that timed out may have been applied, and
+        sending it again would count its increments twice.
+
+        """
+        kwargs.setdefault('allow_retries', False)
+        return self.cf_cache.batch(queue_size, **kwargs)
+
+    def buffer(self, max_size=COUNTER_BUFFER_SIZE,
+               interval=COUNTER_FLUSH_INTERVAL, requeue=False):
+        """Returns a new :class:`CounterBuffer` of the model."""
+        return CounterBuffer(self, max_size, interval, requeue)
+
+for _name in ('add', 'get_one_by_rowkey', 'get_many'):
+    setattr(MetaCounterModel, 'a%s' % _name, _async(_name))
+del _name
+
+class CounterBuffer(object):
+    """Merges increments of counters of `model`, and writes them in batches,
+    when `max_size` distinct counters are pending, or when an increment comes
+    `interval` seconds after the last flush.
+
+    :meth:`start` runs a thread flushing every `interval` seconds, so that
+    pending increments are written even if no increment comes. Used as a
+    context manager, pending increments are written when leaving the block.
+    :meth:`close` stops the thread and flushes.
+
+    If writing a batch fails, its increments are dropped, and counted in
+    `dropped`: as with any counter write, a failed batch may still have been
+    applied, entirely or partially. With `requeue`, they are pending again
+    instead, and written by the next flush. A batch that timed out but was
+    applied is then counted twice, and a flush merges many increments: use
+    it only where over-counting is better than under-counting.
+
+    """
+    def __init__(self, model, max_size=COUNTER_BUFFER_SIZE,
+                 interval=COUNTER_FLUSH_INTERVAL, requeue=False):
+        self.model = model
+        self.max_size = max_size
+        self.interval = interval
+        self.requeue = requeue
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.last_flush = time.time()
+        self.thread = None
+        self.stopped = threading.Event()
+        # number of increments received, of counter writes made, and of
+        # counter writes dropped by failed batches
+        self.increments = 0
+        self.writes = 0
+        self.dropped = 0
+
+    def incr(self, rowkey, column, value=1):
+        """Adds `value` to the counter `column` of the row `rowkey`."""
+        key = (rowkey, column)
+        with self.lock:
+            self.pending[key] = self.pending.get(key, 0) + value
+            self.increments += 1
+            full = len(self.pending) >= self.max_size
+        if full or (self.interval is not None and
+                    time.time() - self.last_flush >= self.interval):
+            self.flush()
+
+    def flush(self):
+        """Writes pending increments. Returns the number of counters
+        written.
+
+        """
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                self.last_flush = time.time()
+            rows = {}
+            for (rowkey, column), value in pending.items():
+                if value:
+                    rows.setdefault(rowkey, {})[column] = value
+            if not rows:
+                return 0
+            written = sum(len(columns) for columns in rows.values())
+            model = self.model
+            col_fam = model.cf_cache.get()
+            try:
+                with instrumentation.measure(model.__column_family__,
+                                             'counter_flush') as event:
+                    with model.batch() as batch:
+                        for rowkey, columns in rows.items():
+                            batch.insert(col_fam, rowkey, columns)
+                    if event is not None:
+                        event.rows = len(rows)
+            except Exception:
+                with self.lock:
+                    if self.requeue:
+                        for key, value in pending.items():
+                            self.pending[key] = self.pending.get(key, 0) + value
+                    else:
+                        self.dropped += written
+                raise
+            for rowkey in rows:
+                invalidate(model.__column_family__, rowkey)
+            self.writes += written
+            return written
+
+    def _run(self):
+        while True:
+            self.stopped.wait(self.interval)
+            if self.stopped.is_set():
+                return
+            try:
+                self.flush()
+            except Exception:
+                # the failure is counted by flush, the thread goes on
+                pass
+
+    def start(self):
+        """Starts flushing every `interval` seconds in a thread."""
+        if self.interval is None:
+            raise ModelException("%s: a flush interval is needed" %
+                                 self.model.__column_family__)
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+
+    def close(self):
+        """Stops the flushing thread, and flushes."""
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 #################################
 # Column Family Registry object #
 #################################
 
 class CFRegistry(object):
-    """Store all created models in an immutable dict, and also store classes"""
+    """Store the columns of all created models, and their classes, keyed by
+    column family.
+
+    Relationships between models are resolved by :meth:`configure`, once all
+    models are declared. It is called on first access to a relationship,
+    and again after models are added or removed.
+
+    """
     def __init__(self):
-        self.cfs = immutabledict()
-        self.classes = immutabledict()
+        self.cfs = {}
+        self.classes = {}
+        self.configured = False
+        self.lock = threading.RLock()
 
     def __contains__(self, item):
         if not isinstance(item, basestring):
@@ -352,23 +2129,45 @@ class CFRegistry(object):
         return item in self.cfs
 
     def __getitem__(self, item):
-        return dict.__getitem__(self.cfs, item)
+        return self.cfs[item]
 
     def add(self, klass, definition):
         name = klass.__column_family__
-        dict.__setitem__(self.cfs, name, definition)
-        dict.__setitem__(self.classes, name, klass)
+        with self.lock:
+            self.cfs[name] = definition
+            self.classes[name] = klass
+            self.configured = False
 
     def remove(self, name):
-        dict.pop(self.cfs, name)
-        dict.pop(self.classes, name)
+        with self.lock:
+            self.cfs.pop(name)
+            self.classes.pop(name)
+            self.configured = False
 
     def clear(self):
-        dict.clear(self.cfs)
-        dict.clear(self.classes)
+        with self.lock:
+            self.cfs.clear()
+            self.classes.clear()
+            self.configured = False
 
     def get_class(self, name):
-        return dict.__getitem__(self.classes, name)
+        return self.classes[name]
+
+    def configure(self):
+        """Resolves the relationships of all models: target models, foreign
+        keys and intermediate column families. Does nothing if nothing
+        changed since the last call.
+
+        """
+        if self.configured:
+            return
+        with self.lock:
+            if self.configured:
+                return
+            for klass in list(self.classes.values()):
+                for rel in getattr(klass, '_relationships', {}).values():
+                    rel.configure(klass)
+            self.configured = True
 
     #TODO do we need this here ?
     def create_column_families(self):
@@ -384,21 +2183,28 @@ def _model_constructor(self, rowkey, **kwargs):
     """
     kls = self.__class__
     setattr(self, 'rowkey', rowkey)
-    for arg in kwargs:
+    attr_by_name = kls._attr_by_name
+    values = self.__dict__
+    for arg, value in kwargs.items():
+        # column names and aliases are resolved through the class lookup
+        # table, and stored without being recorded as changes. Other names
+        # must be existing attributes
+        attr = attr_by_name.get(arg)
+        if attr is not None:
+            values[attr] = value
+            continue
         if not hasattr(kls, arg):
-            # maybe it's an alias
-            for key, value in kls.__dict__.items():
-                if isinstance(value, ModelAttribute) and \
-                    isinstance(value.prop, Column) and \
-                    value.prop.alias == arg:
-                    setattr(self, key, kwargs[arg])
-                    break
-            else:
-                raise ModelException("%s can't be resolved in %s" % (arg, kls))
-        else:
-            setattr(self, arg, kwargs[arg])
+            raise ModelException("%s can't be resolved in %s" % (arg, kls))
+        setattr(self, arg, value)
 _model_constructor.__name__ = '__init__'
 
+def _model_save(self, batch=None, **kwargs):
+    """Writes the columns of the object changed since it was read. See
+    :meth:`MetaModel.save_changes`. Returns True if there were changes.
+
+    """
+    return bool(self.__class__.save_changes([self], batch, **kwargs))
+
 
 def _timestamped_constructor(self, rowkey, versions):
     """Constructor for instanciated MetaTimestamped models objects.
@@ -411,88 +2217,232 @@ def _timestamped_constructor(self, rowkey, versions):
     self.versions = versions
 _timestamped_constructor.__name__ = '__init__'
 
+def _counter_constructor(self, rowkey, counters):
+    """Constructor for instanciated MetaCounterModel objects. `counters` is
+    a dict of counter values, keyed by column.
+
+    """
+    self.rowkey = rowkey
+    self.counters = counters
+_counter_constructor.__name__ = '__init__'
+
 
 CONSTRUCTORS = {
     MetaModel: _model_constructor,
     MetaTimestampedModel: _timestamped_constructor,
+    MetaCounterModel: _counter_constructor,
+}
+
+# Methods of model objects
+METHODS = {
+    MetaModel: {'save': _model_save},
+    MetaTimestampedModel: {},
+    MetaCounterModel: {},
 }
 
 def declare_model(cls=object, name='Model', metaclass=MetaModel,
                   keyspace=DEFAULT_KEYSPACE, hosts=DEFAULT_HOSTS,
-                  reg=CFRegistry()):
+                  reg=CFRegistry(), **pool_options):
     """Constructs a base class for models.
     All models inheriting from this base will share the same CFRegistry object.
 
+    Models get their ConnectionPool from the `POOLS` registry, created on
+    first use with the given `keyspace`, `hosts` and `pool_options`
+    (ConnectionPool keyword arguments: pool_size, max_overflow, timeout,
+    pool_timeout, prefill...).
+
     """
-    POOLS.setdefault(keyspace, ConnectionPool(keyspace, hosts))
-    return metaclass(name, (cls,), {'pool': POOLS[keyspace],
-                                    'registry': reg,
-                                    '__init__': CONSTRUCTORS[metaclass]})
+    dct = {'pool': LazyPool(keyspace, hosts, pool_options, POOLS),
+           'registry': reg,
+           '__init__': CONSTRUCTORS[metaclass]}
+    dct.update(METHODS[metaclass])
+    return metaclass(name, (cls,), dct)
 
 # Relationships between models
 
+# Options of relationship() given to the queries loading related objects
+RELATIONSHIP_READ_OPTIONS = ('read_consistency_level', 'hedge')
+
 class ModelRelationship(object):
     def __init__(self, target_kls, **kwargs):
         self.target = target_kls
         self.kwargs = kwargs
-        self._initialized = False
+        self.read_options = dict((k, v) for k, v in kwargs.items()
+                                 if k in RELATIONSHIP_READ_OPTIONS)
         self.target_method = None
-
-    def do_init(self, local_class):
-        """Resolve the relationship, and creates backref if necessary.
+        self.local_class = None
+        self.target_model = None
+        # name of the intermediate column family for many to many
+        # relationships, or of the foreign key column
+        self.many_to_many_cf = None
+        self.foreign_key = None
+
+    def configure(self, local_class):
+        """Resolve the relationship, called by :meth:`CFRegistry.configure`.
         Look in CFRegistry if the remote side (column family) is present,
         then look up for a foreign key linking to this instance.
+        The resulting lookup is kept as `target_method`, called with the
+        local rowkey and read options.
 
         :param local_class: class on which the relationship is attached
 
         """
-        if self._initialized:
-            return
         # find the remote side.
         registry = local_class.registry
         if self.target not in registry:
             raise ModelException('Model with column family name "%s" not found '
                                  'in registry' % self.target)
         target_model = registry.get_class(self.target)
+        local_cf = local_class.__column_family__
         if isinstance(target_model, MetaTimestampedModel):
             # MetaTimestampedModel relationships works with an intermediate
             # table that mimic many to many relationships.
-            def _lookup_many_to_many(local_model, target_model, local_rowkey):
-                """This method will retrieve `target_model` instances
-                associated with `local_rowkey` by looking up the relations in
-                the intermediate table.
-
-                """
-                cf = "%s_%s" % (local_model.__column_family__,
-                                target_model.__column_family__)
-                col_fam = ColumnFamily(local_model.pool, cf)
-                try:
-                    rows = col_fam.get(local_rowkey)
-                except NotFoundException:
-                    return []
-                ret = []
-                for _, v in rows.items():
-                    ret.append(target_model.get_one_by_rowkey(v))
-                return ret
-            self.target_method = partial(_lookup_many_to_many, local_class, target_model)
-        else:
+            many_to_many_cf = "%s_%s" % (local_cf,
+                                         target_model.__column_family__)
+            foreign_key = None
+            target_method = self._lookup_many_to_many
+        elif isinstance(target_model, MetaModel):
             # find foreign key
-            local_cf = local_class.__column_family__
-            for col, value in registry[self.target].items():
-                if value.foreign_key == local_cf:
-                    name = value.alias or col
-                    self.target_method = partial(getattr(target_model, 'get_by'), name)
-            if self.target_method is None:
+            many_to_many_cf = foreign_key = target_method = None
+            for name, fk in target_model._foreign_keys.items():
+                if fk == local_cf:
+                    foreign_key = name
+                    target_method = partial(target_model.get_by, name)
+            if target_method is None:
                 raise ModelException('No foreign key found in "%s" for relationship '
                                      '"%s"' % (self.target, local_cf))
-        self._initialized = True
+        else:
+            raise ModelException('"%s" can not be the target of a relationship' %
+                                 self.target)
+        self.local_class = local_class
+        self.target_model = target_model
+        self.many_to_many_cf = many_to_many_cf
+        self.foreign_key = foreign_key
+        self.target_method = target_method
+
+    def _links_slice(self):
+        """pycassa slice arguments to read the intermediate table. Only the
+        `limit` most recent associations are fetched.
+
+        """
+        limit = self.kwargs.get('limit')
+        return {'column_count': limit or MAX_COUNT,
+                'column_reversed': bool(limit)}
+
+    def _linked_keys(self, row):
+        """Returns rowkeys of associated objects, from an intermediate table
+        row, oldest association first.
 
-    def get(self, instance):
         """
+        keys = list(row.values())
+        if self.kwargs.get('limit'):
+            keys.reverse()
+        # a single object can be associated several times
+        seen = set()
+        return [k for k in keys if not (k in seen or seen.add(k))]
+
+    def _options(self, options):
+        """Returns the read options of a load: the ones given to
+        :func:`relationship`, overridden by `options`.
+
         """
-        assert self._initialized
-        return self.target_method(instance.rowkey)
+        if not options:
+            return self.read_options
+        merged = dict(self.read_options)
+        merged.update(options)
+        return merged
+
+    def _links_options(self, options):
+        """Returns the hedge option, and the pycassa arguments to read the
+        intermediate table.
+
+        """
+        links_slice = self._links_slice()
+        if options.get('read_consistency_level') is not None:
+            links_slice['read_consistency_level'] = \
+                options['read_consistency_level']
+        return options.get('hedge'), links_slice
+
+    def _lookup_many_to_many(self, local_rowkey, **options):
+        """This method will retrieve `target_model` instances associated with
+        `local_rowkey` by looking up the relations in the intermediate table.
+
+        """
+        col_fam = self.local_class.cf_cache.get(self.many_to_many_cf)
+        hedge, links_slice = self._links_options(options)
+        try:
+            row = _read(self.local_class, self.many_to_many_cf, hedge,
+                        col_fam.get, local_rowkey, **links_slice)
+        except NotFoundException:
+            return []
+        return self.target_model.get_many(self._linked_keys(row), **options)
+
+    def get(self, instance, **options):
+        """Returns the related objects of `instance`. The lookup is reported
+        to instrumentation listeners as a `relationship:<target>` operation
+        of the local model.
+
+        :param read_consistency_level, hedge: Read options, overriding the
+          ones given to :func:`relationship`.
+
+        """
+        options = self._options(options)
+        if not instrumentation.listeners:
+            return self.target_method(instance.rowkey, **options)
+        with instrumentation.measure(self.local_class.__column_family__,
+                                     'relationship:%s' % self.target) as event:
+            result = self.target_method(instance.rowkey, **options)
+            if event is not None:
+                event.rows = len(result)
+            return result
+
+    def prefetch(self, rowkeys, workers=MULTIGET_WORKERS, **options):
+        """Returns the related objects of all the given local rowkeys, as a list
+        of lists in the same order. Accepts the read options of :meth:`get`.
+
+        Foreign key relationships run their index queries concurrently, in
+        the session of the calling thread. Many to many relationships read
+        all the intermediate rows, and then all the associated objects, with
+        multigets.
+
+        """
+        options = self._options(options)
+        if self.many_to_many_cf is None:
+            session = current_session()
+            def load(rowkey):
+                with use_session(session):
+                    return self.target_method(rowkey, **options)
+            return parallel_map(load, rowkeys, workers)
+        col_fam = self.local_class.cf_cache.get(self.many_to_many_cf)
+        hedge, links_slice = self._links_options(options)
+        def fetch(chunk):
+            return list(_read(self.local_class, self.many_to_many_cf, hedge,
+                              col_fam.multiget, chunk, **links_slice).items())
+        rows = parallel_map(fetch, chunks(rowkeys, MULTIGET_CHUNK_SIZE), workers)
+        links = {}
+        keys = []
+        for rowkey, row in chain(*rows):
+            links[rowkey] = self._linked_keys(row)
+            keys.extend(links[rowkey])
+        objects = {}
+        for obj in self.target_model.get_many(set(keys), workers=workers,
+                                              **options):
+            objects[obj.rowkey] = obj
+        return [[objects[k] for k in links.get(rowkey, ()) if k in objects]
+                for rowkey in rowkeys]
 
 #TODO
 def relationship(target_kls, **kwargs):
+    """Declares a relationship to the model of column family `target_kls`.
+
+    :param limit: For relationships to a MetaTimestampedModel, only load the
+      `limit` most recently associated objects.
+
+    Objects of a MetaTimestampedModel are loaded with their latest version
+    only.
+
+    :param read_consistency_level, hedge: Read options of the queries loading
+      related objects, see :class:`MetaModel`.
+
+    """
     return ModelRelationship(target_kls, **kwargs)
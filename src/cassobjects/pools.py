@@ -0,0 +1,118 @@
+# -*- encoding: utf-8 -*-
+
+"""ConnectionPool registry for cassobjects models.
+
+Pools are shared by all models declared with the same keyspace, hosts and
+pool options. They are only created on first use, so declaring models does
+not connect to the cluster.
+Pools are not shared across `os.fork()`: the first use of a pool in a child
+process creates a new one, with new connections. Objects bound to pools of
+the parent can be reset at that time, see :func:`register_after_fork`.
+
+"""
+
+import os
+import threading
+
+from pycassa import ConnectionPool
+
+__all__ = ['PoolRegistry', 'LazyPool', 'POOLS', 'register_after_fork']
+
+_after_fork_hooks = []
+
+def _freeze(value):
+    """Returns a hashable version of a pool option value"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def register_after_fork(func):
+    """Registers `func` to be called without arguments in a child process,
+    when a registry forgets the pools of the parent. Returns `func`, so it
+    can be used as a decorator.
+
+    """
+    _after_fork_hooks.append(func)
+    return func
+
+class PoolRegistry(object):
+    """Creates and holds ConnectionPool objects, keyed by keyspace, hosts and
+    pool options (any ConnectionPool keyword argument: pool_size,
+    max_overflow, timeout, pool_timeout, prefill, credentials...).
+
+    """
+    def __init__(self):
+        self.pools = {}
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(keyspace, hosts, options):
+        return (keyspace, tuple(hosts), _freeze(options))
+
+    def get(self, key, options=None):
+        """Returns the pool for `key` (see :meth:`make_key`), creating it with
+        `options` if needed.
+
+        """
+        if self.pid != os.getpid():
+            self.after_fork()
+        try:
+            return self.pools[key]
+        except KeyError:
+            pass
+        keyspace, hosts, _ = key
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = ConnectionPool(keyspace, list(hosts),
+                                                 **(options or {}))
+            return self.pools[key]
+
+    def after_fork(self):
+        """Forget pools created by the parent process. Their connections are
+        left alone, as they still belong to the parent.
+        The lock is replaced too, it could have been held by another thread
+        of the parent when forking. Functions given to
+        :func:`register_after_fork` are then called.
+
+        """
+        self.lock = threading.Lock()
+        self.pools = {}
+        self.pid = os.getpid()
+        for func in _after_fork_hooks:
+            func()
+
+    def dispose(self):
+        """Closes all connections, and forget pools."""
+        with self.lock:
+            for pool in self.pools.values():
+                pool.dispose()
+            self.pools = {}
+
+    def stats(self):
+        """Returns utilization of each pool, keyed like pools."""
+        stats = {}
+        for key, pool in list(self.pools.items()):
+            stats[key] = {
+                'size': pool.size(),
+                'overflow': pool.overflow(),
+                'checkedout': pool.checkedout(),
+            }
+        return stats
+
+POOLS = PoolRegistry()
+
+class LazyPool(object):
+    """Descriptor giving access to a pool of a PoolRegistry. Models get it as
+    their `pool` attribute.
+
+    """
+    def __init__(self, keyspace, hosts, options=None, registry=POOLS):
+        self.registry = registry
+        self.options = options or {}
+        self.key = registry.make_key(keyspace, hosts, self.options)
+
+    def __get__(self, instance, owner):
+        return self.registry.get(self.key, self.options)
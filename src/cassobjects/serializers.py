@@ -0,0 +1,230 @@
+# -*- encoding: utf-8 -*-
+
+"""Serializers for MetaTimestampedModel versions.
+
+Each serialized value starts with a tag byte telling which serializer wrote
+it, and if it has been compressed, so values written with different
+serializers can live in the same column family.
+Values without tag are JSON, as written by older versions of cassobjects.
+Custom serializers are registered with :func:`register_serializer`, so
+that their values can be read back.
+
+Versions of dict objects can also be stored as deltas against a previous
+full version (see :func:`make_delta`).
+
+Available serializers are:
+    - json: default, readable by anyone
+    - marshal: fast, but only for python builtin types
+    - pickle: any picklable object, using the highest protocol
+    - msgpack: compact binary format, needs the msgpack package
+
+"""
+
+import zlib
+import marshal
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import simplejson as json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+__all__ = ['Serializer', 'SerializerException', 'register_serializer',
+           'get_serializer', 'dumps',
+           'loads', 'make_delta', 'is_delta', 'apply_delta']
+
+# Set on the tag when the value is zlib compressed
+COMPRESSED = 0x80
+# First bytes of untagged JSON values, tags must not be one of them
+JSON_START = frozenset(bytearray(b'\t\n\r')) | \
+             frozenset(range(0x20, COMPRESSED))
+# Key marking a deserialized dict as a delta
+DELTA = '__cassobjects_delta__'
+
+class SerializerException(Exception):
+    """Something went wrong while (de)serializing a value"""
+    pass
+
+class Serializer(object):
+    """Base class of serializers. `tag` must be unique, lower than 0x20,
+    and not a JSON whitespace. Subclasses implement:
+
+    - `dumps(obj)`: returns `obj` serialized, as bytes
+    - `loads(data)`: returns the object serialized in `data`
+
+    """
+    name = None
+    tag = None
+
+class JSONSerializer(Serializer):
+    name = 'json'
+    tag = 0x01
+
+    def dumps(self, obj):
+        data = json.dumps(obj)
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return data
+
+    def loads(self, data):
+        return json.loads(data)
+
+class MarshalSerializer(Serializer):
+    name = 'marshal'
+    tag = 0x02
+
+    def dumps(self, obj):
+        return marshal.dumps(obj)
+
+    def loads(self, data):
+        return marshal.loads(data)
+
+class PickleSerializer(Serializer):
+    name = 'pickle'
+    tag = 0x03
+
+    def dumps(self, obj):
+        return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+class MsgpackSerializer(Serializer):
+    name = 'msgpack'
+    tag = 0x04
+
+    def dumps(self, obj):
+        if msgpack is None:
+            raise SerializerException("msgpack serializer needs the msgpack "
+                                      "package")
+        return msgpack.packb(obj)
+
+    def loads(self, data):
+        if msgpack is None:
+            raise SerializerException("msgpack serializer needs the msgpack "
+                                      "package")
+        return msgpack.unpackb(data)
+
+SERIALIZERS = {}
+TAGS = {}
+
+def register_serializer(serializer):
+    """Registers a :class:`Serializer` instance, so that it can be given by
+    name, and values it wrote can be read by :func:`loads`. Returns the
+    registered serializer: registering again a serializer of the same class
+    returns the first instance.
+
+    """
+    if not (callable(getattr(serializer, 'dumps', None)) and
+            callable(getattr(serializer, 'loads', None))):
+        raise SerializerException('Serializer "%s" does not implement '
+                                  'dumps and loads' % serializer.name)
+    tag = serializer.tag
+    if not isinstance(tag, int) or not 0 < tag < COMPRESSED or \
+        tag in JSON_START:
+        raise SerializerException('Serializer "%s": invalid tag %r' %
+                                  (serializer.name, tag))
+    registered = TAGS.get(tag)
+    if registered is None and serializer.name is not None:
+        registered = SERIALIZERS.get(serializer.name)
+    if registered is not None:
+        if type(registered) is type(serializer) and \
+            registered.tag == tag and registered.name == serializer.name:
+            return registered
+        raise SerializerException('Serializer "%s": tag %#x or name already '
+                                  'used by "%s"' % (serializer.name, tag,
+                                                    registered.name))
+    if serializer.name is not None:
+        SERIALIZERS[serializer.name] = serializer
+    TAGS[tag] = serializer
+    return serializer
+
+for serializer in (JSONSerializer(), MarshalSerializer(), PickleSerializer(),
+                   MsgpackSerializer()):
+    register_serializer(serializer)
+del serializer
+
+def get_serializer(serializer):
+    """Returns a serializer from its name. Serializer instances are
+    registered (see :func:`register_serializer`) and returned.
+
+    """
+    if isinstance(serializer, Serializer):
+        return register_serializer(serializer)
+    try:
+        return SERIALIZERS[serializer]
+    except KeyError:
+        raise SerializerException('Unknown serializer "%s"' % serializer)
+
+def dumps(obj, serializer='json', compress_threshold=None):
+    """Serialize `obj`, and prefix it with the serializer tag.
+
+    :param compress_threshold: Values bigger than this number of bytes are
+      zlib compressed. None disables compression.
+
+    """
+    serializer = get_serializer(serializer)
+    tag = serializer.tag
+    data = serializer.dumps(obj)
+    if compress_threshold is not None and len(data) > compress_threshold:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            data = compressed
+            tag |= COMPRESSED
+    return bytes(bytearray([tag])) + data
+
+def loads(data):
+    """Deserialize a value written by :func:`dumps`, or an untagged JSON
+    value.
+
+    """
+    if not data:
+        return json.loads(data)
+    tag = bytearray(data[:1])[0]
+    serializer = TAGS.get(tag & ~COMPRESSED)
+    if serializer is None:
+        # written before tags existed
+        return json.loads(data)
+    data = data[1:]
+    if tag & COMPRESSED:
+        data = zlib.decompress(data)
+    return serializer.loads(data)
+
+def make_delta(base_column, base, obj, depth):
+    """Returns a dict describing `obj` as changes made to the `base` dict,
+    stored in column `base_column`. `depth` is the number of deltas since
+    `base`, this one included.
+
+    """
+    changed = {}
+    for k, v in obj.items():
+        if k not in base or base[k] != v:
+            changed[k] = v
+    removed = [k for k in base if k not in obj]
+    return {DELTA: {'base': str(base_column), 'depth': depth,
+                    'set': changed, 'unset': removed}}
+
+def is_delta(obj):
+    """Tells if a deserialized value is a delta made by :func:`make_delta`"""
+    return isinstance(obj, dict) and DELTA in obj
+
+def delta_base(delta):
+    """Returns the column name (as a string) and depth of the base of a
+    delta.
+
+    """
+    return delta[DELTA]['base'], delta[DELTA]['depth']
+
+def apply_delta(base, delta):
+    """Rebuilds an object from its `base` and its `delta`"""
+    obj = dict(base)
+    obj.update(delta[DELTA]['set'])
+    for k in delta[DELTA]['unset']:
+        obj.pop(k, None)
+    return obj
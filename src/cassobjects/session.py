@@ -0,0 +1,165 @@
+# -*- encoding: utf-8 -*-
+
+"""Sessions and read cache for cassobjects models.
+
+A session is a unit of work: within a `with Session():` block, reading the
+same row twice (by rowkey, index lookup or relationship) yields the same
+object. Objects are kept in an identity map, keyed by column family and
+rowkey, until the session ends.
+Changes made to objects of the session are written by :meth:`Session.flush`,
+which is called when the block ends without an exception.
+
+The read cache is process wide, disabled by default. When enabled, rows
+read by rowkey are kept in a bounded LRU, optionally for a limited time.
+Both are invalidated by the models own insert paths.
+
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+from cassobjects.utils import LRUCache
+
+__all__ = ['Session', 'current_session', 'use_session', 'ReadCache', 'enable_read_cache',
+           'disable_read_cache', 'get_read_cache', 'invalidate']
+
+_local = threading.local()
+
+class Session(object):
+    """Identity map of model objects, used as a context manager. Sessions
+    can be nested, the innermost one is used.
+
+    """
+    def __init__(self):
+        self.identity_map = {}
+
+    def __enter__(self):
+        if not hasattr(_local, 'sessions'):
+            _local.sessions = []
+        _local.sessions.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            _local.sessions.remove(self)
+            self.clear()
+
+    def flush(self):
+        """Writes the changed columns of all objects of the session, with
+        one batch per model. Returns the saved objects.
+
+        """
+        dirty = {}
+        for obj in list(self.identity_map.values()):
+            if obj.__dict__.get('_dirty'):
+                dirty.setdefault(obj.__class__, []).append(obj)
+        saved = []
+        for model, objects in dirty.items():
+            saved.extend(model.save_changes(objects))
+        return saved
+
+    def get(self, column_family, rowkey):
+        return self.identity_map.get((column_family, rowkey))
+
+    def add(self, column_family, obj):
+        self.identity_map[(column_family, obj.rowkey)] = obj
+
+    def discard(self, column_family, rowkey):
+        self.identity_map.pop((column_family, rowkey), None)
+
+    def clear(self):
+        self.identity_map.clear()
+
+def current_session():
+    """Returns the innermost session of the current thread, or None."""
+    sessions = getattr(_local, 'sessions', None)
+    if sessions:
+        return sessions[-1]
+    return None
+
+@contextmanager
+def use_session(session):
+    """Makes `session` the current session of this thread, for reads made
+    by worker threads on behalf of the thread owning it. Unlike entering the
+    session, leaving the block does not flush it.
+
+    """
+    if session is None:
+        yield
+        return
+    if not hasattr(_local, 'sessions'):
+        _local.sessions = []
+    _local.sessions.append(session)
+    try:
+        yield
+    finally:
+        _local.sessions.remove(session)
+
+class ReadCache(object):
+    """Rows keyed by (column family, rowkey), holding at most `maxsize` rows,
+    for `ttl` seconds if not None. Counts hits and misses.
+
+    """
+    def __init__(self, maxsize, ttl=None):
+        self.rows = LRUCache(maxsize)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.rows.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.time():
+            self.rows.discard(key)
+            entry = None
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[0]
+
+    def set(self, key, row):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        self.rows.set(key, (row, expires))
+
+    def invalidate(self, key):
+        self.rows.discard(key)
+
+    def clear(self):
+        self.rows.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.rows)}
+
+_read_cache = None
+
+def enable_read_cache(maxsize=10000, ttl=None):
+    """Enables the process wide read cache, and returns it."""
+    global _read_cache
+    _read_cache = ReadCache(maxsize, ttl)
+    return _read_cache
+
+def disable_read_cache():
+    global _read_cache
+    _read_cache = None
+
+def get_read_cache():
+    """Returns the read cache, or None if disabled."""
+    return _read_cache
+
+def invalidate(column_family, rowkey):
+    """Forget the row `rowkey` in the read cache and the current session,
+    after it has been written.
+
+    """
+    if _read_cache is not None:
+        _read_cache.invalidate((column_family, rowkey))
+    session = current_session()
+    if session is not None:
+        session.discard(column_family, rowkey)
@@ -0,0 +1,662 @@
+# -*- encoding: utf-8 -*-
+
+"""In-memory stand-in for a Cassandra cluster, for tests and benchmarks.
+
+It implements the part of the pycassa API used by cassobjects models and the
+Builder: ColumnFamily reads and writes (including indexed slices and token
+ranges), batches, and the SystemManager schema operations. Each request made
+to the cluster can be delayed, to simulate network and server latency::
+
+    cluster = FakeCluster(latency=0.001)
+    with cluster:
+        Builder.create(User, Post)
+        User.insert({'name': 'bob'})
+    print(cluster.calls)
+
+While installed, pools created by cassobjects are connected to the fake
+cluster. Keyspaces exist as soon as they are used, column families must be
+created, as on a real cluster.
+
+Differences with Cassandra:
+    - values are stored as given, they are not packed by the validators
+    - rows are ordered by RandomPartitioner tokens, columns by their natural
+      python order (TimeUUIDs by time)
+    - consistency levels and timestamps are ignored, the last write wins
+    - writes to counter column families, by `add` or batches, are increments
+
+"""
+
+import time
+import uuid
+import hashlib
+import operator
+import threading
+from functools import partial
+
+from pycassa import NotFoundException, InvalidRequestException, \
+                    ConsistencyLevel
+from pycassa.index import EQ, GTE, GT, LTE, LT
+
+from cassobjects.utils import OrderedDict
+from cassobjects import models, builder, pools
+
+__all__ = ['FakeCluster', 'FakeConnection', 'FakePool', 'FakeColumnFamily',
+           'FakeMutator', 'FakeSystemManager', 'token']
+
+# Default number of rows fetched per request by pycassa
+BUFFER_SIZE = 1024
+# Partitioner of the cluster, see token()
+PARTITIONER = 'org.apache.cassandra.dht.RandomPartitioner'
+
+OPERATORS = {
+    EQ: operator.eq,
+    GTE: operator.ge,
+    GT: operator.gt,
+    LTE: operator.le,
+    LT: operator.lt,
+}
+
+def token(key):
+    """Returns the RandomPartitioner token of the rowkey `key`"""
+    if isinstance(key, uuid.UUID):
+        key = key.bytes
+    elif not isinstance(key, bytes):
+        key = ('%s' % key).encode('utf-8')
+    value = int(hashlib.md5(key).hexdigest(), 16)
+    if value >= 2 ** 127:
+        value -= 2 ** 128
+    return abs(value)
+
+def _column_order(name):
+    """Sort key of a column name"""
+    if isinstance(name, uuid.UUID):
+        return (name.time, name.bytes)
+    return name
+
+def _qualify(value_type):
+    """Returns a type name as described by Cassandra"""
+    if value_type is None:
+        return None
+    name = builder._type_name(value_type)
+    if '.' not in name:
+        name = builder.MARSHAL_PREFIX + name
+    return name
+
+class ColumnDefinition(object):
+    """Metadata of a column, like pycassa `ColumnDef`"""
+    def __init__(self, name, validation_class, index_type=None,
+                 index_name=None):
+        self.name = name
+        self.validation_class = validation_class
+        self.index_type = index_type
+        self.index_name = index_name
+
+class ColumnFamilyDefinition(object):
+    """Definition of a column family, like pycassa `CfDef`"""
+    def __init__(self, keyspace, name, comparator_type=None,
+                 key_validation_class=None, default_validation_class=None,
+                 column_validation_classes=None, column_metadata=None,
+                 comment=None, **options):
+        self.keyspace = keyspace
+        self.name = name
+        self.column_type = 'Standard'
+        self.comparator_type = _qualify(comparator_type) or \
+            builder.MARSHAL_PREFIX + 'BytesType'
+        self.key_validation_class = _qualify(key_validation_class)
+        self.default_validation_class = _qualify(default_validation_class)
+        self.comment = comment
+        self.options = options
+        self.column_metadata = []
+        self.update(column_validation_classes, column_metadata)
+
+    def update(self, column_validation_classes=None, column_metadata=None):
+        """Replaces the column metadata by `column_metadata` (ColumnDef
+        like objects) if given, then sets the column validators, as pycassa
+        does.
+
+        """
+        if column_metadata is not None:
+            self.column_metadata = [
+                ColumnDefinition(c.name, _qualify(c.validation_class),
+                                 c.index_type, c.index_name)
+                for c in column_metadata]
+        for column, value_type in (column_validation_classes or {}).items():
+            metadata = self.column(column)
+            if metadata is None:
+                self.column_metadata.append(ColumnDefinition(
+                    column, _qualify(value_type)))
+            else:
+                metadata.validation_class = _qualify(value_type)
+
+    def column(self, name):
+        for column in self.column_metadata:
+            if column.name == name:
+                return column
+        return None
+
+class FakeCluster(object):
+    """Schema and rows of keyspaces, shared by all fake connections.
+
+    :param latency: Seconds each request waits, or a callable returning them
+      from the name of the request (`get`, `multiget`, `batch_mutate`...).
+
+    :param clock: Function returning the current time, used to expire
+      columns written with a TTL.
+
+    `calls` counts requests by name.
+
+    """
+    def __init__(self, latency=0, clock=time.time):
+        self.latency = latency
+        self.clock = clock
+        # {keyspace: {column family: ColumnFamilyDefinition}}
+        self.schema = {}
+        # {(keyspace, column family):
+        #     {rowkey: {column: (value, expires, timestamp, ttl)}}}
+        self.data = {}
+        # {(keyspace, column family): [(token, rowkey)]}, sorted, dropped
+        # when rowkeys are added or removed
+        self.rings = {}
+        self.calls = {}
+        self.lock = threading.RLock()
+        self._saved = None
+
+    def request(self, name):
+        """Counts a request, and waits for its latency."""
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        latency = self.latency(name) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls = {}
+
+    def definition(self, keyspace, name):
+        """Returns the definition of a column family, raises
+        NotFoundException if it does not exist.
+
+        """
+        try:
+            return self.schema[keyspace][name]
+        except KeyError:
+            raise NotFoundException()
+
+    def truncate(self, keyspace=None):
+        """Removes all rows, of `keyspace` only if given."""
+        with self.lock:
+            for (ks, name), rows in self.data.items():
+                if keyspace is None or ks == keyspace:
+                    rows.clear()
+                    self.rings.pop((ks, name), None)
+
+    def install(self):
+        """Makes cassobjects use this cluster instead of pycassa connections.
+        Pools already created are disposed of.
+
+        """
+        if self._saved is not None:
+            return self
+        self._saved = (pools.ConnectionPool, models.ColumnFamily,
+                       models.Mutator, builder.SystemManager)
+        pools.ConnectionPool = partial(FakePool, self)
+        models.ColumnFamily = FakeColumnFamily
+        models.Mutator = FakeMutator
+        builder.SystemManager = partial(FakeSystemManager, self)
+        pools.POOLS.dispose()
+        return self
+
+    def uninstall(self):
+        """Restores pycassa connections."""
+        if self._saved is None:
+            return
+        (pools.ConnectionPool, models.ColumnFamily, models.Mutator,
+         builder.SystemManager) = self._saved
+        self._saved = None
+        pools.POOLS.dispose()
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.uninstall()
+
+class FakeConnection(object):
+    """Stands for a connection of a pycassa ConnectionPool"""
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    def describe_partitioner(self):
+        self.cluster.request('describe_partitioner')
+        return PARTITIONER
+
+    def return_to_pool(self):
+        pass
+
+class FakePool(object):
+    """Stands for a pycassa ConnectionPool"""
+    def __init__(self, cluster, keyspace, server_list=['localhost:9160'],
+                 pool_size=5, max_overflow=10, **kwargs):
+        self.cluster = cluster
+        self.keyspace = keyspace
+        self.server_list = server_list
+        self._pool_size = pool_size
+
+    def get(self):
+        return FakeConnection(self.cluster)
+
+    def size(self):
+        return self._pool_size
+
+    def overflow(self):
+        return 0
+
+    def checkedout(self):
+        return 0
+
+    def dispose(self):
+        pass
+
+class FakeColumnFamily(object):
+    """Stands for a pycassa ColumnFamily. Arguments not listed in methods
+    signatures (consistency levels, timestamps...) are accepted and ignored.
+
+    """
+    def __init__(self, pool, column_family, **kwargs):
+        self.pool = pool
+        self.cluster = pool.cluster
+        self.column_family = column_family
+        self.buffer_size = BUFFER_SIZE
+        self.read_consistency_level = ConsistencyLevel.ONE
+        self.write_consistency_level = ConsistencyLevel.ONE
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+        self.cluster.request('load_schema')
+        self.definition = self.cluster.definition(pool.keyspace, column_family)
+        self.key = (pool.keyspace, column_family)
+        self.rows = self.cluster.data[self.key]
+        # writes to counter column families are increments
+        self.counters = (self.definition.default_validation_class or '') \
+            .endswith('CounterColumnType')
+
+    def _slice(self, row, columns=None, column_start='', column_finish='',
+               column_reversed=False, column_count=100,
+               include_timestamp=False, include_ttl=False):
+        """Returns the live columns of `row` selected by a pycassa slice.
+        As with pycassa, `include_timestamp` and `include_ttl` make values
+        tuples of the value, the write timestamp and the ttl given when
+        writing the column.
+
+        """
+        now = self.cluster.clock()
+        if columns is not None:
+            names = sorted((c for c in columns if c in row), key=_column_order)
+            column_count = len(names)
+        else:
+            names = sorted(row, key=_column_order, reverse=column_reversed)
+        start = _column_order(column_start) if column_start != '' else None
+        finish = _column_order(column_finish) if column_finish != '' else None
+        result = OrderedDict()
+        for name in names:
+            if len(result) >= column_count:
+                break
+            order = _column_order(name)
+            if columns is None and start is not None and \
+                (order > start if column_reversed else order < start):
+                continue
+            if columns is None and finish is not None and \
+                (order < finish if column_reversed else order > finish):
+                break
+            value, expires, timestamp, ttl = row[name]
+            if expires is None or expires > now:
+                if include_timestamp and include_ttl:
+                    value = (value, timestamp, ttl)
+                elif include_timestamp:
+                    value = (value, timestamp)
+                elif include_ttl:
+                    value = (value, ttl)
+                result[name] = value
+        return result
+
+    def _write(self, key, columns, ttl=None, timestamp=None):
+        now = self.cluster.clock()
+        expires = now + ttl if ttl else None
+        if timestamp is None:
+            timestamp = int(now * 1e6)
+        with self.cluster.lock:
+            if key not in self.rows:
+                self.cluster.rings.pop(self.key, None)
+            row = self.rows.setdefault(key, {})
+            for name, value in columns.items():
+                if self.counters:
+                    value += row.get(name, (0,))[0]
+                row[name] = (value, expires, timestamp, ttl or None)
+
+    def _remove(self, key, columns=None):
+        with self.cluster.lock:
+            row = self.rows.get(key, {})
+            for name in (columns if columns is not None else list(row)):
+                row.pop(name, None)
+            if not row and key in self.rows:
+                del self.rows[key]
+                self.cluster.rings.pop(self.key, None)
+
+    def _keys(self):
+        """Rowkeys with their token, in token order"""
+        with self.cluster.lock:
+            ring = self.cluster.rings.get(self.key)
+            if ring is None:
+                ring = self.cluster.rings[self.key] = \
+                    sorted((token(key), key) for key in self.rows)
+            return ring
+
+    def get(self, key, columns=None, column_start='', column_finish='',
+            column_reversed=False, column_count=100, include_timestamp=False,
+            include_ttl=False, **kwargs):
+        self.cluster.request('get')
+        with self.cluster.lock:
+            result = self._slice(self.rows.get(key, {}), columns, column_start,
+                                 column_finish, column_reversed, column_count,
+                                 include_timestamp, include_ttl)
+        if not result:
+            raise NotFoundException()
+        return result
+
+    def multiget(self, keys, columns=None, column_start='', column_finish='',
+                 column_reversed=False, column_count=100, buffer_size=None,
+                 include_timestamp=False, include_ttl=False, **kwargs):
+        keys = list(keys)
+        buffer_size = buffer_size or self.buffer_size
+        result = OrderedDict()
+        for i in range(0, len(keys), buffer_size):
+            self.cluster.request('multiget')
+            with self.cluster.lock:
+                for key in keys[i:i + buffer_size]:
+                    columns_ = self._slice(self.rows.get(key, {}), columns,
+                                           column_start, column_finish,
+                                           column_reversed, column_count,
+                                           include_timestamp, include_ttl)
+                    if columns_:
+                        result[key] = columns_
+        return result
+
+    def get_count(self, key, columns=None, column_start='', column_finish='',
+                  column_reversed=False, max_count=None, **kwargs):
+        self.cluster.request('get_count')
+        with self.cluster.lock:
+            return len(self._slice(self.rows.get(key, {}), columns,
+                                   column_start, column_finish,
+                                   column_reversed, max_count or models.MAX_COUNT))
+
+    def multiget_count(self, keys, columns=None, column_start='',
+                       column_finish='', column_reversed=False,
+                       max_count=None, buffer_size=None, **kwargs):
+        keys = list(keys)
+        buffer_size = buffer_size or self.buffer_size
+        result = OrderedDict()
+        for i in range(0, len(keys), buffer_size):
+            self.cluster.request('multiget_count')
+            with self.cluster.lock:
+                for key in keys[i:i + buffer_size]:
+                    result[key] = len(self._slice(
+                        self.rows.get(key, {}), columns, column_start,
+                        column_finish, column_reversed,
+                        max_count or models.MAX_COUNT))
+        return result
+
+    def _pages(self, name, keys, buffer_size, slice_args):
+        """Yields (rowkey, columns) of `keys`, read by requests of
+        `buffer_size` rows.
+
+        """
+        buffer_size = buffer_size or self.buffer_size
+        for i in range(0, max(len(keys), 1), buffer_size):
+            self.cluster.request(name)
+            with self.cluster.lock:
+                page = [(key, self._slice(self.rows.get(key, {}), **slice_args))
+                        for key in keys[i:i + buffer_size]]
+            for key, columns in page:
+                yield key, columns
+
+    def get_range(self, start='', finish='', columns=None, column_start='',
+                  column_finish='', column_reversed=False, column_count=100,
+                  row_count=None, buffer_size=None, filter_empty=True,
+                  start_token=None, finish_token=None,
+                  include_timestamp=False, include_ttl=False, **kwargs):
+        if start_token is not None and (start not in ('', None) or
+                                        finish not in ('', None)):
+            raise ValueError("'start_token' may not be used with 'start' or "
+                             "'finish'")
+        if finish_token is not None and finish not in ('', None):
+            raise ValueError("'finish_token' may not be used with 'finish'")
+        # start keys are included, start tokens are not
+        lower = upper = None
+        if start_token not in ('', None):
+            lower = (int(start_token), False)
+        elif start not in ('', None):
+            lower = (token(start), True)
+        if finish_token not in ('', None):
+            upper = int(finish_token)
+        elif finish not in ('', None):
+            upper = token(finish)
+        def in_range(key_token):
+            above = lower is None or key_token > lower[0] or \
+                (lower[1] and key_token == lower[0])
+            below = upper is None or key_token <= upper
+            if lower is not None and upper is not None and lower[0] >= upper:
+                # the range wraps around the ring
+                return above or below
+            return above and below
+        keys = [key for key_token, key in self._keys() if in_range(key_token)]
+        slice_args = dict(columns=columns, column_start=column_start,
+                          column_finish=column_finish,
+                          column_reversed=column_reversed,
+                          column_count=column_count,
+                          include_timestamp=include_timestamp,
+                          include_ttl=include_ttl)
+        count = 0
+        for key, row in self._pages('get_range', keys, buffer_size, slice_args):
+            if filter_empty and not row:
+                continue
+            yield key, row
+            count += 1
+            if row_count is not None and count >= row_count:
+                return
+
+    def get_indexed_slices(self, index_clause, columns=None, column_start='',
+                           column_finish='', column_reversed=False,
+                           column_count=100, buffer_size=None,
+                           include_timestamp=False, include_ttl=False,
+                           **kwargs):
+        expressions = index_clause.expressions
+        indexed = set(c.name for c in self.definition.column_metadata
+                      if c.index_type is not None)
+        if not [e for e in expressions if e.op == EQ and e.column_name in indexed]:
+            raise InvalidRequestException("No indexed columns present in index "
+                                          "clause with operator EQ")
+        start = index_clause.start_key
+        start = token(start) if start not in ('', None) else None
+        now = self.cluster.clock()
+        def matches(key):
+            row = self.rows.get(key, {})
+            for e in expressions:
+                if e.column_name not in row:
+                    return False
+                value, expires = row[e.column_name][:2]
+                if expires is not None and expires <= now:
+                    return False
+                if not OPERATORS[e.op](value, e.value):
+                    return False
+            return True
+        with self.cluster.lock:
+            keys = [key for key_token, key in self._keys()
+                    if (start is None or key_token >= start) and matches(key)]
+        keys = keys[:index_clause.count]
+        slice_args = dict(columns=columns, column_start=column_start,
+                          column_finish=column_finish,
+                          column_reversed=column_reversed,
+                          column_count=column_count,
+                          include_timestamp=include_timestamp,
+                          include_ttl=include_ttl)
+        return self._pages('get_indexed_slices', keys, buffer_size, slice_args)
+
+    def insert(self, key, columns, timestamp=None, ttl=None, **kwargs):
+        self.cluster.request('insert')
+        self._write(key, columns, ttl, timestamp)
+        return int(time.time() * 1e6)
+
+    def add(self, key, column, value=1, **kwargs):
+        self.cluster.request('add')
+        self._write(key, {column: value})
+
+    def remove(self, key, columns=None, **kwargs):
+        self.cluster.request('remove')
+        self._remove(key, columns)
+        return int(time.time() * 1e6)
+
+class FakeMutator(object):
+    """Stands for a pycassa Mutator: mutations are applied when `queue_size`
+    of them are queued, or when calling :meth:`send`, in a single request.
+
+    """
+    def __init__(self, pool, queue_size=100, **kwargs):
+        self.pool = pool
+        self.cluster = pool.cluster
+        self.limit = queue_size
+        self._buffer = []
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.send()
+
+    def _enqueue(self, mutation):
+        with self._lock:
+            self._buffer.append(mutation)
+            if self.limit and len(self._buffer) >= self.limit:
+                self.send()
+        return self
+
+    def insert(self, column_family, key, columns, timestamp=None, ttl=None):
+        return self._enqueue((column_family._write, key, columns, ttl,
+                              timestamp))
+
+    def remove(self, column_family, key, columns=None, super_column=None,
+               timestamp=None):
+        return self._enqueue((column_family._remove, key, columns))
+
+    def send(self, **kwargs):
+        with self._lock:
+            if not self._buffer:
+                return
+            self.cluster.request('batch_mutate')
+            for mutation in self._buffer:
+                mutation[0](*mutation[1:])
+            self._buffer = []
+
+class FakeSystemManager(object):
+    """Stands for a pycassa SystemManager"""
+    def __init__(self, cluster, server='localhost:9160', **kwargs):
+        self.cluster = cluster
+        self.server = server
+
+    def close(self):
+        pass
+
+    def _definition(self, keyspace, column_family):
+        try:
+            return self.cluster.definition(keyspace, column_family)
+        except NotFoundException:
+            raise InvalidRequestException("unconfigured columnfamily %s" %
+                                          column_family)
+
+    def list_keyspaces(self):
+        self.cluster.request('describe_keyspaces')
+        return list(self.cluster.schema)
+
+    def get_keyspace_column_families(self, keyspace,
+                                     use_dict_for_col_metadata=False):
+        self.cluster.request('describe_keyspace')
+        with self.cluster.lock:
+            definitions = dict(self.cluster.schema.get(keyspace, {}))
+        if use_dict_for_col_metadata:
+            for name, definition in list(definitions.items()):
+                copy = ColumnFamilyDefinition(keyspace, name)
+                copy.__dict__.update(definition.__dict__)
+                copy.column_metadata = dict((c.name, c) for c in
+                                            definition.column_metadata)
+                definitions[name] = copy
+        return definitions
+
+    def create_column_family(self, keyspace, name, **cf_kwargs):
+        self.cluster.request('system_add_column_family')
+        with self.cluster.lock:
+            column_families = self.cluster.schema.setdefault(keyspace, {})
+            if name in column_families:
+                raise InvalidRequestException("%s already exists in keyspace "
+                                              "%s" % (name, keyspace))
+            column_families[name] = ColumnFamilyDefinition(keyspace, name,
+                                                           **cf_kwargs)
+            self.cluster.data[(keyspace, name)] = {}
+
+    def drop_column_family(self, keyspace, column_family):
+        self.cluster.request('system_drop_column_family')
+        with self.cluster.lock:
+            self._definition(keyspace, column_family)
+            del self.cluster.schema[keyspace][column_family]
+            del self.cluster.data[(keyspace, column_family)]
+            self.cluster.rings.pop((keyspace, column_family), None)
+
+    def alter_column_family(self, keyspace, column_family,
+                            column_validation_classes=None,
+                            column_metadata=None, **cf_kwargs):
+        self.cluster.request('describe_keyspace')
+        self.cluster.request('system_update_column_family')
+        with self.cluster.lock:
+            definition = self._definition(keyspace, column_family)
+            definition.update(column_validation_classes, column_metadata)
+            for name, value in cf_kwargs.items():
+                if name in ('comparator_type', 'key_validation_class',
+                            'default_validation_class'):
+                    value = _qualify(value)
+                if name in definition.__dict__:
+                    setattr(definition, name, value)
+                else:
+                    definition.options[name] = value
+
+    def alter_column(self, keyspace, column_family, column, value_type):
+        # pycassa reads the definition of the column family first
+        self.cluster.request('describe_keyspace')
+        self.cluster.request('system_update_column_family')
+        with self.cluster.lock:
+            definition = self._definition(keyspace, column_family)
+            metadata = definition.column(column)
+            if metadata is None:
+                definition.column_metadata.append(
+                    ColumnDefinition(column, _qualify(value_type)))
+            else:
+                metadata.validation_class = _qualify(value_type)
+
+    def create_index(self, keyspace, column_family, column, value_type,
+                     index_type='KEYS', index_name=None):
+        self.cluster.request('describe_keyspace')
+        self.cluster.request('system_update_column_family')
+        with self.cluster.lock:
+            definition = self._definition(keyspace, column_family)
+            metadata = definition.column(column)
+            if metadata is None:
+                metadata = ColumnDefinition(column, _qualify(value_type))
+                definition.column_metadata.append(metadata)
+            metadata.index_type = index_type
+            metadata.index_name = index_name
+
+    def drop_index(self, keyspace, column_family, column):
+        self.cluster.request('describe_keyspace')
+        self.cluster.request('system_update_column_family')
+        with self.cluster.lock:
+            metadata = self._definition(keyspace, column_family).column(column)
+            if metadata is not None:
+                metadata.index_type = metadata.index_name = None
@@ -2,6 +2,213 @@
 
 """Utils methods/objects for cassobjects"""
 
+import time
+import threading
+from itertools import islice
+try:
+    from queue import Queue, Empty
+except ImportError:
+    # python 2
+    from Queue import Queue, Empty
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    # python 2.6
+    from pycassa.util import OrderedDict
+
+def chunks(iterable, size):
+    """Yields lists of at most `size` items from `iterable`"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def parallel_map(func, items, workers):
+    """Same as `map`, but calls are made concurrently by at most `workers`
+    threads, which are joined before returning. Results are returned in the
+    same order as `items`. The first exception raised by `func`, in the
+    order of `items`, is raised again.
+
+    """
+    items = list(items)
+    workers = min(workers, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    results = [None] * len(items)
+    errors = []
+    indexes = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def work():
+        while not errors:
+            with lock:
+                try:
+                    index = next(indexes)
+                except StopIteration:
+                    return
+            try:
+                results[index] = func(items[index])
+            except Exception as e:
+                errors.append((index, e))
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise min(errors, key=lambda error: error[0])[1]
+    return results
+
+class LatencyTracker(object):
+    """Keeps the latencies of the last `size` calls of an operation, and
+    gives their `percentile`, once `min_samples` calls were recorded.
+    The percentile is computed again every `refresh` calls.
+
+    Also counts the hedged calls made with it (see :func:`hedged`), and how
+    many of them were answered by the second request first.
+
+    """
+    def __init__(self, size=1000, percentile=0.95, min_samples=20,
+                 refresh=50):
+        self.size = size
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.refresh = refresh
+        self.samples = []
+        self.index = 0
+        self.recorded = 0
+        self.computed = None
+        self.computed_at = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            if len(self.samples) < self.size:
+                self.samples.append(seconds)
+            else:
+                self.samples[self.index] = seconds
+            self.index = (self.index + 1) % self.size
+            self.recorded += 1
+
+    def value(self):
+        """Returns the percentile of recorded latencies in seconds, or None
+        if not enough calls were recorded.
+
+        """
+        if self.recorded < self.min_samples:
+            return None
+        if self.computed is None or \
+            self.recorded - self.computed_at >= self.refresh:
+            with self.lock:
+                samples = sorted(self.samples)
+                self.computed_at = self.recorded
+            self.computed = samples[min(int(len(samples) * self.percentile),
+                                        len(samples) - 1)]
+        return self.computed
+
+def hedged(tracker, func, *args, **kwargs):
+    """Calls `func(*args, **kwargs)`, and if it did not return after the
+    latency percentile of `tracker` (a :class:`LatencyTracker`), calls it a
+    second time concurrently. Returns the first result.
+
+    An exception raised before the second call is made is raised right away.
+    Otherwise, it is only raised if the other call fails too.
+    Until the tracker has enough samples, `func` is just called.
+
+    """
+    delay = tracker.value()
+    if delay is None:
+        start = time.time()
+        result = func(*args, **kwargs)
+        tracker.record(time.time() - start)
+        return result
+    results = Queue()
+    def call(hedge):
+        start = time.time()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            results.put((hedge, False, e))
+            return
+        tracker.record(time.time() - start)
+        results.put((hedge, True, result))
+    def spawn(hedge):
+        thread = threading.Thread(target=call, args=(hedge,))
+        thread.daemon = True
+        thread.start()
+    spawn(False)
+    try:
+        hedge, success, result = results.get(timeout=delay)
+    except Empty:
+        with tracker.lock:
+            tracker.hedges += 1
+        spawn(True)
+        pending = 2
+        error = None
+        while pending:
+            hedge, success, result = results.get()
+            if success:
+                if hedge:
+                    with tracker.lock:
+                        tracker.hedge_wins += 1
+                return result
+            if error is None:
+                error = result
+            pending -= 1
+        raise error
+    if not success:
+        raise result
+    return result
+
+class LRUCache(object):
+    """A thread safe mapping holding at most `maxsize` items. When full, the
+    least recently used item is dropped.
+
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            if key not in self.items:
+                return False
+            self.items[key] = self.items.pop(key)
+            return True
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            value = self.items[key] = self.items.pop(key)
+            return value
+
+    def set(self, key, value=True):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
 # Following is part of SQLAlchemy and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
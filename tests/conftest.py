@@ -0,0 +1,19 @@
+# -*- encoding: utf-8 -*-
+
+"""Fixtures shared by the tests: each test runs against a new in-memory
+cluster (see :mod:`cassobjects.testing`).
+
+Models of all test modules share the default registry, so their column
+family names must be distinct.
+
+"""
+
+import pytest
+
+from cassobjects.testing import FakeCluster
+
+@pytest.fixture
+def cluster():
+    cluster = FakeCluster()
+    with cluster:
+        yield cluster
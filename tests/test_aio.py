@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+
+import gc
+import os
+import weakref
+import threading
+
+import pytest
+
+from cassobjects import aio
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, ModelException
+from cassobjects.types import UTF8Type, IntegerType
+
+Model = declare_model(name='AioModel', keyspace='test_aio')
+
+class Item(Model):
+    __column_family__ = 'aio_item'
+    name = Column(UTF8Type, unique=True)
+    rank = Column(IntegerType, index=True)
+
+@pytest.fixture
+def items(cluster):
+    Builder.create(Item)
+    return [Item.insert({'name': 'i%d' % i, 'rank': i % 2}) for i in range(5)]
+
+def test_submit(items):
+    main = threading.current_thread()
+    future = aio.submit(Item, threading.current_thread)
+    assert future.result() is not main
+    assert len(Item.aget_by_rank(0).result()) == 3
+    assert Item.aget_one_by_rowkey(items[0].rowkey).result().name == 'i0'
+
+def test_gather(items):
+    futures = [Item.aget_by_rank(1), Item.aget_one_by('name', 'i4')]
+    by_rank, by_name = aio.gather(futures).result()
+    assert len(by_rank) == 2
+    assert by_name.rowkey == items[4].rowkey
+    assert aio.gather([]).result() == []
+
+def test_gather_error(items):
+    future = aio.gather([Item.aget_by_rank(0), Item.ainsert({'name': 'i0'})])
+    with pytest.raises(ModelException):
+        future.result()
+
+def test_async_iterator(items):
+    names = sorted(item.name for item in Item.aiter_range(buffer_size=2))
+    assert names == ['i%d' % i for i in range(5)]
+    iterator = aio.AsyncIterator(Item, Item.iter_range, buffer_size=3)
+    assert len(iterator.fetch().result()) == 3
+    assert len(iterator.fetch().result()) == 2
+    assert iterator.fetch().result() == []
+
+def test_async_iterator_reads_ahead(items):
+    iterator = aio.AsyncIterator(Item, lambda: range(5), buffer_size=2)
+    read = []
+
+    def fill():
+        page = aio.AsyncIterator._fill(iterator)
+        read.append(list(page))
+        return page
+    iterator._fill = fill
+    assert next(iterator) == 0
+    # the second page is requested while the first one is served
+    iterator.pending.result()
+    assert read == [[0, 1], [2, 3]]
+    assert list(iterator) == [1, 2, 3, 4]
+    assert read == [[0, 1], [2, 3], [4]]
+    with pytest.raises(StopIteration):
+        next(iterator)
+
+def test_executor_reset_after_fork(items, monkeypatch):
+    parent_pool = Item.pool
+    parent_executor = aio.get_executor(parent_pool)
+    child_pid = os.getpid() + 1
+    monkeypatch.setattr(os, 'getpid', lambda: child_pid)
+    assert Item.pool is not parent_pool
+    assert aio.get_executor(Item.pool) is not parent_executor
+    assert Item.aget_one_by_rowkey(items[0].rowkey).result().name == 'i0'
+    pool = weakref.ref(parent_pool)
+    del parent_pool, parent_executor
+    gc.collect()
+    assert pool() is None
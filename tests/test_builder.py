@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column
+from cassobjects.types import UTF8Type, IntegerType
+
+Model = declare_model(name='BuilderModel', keyspace='test_builder')
+
+class Shelf(Model):
+    __column_family__ = 'builder_shelf'
+    name = Column(UTF8Type, index=True)
+    size = Column(IntegerType)
+
+class Tag(Model):
+    __column_family__ = 'builder_tag'
+    __index_mode__ = 'manual'
+    label = Column(UTF8Type, unique=True)
+
+@pytest.fixture
+def shelf(cluster):
+    Builder.create(Shelf)
+    return Shelf
+
+def methods(plan):
+    """Returns the (SystemManager method, column family) of changes"""
+    return [(change.method, change.args[0]) for change in plan]
+
+def test_cache_invalidated(shelf, cluster):
+    col_fam = Shelf.cf_cache.get()
+    definition = cluster.definition('test_builder', 'builder_shelf')
+    definition.column('size').validation_class = 'LongType'
+    Builder.create(Shelf)
+    assert Shelf.cf_cache.get() is not col_fam
+    col_fam = Shelf.cf_cache.get()
+    Builder.create(Shelf, force=True)
+    assert Shelf.cf_cache.get() is not col_fam
+
+def test_plan(cluster):
+    assert methods(Builder.plan(Shelf, Tag)) == [
+        ('create_column_family', 'builder_shelf'),
+        ('create_column_family', 'builder_tag'),
+        ('create_column_family', 'builder_tag_label_idx'),
+    ]
+    assert cluster.calls == {'describe_keyspace': 1}
+    assert 'test_builder' not in cluster.schema
+
+def test_idempotent(cluster):
+    Builder.create(Shelf, Tag)
+    cluster.reset_calls()
+    assert Builder.create(Shelf, Tag) == []
+    assert cluster.calls == {'describe_keyspace': 1}
+
+def test_created_with_indexes(shelf, cluster):
+    definition = cluster.definition('test_builder', 'builder_shelf')
+    assert definition.column('name').index_type is not None
+    assert definition.column('size').index_type is None
+
+def test_single_alter(shelf, cluster):
+    definition = cluster.definition('test_builder', 'builder_shelf')
+    definition.column('name').index_type = None
+    definition.column('size').validation_class = 'LongType'
+    plan = Builder.plan(Shelf)
+    assert methods(plan) == [('alter_column_family', 'builder_shelf')]
+    assert sorted(plan[0].kwargs) == ['column_validation_classes', 'indexes']
+    cluster.reset_calls()
+    Builder.create(Shelf)
+    assert cluster.calls == {'describe_keyspace': 2,
+                             'system_update_column_family': 1}
+    assert definition.column('name').index_type is not None
+    assert Builder.plan(Shelf) == []
+
+def test_dry_run(cluster, capsys):
+    plan = Builder.create(Shelf, dry_run=True)
+    assert 'test_builder' not in cluster.schema
+    out = capsys.readouterr()[0]
+    assert out == ''.join('%s\n' % change for change in plan)
+    # indexes are given to SystemManager as column metadata
+    assert 'indexes=' not in out
+    assert "column_metadata=[ColumnDef(name=" in out
+    assert out.startswith("create_column_family('test_builder', "
+                          "'builder_shelf', ")
+
+def test_force(shelf):
+    Shelf.insert({'name': 'x', 'size': 1})
+    plan = Builder.create(Shelf, force=True)
+    assert methods(plan) == [('drop_column_family', 'builder_shelf'),
+                             ('create_column_family', 'builder_shelf')]
+    assert list(Shelf.iter_range()) == []
@@ -0,0 +1,107 @@
+# -*- encoding: utf-8 -*-
+
+import time
+
+import pytest
+
+from pycassa import ConsistencyLevel
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column
+from cassobjects.testing import FakeColumnFamily, FakeMutator
+from cassobjects.types import UTF8Type
+
+Model = declare_model(name='ConsistencyModel', keyspace='test_consistency')
+
+class Order(Model):
+    __column_family__ = 'consistency_order'
+    __read_consistency__ = ConsistencyLevel.QUORUM
+    __write_consistency__ = ConsistencyLevel.ALL
+    ref = Column(UTF8Type, unique=True)
+
+class Page(Model):
+    __column_family__ = 'consistency_page'
+    __hedged_reads__ = True
+    title = Column(UTF8Type)
+
+@pytest.fixture
+def levels(cluster, monkeypatch):
+    """Records the consistency level of requests, as (request, level)"""
+    Builder.create(Order, Page)
+    Page._latencies.clear()
+    levels = []
+
+    def recording(method, option):
+        def record(self, *args, **kwargs):
+            levels.append((method.__name__,
+                           kwargs.get(option) or getattr(self, option)))
+            return method(self, *args, **kwargs)
+        return record
+    for name in ('multiget', 'get_indexed_slices'):
+        monkeypatch.setattr(FakeColumnFamily, name, recording(
+            getattr(FakeColumnFamily, name), 'read_consistency_level'))
+    monkeypatch.setattr(FakeColumnFamily, 'insert', recording(
+        FakeColumnFamily.insert, 'write_consistency_level'))
+    init = FakeMutator.__init__
+
+    def mutator(self, pool, queue_size=100, **kwargs):
+        levels.append(('mutator', kwargs.get('write_consistency_level')))
+        init(self, pool, queue_size, **kwargs)
+    monkeypatch.setattr(FakeMutator, '__init__', mutator)
+    return levels
+
+def test_model_levels(levels):
+    order = Order.insert({'ref': 'a'})
+    Order.get_one_by_rowkey(order.rowkey)
+    with Order.batch():
+        pass
+    assert levels == [('get_indexed_slices', ConsistencyLevel.QUORUM),
+                      ('insert', ConsistencyLevel.ALL),
+                      ('multiget', ConsistencyLevel.QUORUM),
+                      ('mutator', ConsistencyLevel.ALL)]
+
+def test_query_levels(levels):
+    order = Order.insert({'ref': 'a'},
+                         read_consistency_level=ConsistencyLevel.ONE,
+                         write_consistency_level=ConsistencyLevel.LOCAL_QUORUM)
+    Order.get_one_by_rowkey(order.rowkey,
+                            read_consistency_level=ConsistencyLevel.ONE)
+    Order.bulk_insert([{'ref': 'b'}],
+                      write_consistency_level=ConsistencyLevel.ONE)
+    assert levels == [('get_indexed_slices', ConsistencyLevel.ONE),
+                      ('insert', ConsistencyLevel.LOCAL_QUORUM),
+                      ('multiget', ConsistencyLevel.ONE),
+                      ('get_indexed_slices', ConsistencyLevel.QUORUM),
+                      ('mutator', ConsistencyLevel.ONE)]
+
+def warm_up(cluster, page, latency):
+    """Reads `page` until the latency percentile of multigets is known"""
+    cluster.latency = latency
+    # LatencyTracker default number of samples
+    for _ in range(20):
+        Page.get_one_by_rowkey(page.rowkey)
+    return Page._latencies['multiget']
+
+def test_hedge_fires(levels, cluster):
+    page = Page.insert({'title': 'x'})
+    tracker = warm_up(cluster, page, 0.01)
+    requests = []
+
+    def latency(name):
+        requests.append(name)
+        # only the first request is slow
+        return 0.5 if len(requests) == 1 else 0
+    cluster.latency = latency
+    start = time.time()
+    assert Page.get_one_by_rowkey(page.rowkey).title == 'x'
+    assert time.time() - start < 0.4
+    assert (tracker.hedges, tracker.hedge_wins) == (1, 1)
+
+def test_hedge_not_fired(levels, cluster):
+    page = Page.insert({'title': 'x'})
+    tracker = warm_up(cluster, page, 0.05)
+    cluster.latency = 0
+    assert Page.get_one_by_rowkey(page.rowkey).title == 'x'
+    assert Page.get_one_by_rowkey(page.rowkey, hedge=False).title == 'x'
+    assert tracker.hedges == 0
+    assert len([level for level in levels if level[0] == 'multiget']) == 22
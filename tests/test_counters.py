@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+
+import time
+import threading
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, MetaCounterModel
+from cassobjects.testing import FakeMutator
+
+Model = declare_model(metaclass=MetaCounterModel, name='CounterTestModel',
+                      keyspace='test_counters')
+
+class Views(Model):
+    __column_family__ = 'counters_views'
+
+@pytest.fixture
+def views(cluster):
+    Builder.create(Views)
+    return Views
+
+@pytest.fixture
+def failing_send(monkeypatch):
+    """Makes the next batch fail after being applied, like a timeout"""
+    send = FakeMutator.send
+
+    def timed_out(self, **kwargs):
+        monkeypatch.setattr(FakeMutator, 'send', send)
+        send(self)
+        raise IOError('timed out')
+    monkeypatch.setattr(FakeMutator, 'send', timed_out)
+
+def test_add(views):
+    views.add('page', 'total')
+    views.add('page', 'total', 4)
+    assert views.value('page', 'total') == 5
+    assert views.value('page', 'none') == 0
+
+def test_buffer_merges(views, cluster):
+    buf = views.buffer(interval=None)
+    # loads the schema of the column family
+    views.add('p0', 'c0', 0)
+    cluster.reset_calls()
+
+    def work():
+        for i in range(1000):
+            buf.incr('p%d' % (i % 10), 'c%d' % (i % 3))
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buf.flush()
+    assert (buf.increments, buf.writes) == (4000, 30)
+    assert cluster.calls == {'batch_mutate': 1}
+    rows = views.get_many(['p%d' % i for i in range(10)])
+    assert sum(sum(row.counters.values()) for row in rows) == 4000
+
+def test_buffer_size(views):
+    buf = views.buffer(max_size=2, interval=None)
+    buf.incr('a', 'c')
+    buf.incr('a', 'c')
+    assert views.value('a', 'c') == 0
+    buf.incr('b', 'c')
+    assert views.value('a', 'c') == 2
+
+def test_buffer_thread(views):
+    with views.buffer(interval=0.01).start() as buf:
+        buf.incr('page', 'c')
+        time.sleep(0.1)
+        assert views.value('page', 'c') == 1
+        buf.incr('page', 'c', 2)
+    assert views.value('page', 'c') == 3
+
+def test_failed_flush_dropped(views, failing_send):
+    buf = views.buffer(interval=None)
+    buf.incr('page', 'c', 10)
+    with pytest.raises(IOError):
+        buf.flush()
+    buf.flush()
+    assert buf.dropped == 1
+    assert views.value('page', 'c') == 10
+
+def test_failed_flush_requeued(views, failing_send):
+    buf = views.buffer(interval=None, requeue=True)
+    buf.incr('page', 'c', 10)
+    with pytest.raises(IOError):
+        buf.flush()
+    buf.flush()
+    # the batch was applied before failing, and is counted twice
+    assert buf.dropped == 0
+    assert views.value('page', 'c') == 20
+
+def test_no_retries(views, monkeypatch):
+    options = []
+    init = FakeMutator.__init__
+
+    def recording(self, pool, queue_size=100, **kwargs):
+        options.append(kwargs.get('allow_retries'))
+        init(self, pool, queue_size, **kwargs)
+    monkeypatch.setattr(FakeMutator, '__init__', recording)
+    buf = views.buffer(interval=None)
+    buf.incr('page', 'c')
+    buf.flush()
+    with views.batch():
+        pass
+    assert options == [False, False]
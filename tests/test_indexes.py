@@ -0,0 +1,106 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects import builder
+from cassobjects.builder import Builder, BuilderException
+from cassobjects.models import declare_model, Column, ModelException
+from cassobjects.testing import FakeCluster
+from cassobjects.types import UTF8Type
+
+Model = declare_model(name='IndexModel', keyspace='test_indexes')
+
+class Account(Model):
+    __column_family__ = 'index_account'
+    __index_mode__ = 'manual'
+    email = Column('em', UTF8Type, unique=True)
+    kind = Column(UTF8Type, index=True)
+
+class Native(Model):
+    __column_family__ = 'index_native'
+    kind = Column(UTF8Type, index=True)
+
+@pytest.fixture
+def accounts(cluster):
+    Builder.create(Account, Native)
+    return [Account.insert({'email': 'a%d@x' % i, 'kind': 'k%d' % (i % 2)})
+            for i in range(6)]
+
+def test_index_column_families(accounts, cluster):
+    definitions = cluster.schema['test_indexes']
+    assert 'index_account_em_idx' in definitions
+    assert 'index_account_kind_idx' in definitions
+    assert 'index_native_kind_idx' not in definitions
+
+def test_lookups(accounts):
+    assert Account.get_one_by_email('a3@x').rowkey == accounts[3].rowkey
+    assert len(Account.get_by_kind('k0')) == 3
+    assert len(Account.get_by('kind', 'k0', count=2)) == 2
+    assert sorted(a.email for a in Account.iter_by_kind('k1', buffer_size=2)) \
+        == ['a1@x', 'a3@x', 'a5@x']
+
+def test_unique(accounts):
+    with pytest.raises(ModelException):
+        Account.insert({'email': 'a1@x', 'kind': 'k2'})
+    with pytest.raises(ModelException):
+        Account.bulk_insert([{'email': 'b@x'}, {'email': 'b@x'}])
+    assert Account.get_by('email', 'b@x') == []
+
+def test_moved_on_save(accounts):
+    account = accounts[0]
+    account.kind = 'k2'
+    account.save()
+    assert [a.rowkey for a in Account.get_by_kind('k2')] == [account.rowkey]
+    assert account.rowkey not in [a.rowkey for a in Account.get_by_kind('k0')]
+
+def test_rebuild(accounts):
+    Account.cf_cache.get('index_account_kind_idx').rows.clear()
+    assert Account.get_by_kind('k0') == []
+    Builder.rebuild_indexes(Account)
+    assert len(Account.get_by_kind('k0')) == 3
+    with pytest.raises(BuilderException):
+        Builder.rebuild_indexes(Native)
+
+def test_rebuild_ttl(monkeypatch):
+    now = [1000.0]
+    class Clock(object):
+        @staticmethod
+        def time():
+            return now[0]
+    monkeypatch.setattr(builder, 'time', Clock)
+    with FakeCluster(clock=lambda: now[0]) as cluster:
+        Builder.create(Account)
+        expiring = Account.insert({'email': 'a@x', 'kind': 'k0'}, ttl=60)
+        kept = Account.insert({'email': 'b@x', 'kind': 'k0'})
+        index = cluster.data[('test_indexes', 'index_account_kind_idx')]
+        index.clear()
+        now[0] += 20
+        Builder.rebuild_indexes(Account)
+        # the entry expires with the row
+        assert index['k0'][expiring.rowkey][1] == 1060
+        assert index['k0'][kept.rowkey][1] is None
+        now[0] += 41
+        Builder.rebuild_indexes(Account)
+        assert [a.rowkey for a in Account.get_by_kind('k0')] == [kept.rowkey]
+        # expired rows are not indexed again
+        assert index['k0'][expiring.rowkey][1] == 1060
+
+def test_index_ttl():
+    now = [1000.0]
+    with FakeCluster(clock=lambda: now[0]):
+        Builder.create(Account)
+        account = Account.insert({'email': 'a@x', 'kind': 'k0'}, ttl=60)
+        with Account.batch() as batch:
+            Account.insert({'email': 'b@x', 'kind': 'k0'}, batch=batch,
+                           ttl=60)
+        account.kind = 'k1'
+        Account.save_changes([account], ttl=60)
+        now[0] += 30
+        assert len(Account.get_by_kind('k0')) == 1
+        assert len(Account.get_by_kind('k1')) == 1
+        now[0] += 31
+        assert Account.get_by_kind('k0') == []
+        assert Account.get_by_kind('k1') == []
+        # expired index entries do not make values taken
+        Account.insert({'email': 'a@x'})
+        Account.insert({'email': 'b@x'})
@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+
+import logging
+
+import pytest
+
+from cassobjects import instrumentation
+from cassobjects.builder import Builder
+from cassobjects.instrumentation import MetricsAggregator, SlowQueryLog
+from cassobjects.models import declare_model, Column, ModelException
+from cassobjects.types import UTF8Type, IntegerType
+
+Model = declare_model(name='InstrumentationModel',
+                      keyspace='test_instrumentation')
+
+class Account(Model):
+    __column_family__ = 'instrumentation_account'
+    login = Column(UTF8Type, unique=True)
+    level = Column(IntegerType, index=True)
+
+@pytest.fixture
+def listen(cluster):
+    """Registers listeners for the duration of the test"""
+    Builder.create(Account)
+    added = []
+
+    def listen(listener):
+        added.append(instrumentation.add_listener(listener))
+        return listener
+    yield listen
+    for listener in added:
+        instrumentation.remove_listener(listener)
+
+def test_events(listen):
+    events = []
+    listen(events.append)
+    account = Account.insert({'login': 'a', 'level': 1})
+    assert [(e.model, e.operation) for e in events] == [
+        ('instrumentation_account', 'check_unique'),
+        ('instrumentation_account', 'insert')]
+    check, insert = events
+    assert check.parent is insert and insert.parent is None
+    assert insert.rows == 1 and insert.error is None
+    del events[:]
+    rows = Account.iter_range()
+    assert next(rows).rowkey == account.rowkey
+    assert events == []
+    assert list(rows) == []
+    assert [(e.operation, e.rows) for e in events] == [('iter_range', 1)]
+
+def test_no_listener(cluster):
+    Builder.create(Account)
+    assert instrumentation.listeners == []
+    with instrumentation.measure('instrumentation_account', 'x') as event:
+        assert event is None
+        assert instrumentation.current_event() is None
+
+def test_metrics(listen):
+    metrics = listen(MetricsAggregator())
+    Account.insert({'login': 'a', 'level': 1})
+    Account.insert({'login': 'b', 'level': 1})
+    with pytest.raises(ModelException):
+        Account.insert({'login': 'a', 'level': 2})
+    Account.get_by('level', 1)
+    snapshot = metrics.snapshot()
+    insert = snapshot[('instrumentation_account', 'insert')]
+    assert (insert['count'], insert['errors'], insert['rows']) == (3, 1, 2)
+    assert insert['bytes'] == 0
+    assert sum(insert['histogram'].values()) == 3
+    get_by = snapshot[('instrumentation_account', 'get_by')]
+    assert (get_by['count'], get_by['rows']) == (1, 2)
+    # one lookup per insert
+    assert snapshot[('instrumentation_account', 'check_unique')]['count'] == 3
+    snapshot[('instrumentation_account', 'insert')]['count'] = 0
+    assert metrics.snapshot()[('instrumentation_account', 'insert')]['count'] == 3
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+def test_slow_query_log(listen, cluster, caplog):
+    listen(SlowQueryLog(threshold=0.02))
+    caplog.set_level(logging.WARNING, 'cassobjects.slow_queries')
+    account = Account.insert({'login': 'a', 'level': 1})
+    assert caplog.records == []
+    cluster.latency = 0.03
+    Account.get_many([account.rowkey])
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 1
+    assert messages[0].startswith(
+        'slow query: instrumentation_account.get_many took ')
+    assert messages[0].endswith('ms (1 rows)')
@@ -0,0 +1,78 @@
+# -*- encoding: utf-8 -*-
+
+import os
+
+import pytest
+
+from cassobjects import pools
+from cassobjects.models import declare_model
+from cassobjects.pools import PoolRegistry, LazyPool
+
+@pytest.fixture
+def registry(cluster):
+    return PoolRegistry()
+
+def lazy_pool(registry, keyspace='test_pools', options=None):
+    """Returns the LazyPool descriptor of a new class"""
+    return type('Holder', (object,), {
+        'pool': LazyPool(keyspace, ['localhost:9160'], options, registry)})
+
+def test_lazy_creation(registry):
+    holder = lazy_pool(registry, options={'pool_size': 3})
+    assert registry.pools == {}
+    pool = holder.pool
+    assert pool.keyspace == 'test_pools'
+    assert pool.size() == 3
+    assert holder.pool is pool
+    assert list(registry.pools.values()) == [pool]
+
+def test_shared_pools(registry):
+    first = lazy_pool(registry, options={'pool_size': 3, 'timeout': 1})
+    same = lazy_pool(registry, options={'timeout': 1, 'pool_size': 3})
+    other = lazy_pool(registry, options={'pool_size': 4})
+    assert first.pool is same.pool
+    assert other.pool is not first.pool
+    assert lazy_pool(registry, 'other').pool is not first.pool
+    assert sorted(s['size'] for s in registry.stats().values()) == [3, 4, 5]
+
+def test_models_declared_lazily(cluster):
+    Model = declare_model(name='PoolsModel', keyspace='test_pools',
+                          pool_size=2)
+    assert pools.POOLS.pools == {}
+    assert Model.pool.size() == 2
+    assert list(pools.POOLS.pools.values()) == [Model.pool]
+
+def test_reset_after_fork(registry, monkeypatch):
+    holder = lazy_pool(registry)
+    parent_pool = holder.pool
+    parent_lock = registry.lock
+    child_pid = os.getpid() + 1
+    monkeypatch.setattr(os, 'getpid', lambda: child_pid)
+    child_pool = holder.pool
+    assert child_pool is not parent_pool
+    assert registry.pid == child_pid
+    assert registry.lock is not parent_lock
+    assert list(registry.pools.values()) == [child_pool]
+    assert holder.pool is child_pool
+
+def test_cf_cache_reset_after_fork(cluster, monkeypatch):
+    Model = declare_model(name='PoolsForkModel', keyspace='test_pools')
+    class Item(Model):
+        __column_family__ = 'pools_item'
+    cache = Item.cf_cache
+    cache.cfs['pools_item'] = object()
+    cache.pool = Item.pool
+    parent_lock = cache.lock
+    child_pid = os.getpid() + 1
+    monkeypatch.setattr(os, 'getpid', lambda: child_pid)
+    assert Item.pool is not None
+    assert cache.lock is not parent_lock
+    assert cache.cfs == {}
+    assert cache.pool is None
+
+def test_dispose(registry):
+    holder = lazy_pool(registry)
+    pool = holder.pool
+    registry.dispose()
+    assert registry.pools == {}
+    assert holder.pool is not pool
@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+
+import gc
+import weakref
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, ModelException
+from cassobjects.types import UTF8Type, IntegerType
+
+Model = declare_model(name='ProjectionModel', keyspace='test_projection')
+
+class Article(Model):
+    __column_family__ = 'projection_article'
+    title = Column(UTF8Type)
+    body = Column(UTF8Type)
+    views = Column(IntegerType, index=True)
+
+@pytest.fixture
+def articles(cluster):
+    Builder.create(Article)
+    articles = [Article.insert({'title': 't%d' % i, 'body': 'b%d' % i,
+                                'views': 1})
+                for i in range(5)]
+    cluster.reset_calls()
+    return articles
+
+def test_only_get_many(articles, cluster):
+    rows = Article.get_many([a.rowkey for a in articles], only=['title'])
+    assert sorted(row.title for row in rows) == ['t%d' % i for i in range(5)]
+    assert not [row for row in rows if 'body' in row.__dict__]
+    assert cluster.calls == {'multiget': 1}
+
+def test_deferred_loaded_on_access(articles, cluster):
+    rows = Article.get_many([a.rowkey for a in articles], defer=['body'])
+    row = rows[0]
+    assert row.body == 'b%s' % row.title[1:]
+    # the column was read for all objects of the query at once
+    assert cluster.calls == {'multiget': 2}
+    assert sorted(r.body for r in rows) == ['b%d' % i for i in range(5)]
+    assert cluster.calls == {'multiget': 2}
+
+def test_only_iter_range(articles, cluster):
+    rows = list(Article.iter_range(only=['body']))
+    assert len(rows) == 5
+    assert not [row for row in rows if 'title' in row.__dict__]
+    assert sorted(row.title for row in rows) == ['t%d' % i for i in range(5)]
+    assert cluster.calls == {'get_range': 1, 'multiget': 1}
+
+def test_defer_get_by(articles):
+    rows = Article.get_by('views', 1, defer=['title', 'body'])
+    assert len(rows) == 5
+    assert sorted(row.title for row in rows) == ['t%d' % i for i in range(5)]
+
+def test_invalid_projection(articles):
+    with pytest.raises(ModelException):
+        Article.get_many([articles[0].rowkey], only=['title'], defer=['body'])
+    with pytest.raises(ModelException):
+        Article.get_many([articles[0].rowkey], only=['missing'])
+    with pytest.raises(ModelException):
+        next(Article.iter_range(defer=['title', 'body', 'views']))
+
+def test_deferred_while_streaming(articles):
+    bodies = [row.body for row in Article.iter_by('views', 1, defer=['body'])]
+    assert sorted(bodies) == ['b%d' % i for i in range(5)]
+    bodies = [row.body for row in Article.iter_range(defer=['body'])]
+    assert sorted(bodies) == ['b%d' % i for i in range(5)]
+
+def test_streamed_rows_freed(articles):
+    gc.disable()
+    try:
+        rows = Article.iter_range(defer=['body'])
+        first = next(rows)
+        first_ref = weakref.ref(first)
+        assert first.body == 'b%s' % first.title[1:]
+        del first
+        second = next(rows)
+        # the generator only holds the last yielded object
+        assert first_ref() is None
+        assert second.body == 'b%s' % second.title[1:]
+    finally:
+        gc.enable()
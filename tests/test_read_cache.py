@@ -0,0 +1,117 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects import models, session
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, MetaTimestampedModel
+from cassobjects.session import enable_read_cache, disable_read_cache
+from cassobjects.types import UTF8Type, IntegerType
+
+Model = declare_model(name='ReadCacheModel', keyspace='test_read_cache')
+TimestampedModel = declare_model(metaclass=MetaTimestampedModel,
+                                 name='ReadCacheTimestampedModel',
+                                 keyspace='test_read_cache')
+
+class Account(Model):
+    __column_family__ = 'read_cache_account'
+    name = Column(UTF8Type)
+    age = Column(IntegerType)
+
+class Event(TimestampedModel):
+    __column_family__ = 'read_cache_event'
+
+class Clock(object):
+    """Stands for the time module in cassobjects.session"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def accounts(cluster):
+    Builder.create(Account, Event)
+    accounts = [Account.insert({'name': 'a%d' % i, 'age': i})
+                for i in range(3)]
+    cluster.reset_calls()
+    yield accounts
+    disable_read_cache()
+
+def test_disabled_by_default(accounts, cluster):
+    Account.get_one_by_rowkey(accounts[0].rowkey)
+    Account.get_one_by_rowkey(accounts[0].rowkey)
+    assert cluster.calls == {'multiget': 2}
+
+def test_hits_and_misses(accounts, cluster):
+    cache = enable_read_cache()
+    rowkeys = [a.rowkey for a in accounts]
+    Account.get_many(rowkeys[:2])
+    assert cache.stats() == {'hits': 0, 'misses': 2, 'size': 2}
+    assert cluster.calls == {'multiget': 1}
+    cluster.reset_calls()
+    assert Account.get_one_by_rowkey(rowkeys[0]).name == 'a0'
+    assert [a.age for a in Account.get_many(rowkeys[:2])] == [0, 1]
+    assert cluster.calls == {}
+    assert cache.stats() == {'hits': 3, 'misses': 2, 'size': 2}
+    # only the missing row is read
+    assert [a.age for a in Account.get_many(rowkeys)] == [0, 1, 2]
+    assert cluster.calls == {'multiget': 1}
+    assert cache.stats() == {'hits': 5, 'misses': 3, 'size': 3}
+
+def test_query_options_bypass(accounts, cluster):
+    cache = enable_read_cache()
+    Account.get_one_by_rowkey(accounts[0].rowkey, columns=['name'])
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'size': 0}
+
+def test_ttl(accounts, cluster, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session, 'time', clock)
+    cache = enable_read_cache(ttl=10)
+    Account.get_one_by_rowkey(accounts[0].rowkey)
+    clock.now += 5
+    Account.get_one_by_rowkey(accounts[0].rowkey)
+    assert cluster.calls == {'multiget': 1}
+    clock.now += 10
+    Account.get_one_by_rowkey(accounts[0].rowkey)
+    assert cluster.calls == {'multiget': 2}
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 1}
+
+def test_lru_eviction(accounts, cluster):
+    cache = enable_read_cache(maxsize=2)
+    rowkeys = [a.rowkey for a in accounts]
+    Account.get_one_by_rowkey(rowkeys[0])
+    Account.get_one_by_rowkey(rowkeys[1])
+    # the first row becomes the most recently used one
+    Account.get_one_by_rowkey(rowkeys[0])
+    Account.get_one_by_rowkey(rowkeys[2])
+    assert cache.stats()['size'] == 2
+    cluster.reset_calls()
+    Account.get_one_by_rowkey(rowkeys[0])
+    Account.get_one_by_rowkey(rowkeys[2])
+    assert cluster.calls == {}
+    Account.get_one_by_rowkey(rowkeys[1])
+    assert cluster.calls == {'multiget': 1}
+
+def test_invalidated_by_save(accounts):
+    enable_read_cache()
+    account = Account.get_one_by_rowkey(accounts[0].rowkey)
+    account.age = 10
+    Account.save_changes([account])
+    assert Account.get_one_by_rowkey(account.rowkey).age == 10
+
+def test_invalidated_by_insert(accounts, monkeypatch):
+    cache = enable_read_cache()
+    rowkey = models.new_timeuuid()
+    cache.set((Account.__column_family__, rowkey), {'name': 'stale'})
+    monkeypatch.setattr(models, 'new_timeuuid', lambda: rowkey)
+    Account.insert({'name': 'new'})
+    assert Account.get_one_by_rowkey(rowkey).name == 'new'
+
+def test_invalidated_by_append_version(accounts):
+    cache = enable_read_cache()
+    event = Event.insert({'v': 0})
+    cache.set((Event.__column_family__, event.rowkey), {'stale': ''})
+    Event.append_version(event.rowkey, {'v': 1})
+    assert cache.get((Event.__column_family__, event.rowkey)) is None
+    assert Event.latest(event.rowkey).versions[0][1] == {'v': 1}
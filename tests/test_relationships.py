@@ -0,0 +1,89 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, ModelException, \
+                               relationship, MetaTimestampedModel
+from cassobjects.session import Session
+from cassobjects.types import UTF8Type, TimeUUIDType
+
+Model = declare_model(name='RelationshipModel', keyspace='test_relationships')
+TimestampedModel = declare_model(metaclass=MetaTimestampedModel,
+                                 name='RelationshipTimestampedModel',
+                                 keyspace='test_relationships')
+
+class Author(Model):
+    __column_family__ = 'relationships_author'
+    name = Column(UTF8Type)
+    books = relationship('relationships_book')
+    notes = relationship('relationships_note')
+
+class Book(Model):
+    __column_family__ = 'relationships_book'
+    author = Column(TimeUUIDType, foreign_key='relationships_author')
+    title = Column(UTF8Type)
+
+class Note(TimestampedModel):
+    __column_family__ = 'relationships_note'
+
+@pytest.fixture
+def author(cluster):
+    Builder.create(Author, Book, Note)
+    author = Author.insert({'name': 'x'})
+    Book.insert({'author': author.rowkey})
+    return author
+
+def test_load(author):
+    assert len(author.books) == 1
+    assert len(Book.get_by_author(author.rowkey)) == 1
+
+def test_assign(author):
+    assert Author(author.rowkey, books=[]).books == []
+    author.books
+    with pytest.raises(ModelException):
+        author.books = []
+
+@pytest.fixture
+def authors(author, cluster):
+    authors = [author] + [Author.insert({'name': 'a%d' % i}) for i in range(3)]
+    for i, author in enumerate(authors):
+        for j in range(i):
+            Book.insert({'author': author.rowkey})
+            Note.insert({'n': j}, author)
+    cluster.reset_calls()
+    return authors
+
+def test_prefetch_foreign_key(authors, cluster):
+    authors = [Author.get_one_by_rowkey(a.rowkey) for a in authors]
+    cluster.reset_calls()
+    Author.prefetch_related(authors, 'books')
+    # one index query per author
+    assert cluster.calls == {'get_indexed_slices': 4}
+    assert [len(a.books) for a in authors] == [1, 1, 2, 3]
+    assert cluster.calls == {'get_indexed_slices': 4}
+
+def test_prefetch_in_session(authors):
+    with Session():
+        authors = Author.get_many([a.rowkey for a in authors])
+        Author.prefetch_related(authors, 'books')
+        book = max(authors, key=lambda a: len(a.books)).books[0]
+        assert Book.get_one_by_rowkey(book.rowkey) is book
+        book.title = 'changed'
+    assert Book.get_one_by_rowkey(book.rowkey).title == 'changed'
+
+def test_prefetch_many_to_many(authors, cluster):
+    authors = Author.get_many([a.rowkey for a in authors])
+    cluster.reset_calls()
+    Author.prefetch_related(authors, 'notes')
+    # intermediate rows, then all notes, with one multiget each
+    assert cluster.calls == {'multiget': 2}
+    assert sorted(len(a.notes) for a in authors) == [0, 1, 2, 3]
+    for author in authors:
+        assert [n.versions[-1][1]['n'] for n in author.notes] == \
+            list(range(len(author.notes)))
+    assert cluster.calls == {'multiget': 2}
+
+def test_prefetch_not_relationship(authors):
+    with pytest.raises(ModelException):
+        Author.prefetch_related(authors, 'name')
@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, ModelException
+from cassobjects.types import UTF8Type, IntegerType
+
+Model = declare_model(name='SaveModel', keyspace='test_save')
+
+class Person(Model):
+    __column_family__ = 'save_person'
+    name = Column('nm', UTF8Type, unique=True)
+    age = Column(IntegerType, index=True)
+    bio = Column(UTF8Type)
+
+class Login(Model):
+    __column_family__ = 'save_login'
+    __index_mode__ = 'manual'
+    __unique_cache_size__ = 10
+    email = Column(UTF8Type, unique=True)
+    kind = Column(UTF8Type, index=True)
+
+@pytest.fixture
+def people(cluster):
+    Builder.create(Person, Login)
+    return [Person.insert({'name': 'bob', 'age': 3, 'bio': 'x'}),
+            Person.insert({'name': 'alice', 'age': 4})]
+
+def test_nothing_to_save(people, cluster):
+    cluster.reset_calls()
+    assert Person.save_changes(people) == []
+    assert cluster.calls == {}
+
+def test_changed_columns_only(people, cluster):
+    bob = people[0]
+    bob.age = 5
+    bob.bio = None
+    cluster.reset_calls()
+    assert bob.save()
+    assert cluster.calls == {'batch_mutate': 1}
+    row = cluster.data[('test_save', 'save_person')][bob.rowkey]
+    assert sorted(row) == ['age', 'nm']
+    assert not bob.__dict__.get('_dirty')
+    assert Person.get_one_by_rowkey(bob.rowkey).age == 5
+
+def test_unique_changes(people):
+    bob = people[0]
+    bob.name = 'alice'
+    with pytest.raises(ModelException):
+        bob.save()
+    bob.name = 'bobby'
+    bob.save()
+    assert Person.get_one_by_name('bobby').rowkey == bob.rowkey
+
+def test_batch(people):
+    for person in people:
+        person.age = 10
+    with Person.batch() as batch:
+        assert len(Person.save_changes(people, batch=batch)) == 2
+    assert len(Person.get_by_age(10)) == 2
+
+def test_projected_index_moved(people):
+    login = Login.insert({'email': 'a@x', 'kind': 'k0'})
+    projected = Login.get_one_by_rowkey(login.rowkey, columns=['email'])
+    projected.kind = 'k1'
+    projected.email = 'b@x'
+    projected.save()
+    assert Login.get_by_kind('k0') == []
+    assert [l.rowkey for l in Login.get_by_kind('k1')] == [login.rowkey]
+    assert Login.get_by('email', 'a@x') == []
+    # the old value is not remembered as taken anymore
+    Login.insert({'email': 'a@x', 'kind': 'k0'})
+
+def test_projected_unchanged_value(people, cluster):
+    bob = Person.get_one_by_rowkey(people[0].rowkey, columns=['age'])
+    bob.name = 'bob'
+    cluster.reset_calls()
+    assert not bob.save()
+    assert cluster.calls == {'multiget': 1}
+    assert not bob.__dict__.get('_dirty')
+    login = Login.insert({'email': 'c@x', 'kind': 'k0'})
+    projected = Login.get_one_by_rowkey(login.rowkey, columns=['email'])
+    projected.kind = 'k0'
+    projected.email = 'c@x'
+    projected.save()
+    assert [l.rowkey for l in Login.get_by_kind('k0')] == [login.rowkey]
+    assert Login.get_one_by_email('c@x').rowkey == login.rowkey
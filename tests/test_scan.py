@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, ModelException, \
+                               TOKEN_BOUNDS, SCAN_DONE, token_ranges
+from cassobjects import testing
+from cassobjects.types import IntegerType
+
+Model = declare_model(name='ScanModel', keyspace='test_scan')
+
+class Item(Model):
+    __column_family__ = 'scan_item'
+    n = Column(IntegerType)
+
+@pytest.fixture
+def items(cluster):
+    Builder.create(Item)
+    with Item.batch() as batch:
+        for i in range(500):
+            Item.insert({'n': i}, batch=batch)
+
+def test_token_ranges():
+    ranges = token_ranges(4, TOKEN_BOUNDS['Murmur3Partitioner'])
+    assert ranges[0][0] == str(-2 ** 63)
+    assert ranges[-1][1] == str(2 ** 63 - 1)
+    assert all(ranges[i][1] == ranges[i + 1][0] for i in range(3))
+
+def test_scan(items, cluster):
+    assert sorted(item.n for item in Item.parallel_scan(workers=4)) == \
+        list(range(500))
+    list(Item.parallel_scan())
+    assert cluster.calls['describe_partitioner'] == 1
+
+def test_unknown_partitioner(items, monkeypatch):
+    monkeypatch.setattr(testing, 'PARTITIONER',
+                        'org.apache.cassandra.dht.ByteOrderedPartitioner')
+    with pytest.raises(ModelException):
+        list(Item.parallel_scan())
+    bounds = TOKEN_BOUNDS['RandomPartitioner']
+    assert len(list(Item.parallel_scan(token_bounds=bounds))) == 500
+
+def test_resume(items):
+    checkpoint = {}
+    first = []
+    scan = Item.parallel_scan(workers=4, splits=16, checkpoint=checkpoint,
+                              buffer_size=20)
+    for item in scan:
+        first.append(item.n)
+        if len(first) == 200:
+            break
+    scan.close()
+    assert len(checkpoint) <= 16
+    rest = [item.n for item in Item.parallel_scan(workers=4, splits=16,
+                                                  checkpoint=checkpoint)]
+    assert all(value == SCAN_DONE for value in checkpoint.values())
+    assert len(checkpoint) == 16
+    assert set(first) | set(rest) == set(range(500))
+    # the object being handled when the scan stopped is yielded again
+    assert set(first) & set(rest) == set([first[-1]])
+    assert list(Item.parallel_scan(splits=16, checkpoint=checkpoint)) == []
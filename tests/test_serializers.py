@@ -0,0 +1,60 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects import serializers
+from cassobjects.serializers import Serializer, SerializerException
+
+@pytest.mark.parametrize('name', ['json', 'marshal', 'pickle'])
+def test_round_trip(name):
+    obj = {'a': [1, 2], 'b': 'x' * 100}
+    assert serializers.loads(serializers.dumps(obj, name)) == obj
+    compressed = serializers.dumps(obj, name, compress_threshold=10)
+    assert len(compressed) < len(serializers.dumps(obj, name))
+    assert serializers.loads(compressed) == obj
+
+def test_unknown():
+    with pytest.raises(SerializerException):
+        serializers.get_serializer('yaml')
+
+def test_incomplete():
+    class Incomplete(Serializer):
+        name = 'incomplete'
+        tag = 0x10
+
+        def dumps(self, obj):
+            return b''
+    with pytest.raises(SerializerException):
+        serializers.get_serializer(Incomplete())
+
+class Reversed(Serializer):
+    name = 'reversed'
+    tag = 0x10
+
+    def dumps(self, obj):
+        return serializers.dumps(obj)[::-1]
+
+    def loads(self, data):
+        return serializers.loads(data[::-1])
+
+def test_register():
+    serializer = serializers.get_serializer(Reversed())
+    assert serializers.get_serializer(Reversed()) is serializer
+    assert serializers.get_serializer('reversed') is serializer
+    obj = {'a': 'x' * 100}
+    assert serializers.loads(serializers.dumps(obj, serializer)) == obj
+
+def test_register_collisions():
+    class Taken(Reversed):
+        name = 'taken'
+        tag = serializers.JSONSerializer.tag
+    class Compressed(Reversed):
+        name = 'compressed'
+        tag = serializers.COMPRESSED | 0x11
+    class Brace(Reversed):
+        name = 'brace'
+        tag = ord('{')
+    for serializer in (Taken(), Compressed(), Brace()):
+        with pytest.raises(SerializerException):
+            serializers.register_serializer(serializer)
+    assert 'taken' not in serializers.SERIALIZERS
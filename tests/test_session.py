@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, ModelException
+from cassobjects.session import Session, current_session
+from cassobjects.types import UTF8Type, IntegerType
+
+Model = declare_model(name='SessionModel', keyspace='test_session')
+
+class Member(Model):
+    __column_family__ = 'session_member'
+    email = Column(UTF8Type, unique=True)
+    name = Column(UTF8Type)
+    age = Column(IntegerType, index=True)
+
+# more columns than pycassa reads by default
+wide_columns = dict(('c%d' % i, Column(IntegerType)) for i in range(150))
+wide_columns['__column_family__'] = 'session_wide'
+wide_columns['kind'] = Column(UTF8Type, index=True)
+Wide = type('Wide', (Model,), wide_columns)
+
+@pytest.fixture
+def member(cluster):
+    Builder.create(Member, Wide)
+    return Member.insert({'email': 'bob@x', 'name': 'bob', 'age': 30})
+
+def test_same_row_same_object(member):
+    with Session() as session:
+        by_rowkey = Member.get_one_by_rowkey(member.rowkey)
+        by_index = Member.get_one_by_age(30)
+        by_unique = Member.get_one_by('email', 'bob@x')
+        assert by_rowkey is by_index is by_unique
+        assert len(session.identity_map) == 1
+    assert current_session() is None
+
+def test_sessions_nest(member):
+    with Session() as outer:
+        with Session() as inner:
+            assert current_session() is inner
+            Member.get_one_by_rowkey(member.rowkey)
+        assert current_session() is outer
+        assert not outer.identity_map
+
+def test_flush_on_exit(member):
+    with Session():
+        Member.get_one_by_rowkey(member.rowkey).age = 31
+    assert Member.get_one_by_rowkey(member.rowkey).age == 31
+
+def test_no_flush_on_error(member):
+    with pytest.raises(KeyError):
+        with Session():
+            Member.get_one_by_rowkey(member.rowkey).age = 31
+            raise KeyError()
+    assert Member.get_one_by_rowkey(member.rowkey).age == 30
+
+def test_projected_reads_stay_out(member):
+    with Session() as session:
+        partial = Member.get_by('email', 'bob@x', columns=['email'])[0]
+        assert partial.name is None
+        assert not session.identity_map
+        assert Member.get_one_by_rowkey(member.rowkey).name == 'bob'
+
+def test_unique_check_bypasses_session(member):
+    with Session():
+        Member.get_by('email', 'bob@x', columns=['email'])
+        with pytest.raises(ModelException):
+            Member.insert({'email': 'bob@x', 'name': 'other'})
+
+def test_all_columns_read(member):
+    values = dict(('c%d' % i, i) for i in range(150))
+    values['kind'] = 'k'
+    wide = Wide.insert(values)
+
+    def read(obj):
+        return [getattr(obj, 'c%d' % i) for i in range(150)]
+    with Session():
+        assert read(Wide.get_one_by_kind('k')) == list(range(150))
+        assert read(Wide.get_one_by_rowkey(wide.rowkey)) == list(range(150))
+    assert [read(w) for w in Wide.iter_range()] == [list(range(150))]
+    assert [read(w) for w in Wide.parallel_scan()] == [list(range(150))]
@@ -0,0 +1,73 @@
+# -*- encoding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, Column, ModelException
+from cassobjects.types import UTF8Type
+from cassobjects.utils import parallel_map
+
+Model = declare_model(name='UniqueModel', keyspace='test_unique')
+
+class Customer(Model):
+    __column_family__ = 'unique_customer'
+    __unique_cache_size__ = 10
+    email = Column(UTF8Type, unique=True)
+    login = Column(UTF8Type, unique=True)
+
+class Visitor(Model):
+    __column_family__ = 'unique_visitor'
+    email = Column(UTF8Type, unique=True)
+
+@pytest.fixture
+def customers(cluster):
+    Builder.create(Customer, Visitor)
+    # values taken in the clusters of other tests
+    Customer._taken_values.clear()
+    return Customer
+
+def test_insert(customers, cluster):
+    Customer.insert({'email': 'a@x', 'login': 'a'})
+    with pytest.raises(ModelException):
+        Customer.insert({'email': 'b@x', 'login': 'a'})
+    # known taken values are refused without querying Cassandra
+    cluster.reset_calls()
+    with pytest.raises(ModelException):
+        Customer.insert({'email': 'a@x', 'login': 'c'})
+    assert cluster.calls == {}
+
+def test_bulk_insert(customers):
+    with pytest.raises(ModelException):
+        Customer.bulk_insert([{'email': 'a@x', 'login': 'a'},
+                              {'email': 'a@x', 'login': 'b'}])
+    assert len(Customer.bulk_insert([{'email': 'a@x', 'login': 'a'},
+                                     {'email': 'b@x', 'login': 'b'}])) == 2
+
+def test_queued_in_batch(customers):
+    with Visitor.batch() as batch:
+        Visitor.insert({'email': 'a@x'}, batch=batch)
+        with pytest.raises(ModelException):
+            Visitor.insert({'email': 'a@x'}, batch=batch)
+    assert len(Visitor.get_by_email('a@x')) == 1
+
+def test_unsent_batch_not_taken(customers):
+    batch = Customer.batch()
+    Customer.insert({'email': 'a@x', 'login': 'a'}, batch=batch)
+    # the batch is never sent
+    Customer.insert({'email': 'a@x', 'login': 'a'})
+
+def test_parallel_map():
+    threads = threading.active_count()
+    assert parallel_map(lambda x: x * 2, range(10), 4) == \
+        [x * 2 for x in range(10)]
+
+    def fail(x):
+        if x in (3, 7):
+            raise ValueError(x)
+        return x
+    with pytest.raises(ValueError) as error:
+        parallel_map(fail, range(10), 4)
+    assert error.value.args == (3,)
+    assert threading.active_count() == threads
@@ -0,0 +1,126 @@
+# -*- encoding: utf-8 -*-
+
+import pytest
+
+import uuid
+from itertools import chain
+
+import simplejson as json
+
+from cassobjects import serializers
+from cassobjects.builder import Builder
+from cassobjects.models import declare_model, MetaTimestampedModel, \
+                               ModelException
+from cassobjects.testing import FakeCluster
+
+Model = declare_model(metaclass=MetaTimestampedModel, name='VersionModel',
+                      keyspace='test_versions')
+
+class Document(Model):
+    __column_family__ = 'versions_document'
+    __delta_versions__ = 3
+    __max_versions__ = 5
+
+class Upper(serializers.Serializer):
+    """Stores JSON with upper cased strings, lowered when read"""
+    name = 'upper'
+    tag = 0x11
+
+    def dumps(self, obj):
+        return json.dumps(obj).upper().encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data.decode('utf-8').lower())
+
+class Shout(Model):
+    __column_family__ = 'versions_shout'
+    __serializer__ = Upper()
+    __compress_threshold__ = 50
+
+class Draft(Model):
+    __column_family__ = 'versions_draft'
+    __version_ttl__ = 60
+
+def stored(model, rowkey, cluster):
+    """Returns the stored values of `rowkey`, oldest first"""
+    row = cluster.data[('test_versions', model.__column_family__)][rowkey]
+    return [serializers.loads(row[column][0])
+            for column in sorted(row, key=lambda c: c.time)]
+
+@pytest.fixture
+def now():
+    return [1000.0]
+
+@pytest.fixture
+def clock_cluster(now):
+    cluster = FakeCluster(clock=lambda: now[0])
+    with cluster:
+        Builder.create(Document, Draft, Shout)
+        yield cluster
+
+def test_deltas_and_trim(clock_cluster):
+    doc = Document.insert({'v': 0, 'body': 'x' * 50})
+    for i in range(1, 12):
+        Document.append_version(doc.rowkey, {'v': i, 'body': 'x' * 50})
+    values = stored(Document, doc.rowkey, clock_cluster)
+    # full versions every 3 deltas, the 5 latest versions are kept along
+    # with v4, the base of the oldest one
+    assert [serializers.is_delta(value) for value in values] == \
+        [False, True, False, True, True, True]
+    assert values[0] == {'v': 4, 'body': 'x' * 50}
+    assert Document.latest(doc.rowkey).versions[0][1] == \
+        {'v': 11, 'body': 'x' * 50}
+    versions = Document.get_one_by_rowkey(doc.rowkey).versions
+    assert [obj['v'] for _, obj in versions] == [4, 7, 8, 9, 10, 11]
+
+def test_trim_in_batch(clock_cluster):
+    doc = Document.insert('first')
+    for i in range(8):
+        with Document.batch() as batch:
+            Document.append_version(doc.rowkey, i, batch=batch)
+    assert stored(Document, doc.rowkey, clock_cluster) == [3, 4, 5, 6, 7]
+
+def test_replaced_versions_expire(clock_cluster, now):
+    draft = Draft.insert({'v': 0})
+    Draft.append_version(draft.rowkey, {'v': 1})
+    now[0] += 30
+    Draft.append_version(draft.rowkey, {'v': 2})
+    assert len(stored(Draft, draft.rowkey, clock_cluster)) == 3
+    now[0] += 45
+    versions = Draft.get_one_by_rowkey(draft.rowkey).versions
+    assert [obj['v'] for _, obj in versions] == [1, 2]
+    now[0] += 30
+    versions = Draft.get_one_by_rowkey(draft.rowkey).versions
+    assert [obj['v'] for _, obj in versions] == [2]
+
+def test_get_many_latest(clock_cluster):
+    docs = [Document.insert({'v': 0}) for _ in range(3)]
+    for doc in docs:
+        Document.append_version(doc.rowkey, {'v': 1})
+    loaded = Document.get_many([doc.rowkey for doc in docs])
+    assert [[obj['v'] for _, obj in doc.versions] for doc in loaded] == \
+        [[1], [1], [1]]
+    loaded = Document.get_many([docs[0].rowkey], versions=None)
+    assert [obj['v'] for _, obj in loaded[0].versions] == [0, 1]
+
+def test_missing_rowkey(clock_cluster):
+    with pytest.raises(ModelException):
+        Document.latest('missing')
+    with pytest.raises(ModelException):
+        Document.get_one_by_rowkey('missing')
+
+def test_untagged_json(clock_cluster):
+    rowkey = str(uuid.uuid1())
+    Document.cf_cache.get().insert(rowkey, {uuid.uuid1(): '{"v": 0}'})
+    assert Document.latest(rowkey).versions[0][1] == {'v': 0}
+
+def test_custom_serializer(clock_cluster):
+    short = Shout.insert({'v': 'a'})
+    long = Shout.insert({'v': 'a' * 100})
+    row = clock_cluster.data[('test_versions', 'versions_shout')]
+    tags = [bytearray(column[0][:1])[0] for column in
+            chain(row[short.rowkey].values(), row[long.rowkey].values())]
+    assert tags == [Upper.tag, Upper.tag | serializers.COMPRESSED]
+    assert Shout.get_one_by_rowkey(short.rowkey).versions[0][1] == {'v': 'a'}
+    assert Shout.get_one_by_rowkey(long.rowkey).versions[0][1] == \
+        {'v': 'a' * 100}